@@ -0,0 +1,81 @@
+"""
+Benchmark of the JSON API against the template views serving the same data to the mobile clients.
+
+Seeds a throwaway test database, then requests the HTML page and the JSON call of every pair through the test client
+and reports the requests and the rows (questions or choices) served per second. The batch call is compared with the
+detail pages of the same questions, one request each.
+
+Usage: python -m benchmarks.api [--requests 200] [--questions 2000] [--votes 50000] [--batch 100]
+"""
+import argparse
+
+from benchmarks.common import setup, test_database
+from benchmarks.views import measure
+
+
+def pairs(questions, batch):
+    """
+    The function returns the compared calls.
+
+    :param questions: The `questions` parameter is the list of the most popular published questions, the first one
+    used for the calls of one question
+    :param batch: The `batch` parameter is the number of questions of the batch call
+    :return: a list of (name, HTML request, JSON request, rows per HTML request, rows per JSON request) tuples; the
+    requests are functions making one request with a client.
+    """
+    from django.urls import reverse
+
+    question = questions[0]
+    choices = question.choice_set.count()
+    ids = ','.join(str(question.pk) for question in questions[:batch])
+    detail_urls = [reverse('polls:detail', args=(question.pk,)) for question in questions[:batch]]
+
+    def detail_pages(client):
+        for url in detail_urls:
+            response = client.get(url)
+        return response
+
+    return [
+        ('list', lambda client: client.get(reverse('polls:index')),
+         lambda client: client.get(reverse('polls:api_questions'), {'limit': 100}), 5, 100),
+        ('detail', lambda client: client.get(reverse('polls:detail', args=(question.pk,))),
+         lambda client: client.get(reverse('polls:api_question', args=(question.pk,))), 1 + choices, 1 + choices),
+        ('results', lambda client: client.get(reverse('polls:results', args=(question.pk,))),
+         lambda client: client.get(reverse('polls:api_results', args=(question.pk,))), choices, choices),
+        (f'batch of {batch}', detail_pages,
+         lambda client: client.get(reverse('polls:api_question_batch'), {'ids': ids}),
+         len(detail_urls) * (1 + choices), len(detail_urls) * (1 + choices)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help="Measured requests per call.")
+    parser.add_argument('--questions', type=int, default=2000)
+    parser.add_argument('--votes', type=int, default=50000)
+    parser.add_argument('--batch', type=int, default=100)
+    args = parser.parse_args()
+
+    setup()
+    from polls import seeding
+    from polls.views import published_questions
+
+    with test_database():
+        seeding.seed(questions=args.questions, votes=args.votes, random_seed=0)
+        questions = list(published_questions().order_by('-choice__votes', 'pk').distinct()[:args.batch])
+
+        print(f"{'call':<14} {'HTML req/s':>11} {'JSON req/s':>11} {'HTML rows/s':>12} {'JSON rows/s':>12} "
+              f"{'speedup':>8}")
+        for name, html, api, html_rows, api_rows in pairs(questions, args.batch):
+            # The batch replaces a whole series of page requests, so it is measured with fewer requests.
+            requests = max(1, args.requests // len(questions)) if name.startswith('batch') else args.requests
+            html_result, api_result = measure(html, requests), measure(api, args.requests)
+            for result in (html_result, api_result):
+                assert result['statuses'] == [200], f"{name}: {result['statuses']}"
+            html_rate, api_rate = html_result['throughput'] * html_rows, api_result['throughput'] * api_rows
+            print(f"{name:<14} {html_result['throughput']:>11.0f} {api_result['throughput']:>11.0f} "
+                  f"{html_rate:>12.0f} {api_rate:>12.0f} {api_rate / html_rate:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark of the batch vote endpoint against the vote form, one ballot per request.
+
+Seeds a throwaway test database, then submits `--ballots` ballots of new voters (a share of them repeated, to exercise
+the duplicate detection) to api/votes/ in one request, and a sample of single votes to the vote view for comparison.
+The target is 10000 ballots in under a second, on SQLite as well as PostgreSQL.
+
+Usage: python -m benchmarks.batch_votes [--ballots 10000] [--questions 200] [--duplicates 0.05] [--single 200]
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.common import setup, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ballots', type=int, default=10000)
+    parser.add_argument('--questions', type=int, default=200)
+    parser.add_argument('--duplicates', type=float, default=0.05, help="Share of repeated ballots.")
+    parser.add_argument('--single', type=int, default=200, help="Votes submitted one by one for comparison.")
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from polls import seeding
+    from polls.models import Choice
+
+    rng = random.Random(0)
+    with test_database(), override_settings(POLLS_API_KEYS={'benchmark': 'benchmark-key'}):
+        seeding.seed(questions=args.questions, users=0, votes=0, random_seed=0)
+        choices = list(Choice.objects.values_list('question_id', 'pk'))
+        repeated = int(args.ballots * args.duplicates)
+        ballots = [[*rng.choice(choices), f"batch{number:015d}"] for number in range(args.ballots - repeated)]
+        ballots += rng.sample(ballots, repeated)
+        client = Client()
+
+        start = time.perf_counter()
+        response = client.post(reverse('polls:api_votes'), json.dumps(ballots), content_type='application/json',
+                               HTTP_AUTHORIZATION="Bearer benchmark-key")
+        batch = time.perf_counter() - start
+        assert response.status_code == 200, response.content
+        print(f"{connection.vendor}: {len(ballots)} ballots in one request: {batch * 1000:.0f} ms "
+              f"({len(ballots) / batch:.0f} ballots/s), {dict(response.json()['counts'])}")
+
+        start = time.perf_counter()
+        for number in range(args.single):
+            question_id, choice_id = rng.choice(choices)
+            client.post(reverse('polls:vote', args=(question_id,)),
+                        {'userId': f"single{number:014d}", 'choice': choice_id})
+        single = time.perf_counter() - start
+        print(f"{connection.vendor}: {args.single} votes one per request: {single * 1000:.0f} ms "
+              f"({args.single / single:.0f} ballots/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+import contextlib
+import os
+
+import django
+
+
+def setup():
+    """
+    The function configures Django for a standalone benchmark script, using `mysite.settings` unless the
+    DJANGO_SETTINGS_MODULE environment variable points elsewhere.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database(keepdb=False):
+    """
+    The function creates a throwaway test database for the duration of the `with` block, the same way the test runner
+    does, so benchmarks never touch the real data.
+
+    :param keepdb: The `keepdb` parameter tells whether an existing test database is reused and kept afterwards
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
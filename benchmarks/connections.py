@@ -0,0 +1,107 @@
+"""
+Benchmark of the per-request connection overhead: a new PostgreSQL connection per request (CONN_MAX_AGE = 0, the old
+settings), persistent connections (CONN_MAX_AGE = 60 with health checks) and connections borrowed from the pool of
+mysite/postgresql_pool.
+
+The detail page is requested `--requests` times through the WSGI handler, without a server, from `--concurrency`
+threads; the pool holds `--pool-size` connections at most. Connections are counted with the connection_created signal,
+which the pool sends for every borrowed connection, so for the pool the physical connections come from its stats.
+
+Usage: python -m benchmarks.connections [--requests 2000] [--concurrency 8] [--pool-size 4]
+"""
+import argparse
+import io
+import statistics
+import threading
+import time
+
+from benchmarks.common import setup, test_database
+
+
+def run(application, path, requests, concurrency):
+    """
+    The function requests `path` from a WSGI application from new threads, which close their connections at the end.
+
+    :return: the wall time and the list of latencies, in seconds.
+    """
+    from django.db import connections
+
+    latencies = []
+
+    def worker(count):
+        for _ in range(count):
+            environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+                       'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                       'HTTP_HOST': 'testserver', 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+                       'wsgi.errors': io.StringIO(), 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+                       'wsgi.run_once': False}
+            start = time.perf_counter()
+            statuses = []
+            response = application(environ, lambda status, headers: statuses.append(status))
+            b''.join(response)
+            response.close()
+            latencies.append(time.perf_counter() - start)
+            assert statuses[0].startswith('200'), statuses[0]
+        connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(requests // concurrency,)) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--pool-size', type=int, default=4)
+    args = parser.parse_args()
+
+    setup()
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connection, connections
+    from django.db.backends.signals import connection_created
+    from django.utils import timezone
+    from mysite import database
+    from polls.models import Choice, Question
+
+    opened = []
+    connection_created.connect(lambda sender, connection, **kwargs: opened.append(connection.alias), weak=False)
+    with test_database():
+        question = Question.objects.create(question_text="Benchmark?", pub_date=timezone.now())
+        for text in ("Yes", "No"):
+            Choice.objects.create(question=question, choice_text=text)
+        connection.close()
+
+        settings_dict = connections.settings['default']
+        base = {key: settings_dict[key] for key in ('ENGINE', 'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'OPTIONS')}
+        modes = [('per request', {'ENGINE': database.POSTGRESQL_ENGINE, 'CONN_MAX_AGE': 0}),
+                 ('persistent', {'ENGINE': database.POSTGRESQL_ENGINE, 'CONN_MAX_AGE': 60,
+                                 'CONN_HEALTH_CHECKS': True}),
+                 ('pool', {'ENGINE': database.POOLED_ENGINE, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': True,
+                           'OPTIONS': {**base['OPTIONS'], 'pool': {'min_size': args.pool_size,
+                                                                   'max_size': args.pool_size}}})]
+        application = WSGIHandler()
+        print(f"{args.requests} requests from {args.concurrency} threads.")
+        print(f"{'connections':>12} {'opened':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, overrides in modes:
+            # Every mode runs in new threads, which create their database wrappers from the updated settings.
+            settings_dict.update(base, **overrides)
+            del opened[:]
+            elapsed, latencies = run(application, f'/{question.id}/', args.requests, args.concurrency)
+            count = len(opened)
+            if name == 'pool':
+                pooled = connections.create_connection('default')
+                count = pooled.pool.get_stats()['connections_num']
+                pooled.close_pool()
+            latencies.sort()
+            print(f"{name:>12} {count:>7} {len(latencies) / elapsed:>8.0f} "
+                  f"{statistics.median(latencies) * 1000:>8.2f} {latencies[int(len(latencies) * 0.99)] * 1000:>8.2f}")
+        settings_dict.update(base)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Load test of the live results stream (server-sent events).
+
+Opens `--connections` event streams on one question through the ASGI application of mysite/asgi.py, in process, and
+measures the memory held per open connection. Then votes are cast and the time from the commit of a vote until the
+event with its tallies reached the first and the last subscriber is measured, together with the number of events each
+subscriber received (votes of one tick are coalesced into one event).
+
+Usage: python -m benchmarks.live_results [--connections 1000] [--votes 20] [--tick 0.1]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import setup, test_database
+
+
+class Connection:
+    """
+    An in-process client of the event stream, talking ASGI to the application.
+    """
+
+    def __init__(self, application, path):
+        self.application = application
+        self.path = path
+        self.events = []
+        self.connected = asyncio.Event()
+        self.disconnected = asyncio.Event()
+        self.changed = asyncio.Event()
+        self.requested = False
+        self.status = None
+        self.task = None
+
+    def open(self):
+        scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                 'path': self.path, 'raw_path': self.path.encode(), 'query_string': b'', 'root_path': '',
+                 'headers': [(b'host', b'testserver'), (b'accept', b'text/event-stream')],
+                 'client': ('127.0.0.1', 0), 'server': ('localhost', 80)}
+        self.task = asyncio.ensure_future(self.application(scope, self.receive, self.send))
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+            if self.status != 200:
+                self.connected.set()
+        elif message.get('body', b'').startswith(b'id: '):
+            self.events.append((int(message['body'][4:message['body'].index(b'\n')]), time.perf_counter()))
+            self.connected.set()
+            self.changed.set()
+
+    async def wait_for(self, version):
+        while not self.events or self.events[-1][0] < version:
+            self.changed.clear()
+            await self.changed.wait()
+        return self.events[-1][1]
+
+
+async def run(application, question, choice, connections, votes, interval):
+    from django.db import connection
+    from polls import live, results_cache
+    from polls.models import User
+    from polls.voting import record_vote
+
+    path = f'/{question.id}/results/live/'
+    clients = [Connection(application, path) for _ in range(connections)]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for client in clients:
+        client.open()
+    await asyncio.gather(*(client.connected.wait() for client in clients))
+    assert all(client.status == 200 for client in clients), {client.status for client in clients}
+    per_connection = (tracemalloc.get_traced_memory()[0] - before) / connections
+    tracemalloc.stop()
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    loop = asyncio.get_running_loop()
+
+    def close_connection():
+        connection.close()
+
+    def cast(number):
+        record_vote(question, choice, User.objects.create(userid=f"{number:020d}"))
+        return results_cache.get_version(question.id), time.perf_counter()
+
+    first, last = [], []
+    for number in range(votes):
+        version, committed = await loop.run_in_executor(executor, cast, number)
+        received = await asyncio.gather(*(client.wait_for(version) for client in clients))
+        first.append(min(received) - committed)
+        last.append(max(received) - committed)
+        await asyncio.sleep(interval)
+
+    # A burst of votes within one tick reaches every subscriber as a single event.
+    events = len(clients[0].events)
+    for number in range(votes, votes + 50):
+        version, _ = await loop.run_in_executor(executor, cast, number)
+    await asyncio.gather(*(client.wait_for(version) for client in clients))
+    burst_events = len(clients[0].events) - events
+
+    for client in clients:
+        client.disconnected.set()
+    await asyncio.gather(*(client.task for client in clients), return_exceptions=True)
+    await loop.run_in_executor(executor, close_connection)
+    executor.shutdown()
+    # Let the broadcaster notice that nobody is watching and close its connection.
+    while live.get_broadcaster().subscriber_count() or not live.get_broadcaster()._task.done():
+        await asyncio.sleep(interval)
+    return per_connection, first, last, burst_events
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--votes', type=int, default=20)
+    parser.add_argument('--tick', type=float, default=0.1)
+    args = parser.parse_args()
+
+    setup()
+    from django.test import override_settings
+    from django.utils import timezone
+    from polls.models import Question, Choice
+
+    with test_database(), override_settings(POLLS_LIVE_RESULTS_TICK=args.tick):
+        from mysite.asgi import application
+
+        question = Question.objects.create(question_text="Live question", pub_date=timezone.now())
+        choices = [Choice.objects.create(question=question, choice_text=f"Choice {number}") for number in range(4)]
+        per_connection, first, last, burst_events = asyncio.run(
+            run(application, question, choices[0], args.connections, args.votes, args.tick))
+
+    print(f"connections:             {args.connections}")
+    print(f"tick:                    {args.tick * 1000:.0f} ms")
+    print(f"memory per connection:   {per_connection / 1024:.1f} KiB")
+    print(f"latency to first (ms):   p50 {statistics.median(first) * 1000:.1f}  p99 {percentile(first, 0.99) * 1000:.1f}")
+    print(f"latency to last (ms):    p50 {statistics.median(last) * 1000:.1f}  p99 {percentile(last, 0.99) * 1000:.1f}")
+    print(f"events for 50 votes:     {burst_events}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark of the model validation of Choice and Vote on questions with many choices.
+
+Seeds a throwaway test database with one question per size of `--choices`, then times `Choice.clean()` and
+`Vote.clean()` against the checks they replaced: counting the choices of the same text, and loading every choice of
+the question to test membership. The EXISTS checks cost the same whatever the number of choices.
+
+Usage: python -m benchmarks.model_clean [--choices 10 1000 10000 50000] [--repeat 50]
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.common import setup, test_database
+
+
+def timed(function, repeat):
+    """
+    The function calls `function` `repeat` times.
+
+    :return: the median duration in milliseconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--choices', type=int, nargs='+', default=[10, 1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup()
+    from django.utils import timezone
+    from polls.models import Choice, Question, User, Vote
+
+    with test_database():
+        user = User.objects.create(userid='benchmark00000000000')
+        print(f"{'choices':>8} {'Choice count() ms':>18} {'Choice.clean() ms':>18} {'Vote in all() ms':>17} "
+              f"{'Vote.clean() ms':>16}")
+        for size in args.choices:
+            question = Question.objects.create(question_text=f"Benchmark {size}", pub_date=timezone.now())
+            Choice.objects.bulk_create([Choice(question=question, choice_text=f"Choice {number}")
+                                        for number in range(size)], batch_size=5000)
+            last = Choice.objects.filter(question=question).order_by('pk').last()
+            # Fresh instances, so no related object is cached between the runs.
+            choice = lambda: Choice(question_id=question.pk, choice_text=f"Choice {size}")
+            vote = lambda: Vote(question_id=question.pk, choice_id=last.pk, user=user)
+
+            counted = timed(lambda: choice().question.choice_set.filter(choice_text=f"Choice {size}").count(),
+                            args.repeat)
+            cleaned = timed(lambda: choice().clean(), args.repeat)
+            loaded = timed(lambda: (lambda instance: instance.choice in instance.question.choice_set.all())(vote()),
+                           args.repeat)
+            vote_cleaned = timed(lambda: vote().clean(), args.repeat)
+            print(f"{size:>8} {counted:>18.3f} {cleaned:>18.3f} {loaded:>17.3f} {vote_cleaned:>16.3f}")
+
+
+if __name__ == '__main__':
+    main()
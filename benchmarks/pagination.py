@@ -0,0 +1,73 @@
+"""
+Benchmark of OFFSET and keyset pagination of the published questions, as listed by the index and the JSON listing.
+
+Seeds a throwaway test database with `--questions` questions (generated by PostgreSQL in one statement), then fetches
+the same deep pages both ways: OFFSET makes the database read and discard the rows of all the previous pages, while
+the keyset seeks to the cursor of the previous page through the (pub_date, id) index.
+
+Usage: python -m benchmarks.pagination [--questions 10000000] [--page-size 20] [--pages 1 1000 100000] [--repeat 5]
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.common import setup, test_database
+
+
+def timed(function, repeat):
+    """
+    The function calls `function` `repeat` times.
+
+    :return: a tuple of the last result and the median duration in milliseconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return result, statistics.median(durations) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=10_000_000)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 1000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection
+    from polls import pagination, seeding
+    from polls.views import published_questions
+
+    size = args.page_size
+    with test_database():
+        start = time.perf_counter()
+        seeding.seed_questions(args.questions)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE polls_question')
+        print(f"Seeded {args.questions} questions in {time.perf_counter() - start:.1f}s.")
+
+        questions = published_questions().values('id', 'question_text', 'pub_date', 'exp_date')
+        ordered = questions.order_by('-pub_date', '-pk')
+        print(f"{'page':>8} {'OFFSET ms':>10} {'keyset ms':>10} {'speedup':>8}")
+        for page in args.pages:
+            offset = (page - 1) * size
+            if offset >= args.questions:
+                print(f"{page:>8} skipped: beyond the {args.questions} questions")
+                continue
+            # The cursor a client got with the previous page.
+            cursor = None
+            if offset:
+                previous = ordered[offset - 1]
+                cursor = pagination.encode_cursor(previous['pub_date'], previous['id'])
+
+            by_offset, offset_ms = timed(lambda: list(ordered[offset:offset + size]), args.repeat)
+            (by_keyset, _), keyset_ms = timed(lambda: pagination.keyset_page(questions, cursor, size), args.repeat)
+            assert by_offset == by_keyset, f"page {page} differs"
+            print(f"{page:>8} {offset_ms:>10.2f} {keyset_ms:>10.2f} {offset_ms / keyset_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark of the vectorized results statistics against a per-choice Python loop.
+
+Generates the tallies of `--questions` questions with 2 to `--max-choices` choices (no database is needed), then
+computes the shares, Wilson confidence intervals, leaders, margins and leader changes of all of them at once with
+`stats.pad` and `stats.compute`, and with the equivalent loop over every choice of every question. Both answers must
+match.
+
+Usage: python -m benchmarks.results_stats [--questions 100000] [--max-choices 8] [--repeat 5]
+"""
+import argparse
+import math
+import random
+import statistics
+import time
+
+from benchmarks.common import setup
+
+
+def timed(function, repeat):
+    """
+    The function calls `function` `repeat` times.
+
+    :return: a tuple of the last result and the median duration in milliseconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return result, statistics.median(durations) * 1000
+
+
+def loop_stats(tallies, previous, z):
+    """
+    The function computes the same statistics as `stats.compute`, one question and one choice at a time.
+
+    :return: a list with a (lower bounds, upper bounds, leader, margin, decided, leader changed) tuple per question.
+    """
+    def leader_of(votes):
+        leader = runner_up = None
+        for index, count in enumerate(votes):
+            if leader is None or count > votes[leader]:
+                leader, runner_up = index, leader
+            elif runner_up is None or count > votes[runner_up]:
+                runner_up = index
+        margin = votes[leader] - (votes[runner_up] if runner_up is not None else 0)
+        return (leader if sum(votes) and margin else -1), runner_up, margin
+
+    results = []
+    z2 = z * z
+    for votes, earlier in zip(tallies, previous):
+        n = sum(votes)
+        lower, upper = [], []
+        for count in votes:
+            if not n:
+                lower.append(0.0)
+                upper.append(1.0)
+                continue
+            share = count / n
+            denominator = 1 + z2 / n
+            center = (share + z2 / (2 * n)) / denominator
+            half_width = z * math.sqrt(share * (1 - share) / n + z2 / (4 * n * n)) / denominator
+            lower.append(min(max(center - half_width, 0.0), 1.0))
+            upper.append(min(max(center + half_width, 0.0), 1.0))
+        leader, runner_up, margin = leader_of(votes)
+        decided = leader >= 0 and lower[leader] > (upper[runner_up] if runner_up is not None else 0.0)
+        results.append((lower, upper, leader, margin, decided, leader_of(earlier)[0] != leader))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=100_000)
+    parser.add_argument('--max-choices', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup()
+    import numpy as np
+    from polls import stats
+
+    rng = random.Random(1)
+    tallies, previous = [], []
+    for _ in range(args.questions):
+        choices = rng.randint(2, args.max_choices)
+        previous.append([rng.randint(0, 1000) for _ in range(choices)])
+        tallies.append([count + rng.randint(0, 200) for count in previous[-1]])
+    choices = sum(map(len, tallies))
+    print(f"{args.questions} questions, {choices} choices.")
+
+    def vectorized():
+        votes, mask = stats.pad(tallies)
+        return stats.compute(votes, mask, previous=stats.pad(previous)[0])
+
+    looped, loop_ms = timed(lambda: loop_stats(tallies, previous, stats.Z_95), args.repeat)
+    computed, numpy_ms = timed(vectorized, args.repeat)
+    _, summarize_ms = timed(lambda: stats.summarize(tallies), args.repeat)
+
+    mask = stats.pad(tallies)[1]
+    assert np.allclose(computed['lower'][mask], [bound for row in looped for bound in row[0]])
+    assert np.allclose(computed['upper'][mask], [bound for row in looped for bound in row[1]])
+    assert computed['leader'].tolist() == [row[2] for row in looped]
+    assert computed['margin'].tolist() == [row[3] for row in looped]
+    assert computed['decided'].tolist() == [row[4] for row in looped]
+    assert computed['leader_changed'].tolist() == [row[5] for row in looped]
+
+    print(f"{'method':>30} {'ms':>9} {'per choice µs':>14}")
+    for name, duration in [('Python loop', loop_ms), ('pad + compute (NumPy)', numpy_ms),
+                           ('summarize (to Python values)', summarize_ms)]:
+        print(f"{name:>30} {duration:>9.1f} {duration * 1000 / choices:>14.3f}")
+    print(f"NumPy speedup: {loop_ms / numpy_ms:.1f}x; leader changed in {int(computed['leader_changed'].sum())} "
+          f"questions, decided in {int(computed['decided'].sum())}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark of the vote time series read from the rollups against a GROUP BY over the raw votes.
+
+Seeds a throwaway test database with `--votes` votes spread over the last `--days` days, rolls them up with
+`rollups.update` (timing the throughput), then computes the time series of the most popular question and of a median
+one at every resolution both ways: the rollups read one row per choice and bucket from the (question, resolution,
+bucket) index, while the GROUP BY reads and truncates the date of every vote of the question. Both answers must match.
+
+Usage: python -m benchmarks.rollups [--votes 10000000] [--questions 1000] [--users 100000] [--days 30] [--repeat 3]
+"""
+import argparse
+import datetime
+import statistics
+import time
+
+from benchmarks.common import setup, test_database
+
+
+def timed(function, repeat):
+    """
+    The function calls `function` `repeat` times.
+
+    :return: a tuple of the last result and the median duration in milliseconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return result, statistics.median(durations) * 1000
+
+
+def raw_series(question_id, resolution, start):
+    """
+    The function computes the votes per bucket and choice and the votes before `start` from the Vote table.
+
+    :return: a tuple of the {(bucket, choice_id): votes} and {choice_id: votes before start} dictionaries.
+    """
+    from django.db.models import Count
+    from django.db.models.functions import Trunc
+    from polls.models import Vote
+
+    votes = Vote.objects.filter(question_id=question_id).order_by()
+    before = {}
+    if start is not None:
+        before = dict(votes.filter(vote_date__lt=start).values('choice_id').annotate(total=Count('pk'))
+                      .values_list('choice_id', 'total'))
+        votes = votes.filter(vote_date__gte=start)
+    buckets = votes.values('choice_id', bucket=Trunc('vote_date', resolution)).annotate(total=Count('pk'))
+    return {(row['bucket'], row['choice_id']): row['total'] for row in buckets}, before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--votes', type=int, default=10_000_000)
+    parser.add_argument('--questions', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--days', type=float, default=30)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection, transaction
+    from django.db.models import Count
+    from django.utils import timezone
+    from polls import rollups, seeding
+    from polls.models import Vote, VoteRollup
+
+    with test_database():
+        start = time.perf_counter()
+        with transaction.atomic():
+            created = seeding.seed(questions=args.questions, users=args.users, votes=args.votes, random_seed=1,
+                                   period=datetime.timedelta(days=args.days))
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE polls_vote')
+        print(f"Seeded {created['votes']} votes in {time.perf_counter() - start:.1f}s.")
+
+        # A first run sees the seeded votes, the timed one a minute later rolls them up, so the rollups and the raw
+        # votes agree.
+        now = timezone.now()
+        rollups.update(now=now)
+        start = time.perf_counter()
+        result = rollups.update(now=now + datetime.timedelta(minutes=1))
+        elapsed = time.perf_counter() - start
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE polls_voterollup')
+        print(f"Rolled up {created['votes']} votes in {result['chunks']} chunks in {elapsed:.1f}s "
+              f"({created['votes'] / elapsed:,.0f} votes/s), {VoteRollup.objects.count()} buckets.")
+
+        per_question = list(Vote.objects.order_by().values('question_id').annotate(total=Count('pk'))
+                            .order_by('-total').values_list('question_id', 'total'))
+        # Aligned on a minute, so the raw votes and the buckets start together.
+        now = timezone.now().replace(second=0, microsecond=0)
+        # Minute buckets are kept for a few days only; the minute series covers the last day.
+        windows = {VoteRollup.MINUTE: now - datetime.timedelta(days=1), VoteRollup.HOUR: None, VoteRollup.DAY: None}
+        print(f"{'question':>16} {'resolution':>10} {'buckets':>8} {'GROUP BY ms':>12} {'rollups ms':>11} "
+              f"{'speedup':>8}")
+        for label, (question_id, total) in [('hottest', per_question[0]),
+                                            ('median', per_question[len(per_question) // 2])]:
+            for resolution, window in windows.items():
+                (raw, before), raw_ms = timed(lambda: raw_series(question_id, resolution, window), args.repeat)
+                data, rollup_ms = timed(lambda: rollups.series(question_id, resolution, window), args.repeat)
+                from_rollups = {(bucket['bucket'], choice['id']): votes for bucket in data['buckets']
+                                for choice, votes in zip(data['choices'], bucket['votes']) if votes}
+                assert raw == from_rollups, f"{label} {resolution} buckets differ"
+                if data['buckets']:
+                    first = data['buckets'][0]
+                    assert sum(first['cumulative']) == sum(before.values()) + sum(first['votes'])
+                print(f"{f'{label} ({total})':>16} {resolution:>10} {len(data['buckets']):>8} {raw_ms:>12.2f} "
+                      f"{rollup_ms:>11.2f} {raw_ms / rollup_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
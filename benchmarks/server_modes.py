@@ -0,0 +1,188 @@
+"""
+Benchmark of the request throughput and latency of the polls pages under WSGI, under ASGI with the synchronous views
+(ASGI-sync) and under ASGI with the asynchronous views of polls/async_views.py (ASGI-async).
+
+The applications of mysite/wsgi.py and mysite/asgi.py are called in process, without a server: WSGI requests are made
+from a pool of `--concurrency` threads, ASGI requests from as many concurrent tasks in one event loop. Every vote is
+cast by a new user.
+
+Usage: python -m benchmarks.server_modes [--requests 500] [--concurrency 16]
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import statistics
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from benchmarks.common import setup, test_database
+
+CSRF_SECRET = 'b' * 32
+
+
+def urlconf(polls_urls):
+    """
+    The function builds a root URLconf serving the polls app from the given URLconf.
+
+    :param polls_urls: The `polls_urls` parameter is the dotted path of the URLconf of the polls app
+    :return: a module with the `urlpatterns` attribute.
+    """
+    from django.urls import include, path
+
+    module = types.ModuleType(polls_urls.replace('.', '_'))
+    module.urlpatterns = [path("", include(polls_urls))]
+    return module
+
+
+def make_requests(endpoint, question, choice, count, voters):
+    """
+    The function prepares the requests of one endpoint.
+
+    :param endpoint: The `endpoint` parameter is one of 'index', 'detail', 'results' and 'vote'
+    :param question: The `question` parameter is the Question object the pages are requested for
+    :param choice: The `choice` parameter is the Choice object voted for
+    :param count: The `count` parameter is the number of requests
+    :param voters: The `voters` parameter is an iterator of unused user ids
+    :return: a list of (method, path, body) tuples.
+    """
+    if endpoint == 'vote':
+        return [('POST', f'/{question.id}/vote/',
+                 urlencode({'userId': next(voters), 'choice': choice.id, 'csrfmiddlewaretoken': CSRF_SECRET}).encode())
+                for _ in range(count)]
+    path = {'index': '/', 'detail': f'/{question.id}/', 'results': f'/{question.id}/results/'}[endpoint]
+    return [('GET', path, b'')] * count
+
+
+def headers(method):
+    result = [('host', 'testserver'), ('cookie', f'csrftoken={CSRF_SECRET}')]
+    if method == 'POST':
+        result.append(('content-type', 'application/x-www-form-urlencoded'))
+    return result
+
+
+def run_wsgi(application, requests, concurrency):
+    """
+    The function makes the requests to a WSGI application from a pool of threads.
+
+    :return: the wall time and the list of latencies, in seconds.
+    """
+    from django.db import connection
+
+    def call(request):
+        method, path, body = request
+        environ = {'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+                   'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                   'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(body), 'wsgi.errors': io.StringIO(),
+                   'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+                   'CONTENT_LENGTH': str(len(body))}
+        for name, value in headers(method):
+            key = name.upper().replace('-', '_')
+            environ[key if key in ('CONTENT_TYPE',) else f'HTTP_{key}'] = value
+        statuses = []
+        start = time.perf_counter()
+        result = application(environ, lambda status, response_headers, exc_info=None: statuses.append(status))
+        try:
+            b''.join(result)
+        finally:
+            result.close()
+        elapsed = time.perf_counter() - start
+        assert statuses[0][:3] in ('200', '302'), statuses[0]
+        return elapsed
+
+    def close():
+        connection.close()
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(call, requests))
+        wall = time.perf_counter() - start
+        list(pool.map(lambda _: close(), range(concurrency)))
+    return wall, latencies
+
+
+def run_asgi(application, requests, concurrency):
+    """
+    The function makes the requests to an ASGI application from concurrent tasks of one event loop.
+
+    :return: the wall time and the list of latencies, in seconds.
+    """
+    async def call(request, semaphore):
+        method, path, body = request
+        scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+                 'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+                 'headers': [(name.encode(), value.encode()) for name, value in headers(method)],
+                 'client': ('127.0.0.1', 0), 'server': ('testserver', 80)}
+        statuses = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        async with semaphore:
+            start = time.perf_counter()
+            await application(scope, receive, send)
+            elapsed = time.perf_counter() - start
+        assert statuses[0] in (200, 302), statuses[0]
+        return elapsed
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(call(request, semaphore) for request in requests))
+        return time.perf_counter() - start, latencies
+
+    return asyncio.run(main())
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connections
+    from django.test import override_settings
+    from django.utils import timezone
+    from mysite.asgi import django_application as asgi_application
+    from mysite.wsgi import application as wsgi_application
+    from polls.models import Question, Choice
+
+    modes = (('WSGI', run_wsgi, wsgi_application, 'polls.urls'),
+             ('ASGI-sync', run_asgi, asgi_application, 'polls.urls'),
+             ('ASGI-async', run_asgi, asgi_application, 'polls.async_urls'))
+    voters = (f"{number:020d}" for number in itertools.count())
+
+    with test_database():
+        for number in range(10):
+            Question.objects.create(question_text=f"Question {number}", pub_date=timezone.now())
+        question = Question.objects.create(question_text="Benchmark question", pub_date=timezone.now())
+        choices = [Choice.objects.create(question=question, choice_text=f"Choice {number}") for number in range(5)]
+        connections.close_all()
+
+        print(f"{'endpoint':<9} {'mode':<11} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for endpoint in ('index', 'detail', 'results', 'vote'):
+            for name, run, application, polls_urls in modes:
+                with override_settings(ROOT_URLCONF=urlconf(polls_urls)):
+                    run(application, make_requests(endpoint, question, choices[0], 20, voters), args.concurrency)
+                    wall, latencies = run(application,
+                                          make_requests(endpoint, question, choices[0], args.requests, voters),
+                                          args.concurrency)
+                print(f"{endpoint:<9} {name:<11} {len(latencies) / wall:>8.0f} "
+                      f"{statistics.median(latencies) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f}")
+        connections.close_all()
+
+
+if __name__ == '__main__':
+    main()
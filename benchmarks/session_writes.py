@@ -0,0 +1,137 @@
+"""
+Benchmark of the database writes and cookies caused by the session handling of the polls views.
+
+Compares the current views with the previous behaviour, where every read view flushed the session and the access to
+the choice form was kept in the session. Every request is made by a client that already carries a session with data,
+e.g. a visitor who has just created a poll.
+
+Usage: python -m benchmarks.session_writes [--requests 200]
+"""
+import argparse
+import time
+import types
+
+from benchmarks.common import setup, test_database
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def legacy_urlconf():
+    """
+    The function builds a URLconf serving the polls views with the previous session behaviour.
+
+    :return: a module with the `urlpatterns` attribute.
+    """
+    from django.http import Http404, HttpResponseRedirect
+    from django.urls import include, path
+    from polls import views
+
+    class SessionFlushMixin:
+        def get_queryset(self):
+            self.request.session.flush()
+            return super().get_queryset()
+
+    class IndexView(SessionFlushMixin, views.IndexView):
+        pass
+
+    class DetailView(SessionFlushMixin, views.DetailView):
+        pass
+
+    class ResultsView(SessionFlushMixin, views.ResultsView):
+        pass
+
+    class QuestionCreateView(views.QuestionCreateView):
+        def get_form(self, form_class=None):
+            self.request.session.flush()
+            return super().get_form(form_class)
+
+        def form_valid(self, form):
+            self.object = form.save()
+            self.request.session['question_id_access'] = self.object.id
+            return HttpResponseRedirect(self.get_success_url())
+
+    class ChoiceCreateView(views.ChoiceCreateView):
+        def check_access(self):
+            if self.request.session.get('question_id_access') != self.kwargs['pk']:
+                raise Http404
+
+    polls_patterns = ([
+        path("", IndexView.as_view(), name='index'),
+        path("<int:pk>/", DetailView.as_view(), name="detail"),
+        path("question_form/", QuestionCreateView.as_view(), name='question_form'),
+        path("<int:pk>/choice_form", ChoiceCreateView.as_view(), name='choice_form'),
+        path("<int:pk>/results/", ResultsView.as_view(), name="results"),
+        path("<int:question_id>/vote/", views.vote, name="vote"),
+    ], 'polls')
+    urlconf = types.ModuleType('legacy_urls')
+    urlconf.urlpatterns = [path("", include(polls_patterns))]
+    return urlconf
+
+
+def measure(urlconf, requests):
+    """
+    The function requests every read view `requests` times with a client carrying a session with data.
+
+    :param urlconf: The `urlconf` parameter is the URLconf to serve the views with, None for the current one
+    :param requests: The `requests` parameter is the number of requests per view
+    :return: a dictionary mapping view names to (queries, writes, cookies set, milliseconds) per request.
+    """
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import clear_url_caches, reverse
+    from django.utils import timezone
+    from polls.models import Question, Choice
+
+    question = Question.objects.create(question_text=f"Question {time.perf_counter_ns()}", pub_date=timezone.now())
+    for number in range(5):
+        Choice.objects.create(question=question, choice_text=f"Choice {number}")
+
+    results = {}
+    with override_settings(ROOT_URLCONF=urlconf or 'mysite.urls'):
+        clear_url_caches()
+        for name, args in (('index', ()), ('detail', (question.id,)), ('results', (question.id,)),
+                           ('question_form', ())):
+            url = reverse(f'polls:{name}', args=args)
+            queries = writes = cookies = 0
+            elapsed = 0.0
+            for _ in range(requests):
+                client = Client()
+                session = client.session
+                session['question_id_access'] = question.id
+                session.save()
+                client.cookies['sessionid'] = session.session_key
+
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = client.get(url)
+                    elapsed += time.perf_counter() - start
+                assert response.status_code == 200, response.status_code
+                queries += len(captured)
+                writes += sum(query['sql'].lstrip().upper().startswith(WRITES) for query in captured)
+                cookies += len(response.cookies)
+            results[name] = (queries / requests, writes / requests, cookies / requests, elapsed / requests * 1000)
+    clear_url_caches()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        before = measure(legacy_urlconf(), args.requests)
+        after = measure(None, args.requests)
+
+    print(f"{'view':<14} {'':>7} {'queries':>8} {'writes':>7} {'cookies':>8} {'ms':>7}")
+    for name in before:
+        for label, row in (('before', before[name]), ('after', after[name])):
+            print(f"{name:<14} {label:>7} {row[0]:>8.2f} {row[1]:>7.2f} {row[2]:>8.2f} {row[3]:>7.2f}")
+        print(f"{name:<14} {'saved':>7} {before[name][0] - after[name][0]:>8.2f} "
+              f"{before[name][1] - after[name][1]:>7.2f}")
+
+
+if __name__ == '__main__':
+    main()
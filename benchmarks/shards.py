@@ -0,0 +1,72 @@
+"""
+Benchmark of vote throughput on a single hot choice as the number of counter shards grows.
+
+Usage: python -m benchmarks.shards [--shards 0 1 2 4 8 16] [--threads 16] [--votes 4000]
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.common import setup, test_database
+
+
+def run(shards, threads, votes, run_number):
+    """
+    The function casts `votes` votes on one choice from `threads` parallel threads and measures the throughput.
+
+    :param shards: The `shards` parameter is the number of counter shards to use; 0 disables sharding
+    :param threads: The `threads` parameter is the number of concurrent voters
+    :param votes: The `votes` parameter is the total number of votes cast
+    :param run_number: The `run_number` parameter makes the question and user ids of every run unique
+    :return: the number of votes per second.
+    """
+    from django.db import connection
+    from django.test import override_settings
+    from django.utils import timezone
+    from polls import counters
+    from polls.models import Question, Choice, User, Vote
+    from polls.voting import record_vote
+
+    question = Question.objects.create(question_text=f"Hot question {run_number}", pub_date=timezone.now())
+    choice = Choice.objects.create(question=question, choice_text="Hot choice")
+    users = User.objects.bulk_create([User(userid=f"{run_number:04d}{number:016d}") for number in range(votes)])
+
+    def voter(batch):
+        try:
+            for user in batch:
+                record_vote(question, choice, user)
+        finally:
+            connection.close()
+
+    with override_settings(POLLS_VOTE_COUNTER_SHARDS=shards):
+        workers = [threading.Thread(target=voter, args=(users[number::threads],)) for number in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+    assert counters.tally(choice.pk) == Vote.objects.filter(choice=choice).count() == votes
+    counters.compact()
+    choice.refresh_from_db()
+    assert choice.votes == votes
+    return votes / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shards', type=int, nargs='+', default=[0, 1, 2, 4, 8, 16, 32])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--votes', type=int, default=4000)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        print(f"{'shards':>8} {'votes/s':>10}")
+        for run_number, shards in enumerate(args.shards):
+            print(f"{shards:>8} {run(shards, args.threads, args.votes, run_number):>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
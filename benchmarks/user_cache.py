@@ -0,0 +1,78 @@
+"""
+Benchmark of the user cache of vote() under repeat-voter traffic.
+
+Seeds a throwaway test database with questions, then lets `--voters` voters vote on `--votes-per-voter` questions
+each through the vote view, once with the user cache disabled and once enabled, and reports the queries and the time
+per vote. Only the first vote of every voter needs its User from the database when the cache is enabled.
+
+Usage: python -m benchmarks.user_cache [--voters 500] [--votes-per-voter 10] [--questions 50]
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import setup, test_database
+
+
+def run(questions, voters, votes_per_voter, prefix, rng):
+    """
+    The function makes the votes of the voters, in random order.
+
+    :return: a tuple of the number of votes, the number of queries and the elapsed seconds.
+    """
+    from django.db import connection
+    from django.test import Client
+    from django.urls import reverse
+
+    ballots = [(f"{prefix}{voter:0{20 - len(prefix)}d}", question_id, choice_id) for voter in range(voters)
+               for question_id, choice_id in rng.sample(questions, votes_per_voter)]
+    rng.shuffle(ballots)
+    client = Client()
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        start = time.perf_counter()
+        for userid, question_id, choice_id in ballots:
+            response = client.post(reverse('polls:vote', args=(question_id,)), {'userId': userid, 'choice': choice_id})
+            assert response.status_code == 302, response.status_code
+        elapsed = time.perf_counter() - start
+    return len(ballots), queries, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--voters', type=int, default=500)
+    parser.add_argument('--votes-per-voter', type=int, default=10)
+    parser.add_argument('--questions', type=int, default=50)
+    args = parser.parse_args()
+
+    setup()
+    from django.test import override_settings
+    from polls import seeding, users
+    from polls.models import Choice
+
+    rng = random.Random(0)
+    with test_database():
+        seeding.seed(questions=args.questions, users=0, votes=0, random_seed=0)
+        questions = list(Choice.objects.order_by('question_id', 'pk').distinct('question_id')
+                         .values_list('question_id', 'pk'))
+
+        print(f"{'user cache':<12} {'votes':>6} {'queries/vote':>13} {'ms/vote':>8}")
+        baseline = None
+        for label, size, prefix in (('disabled', 0, 'nocache'), ('enabled', 10000, 'cached')):
+            users.cache.clear()
+            with override_settings(POLLS_USER_CACHE_SIZE=size):
+                votes, queries, elapsed = run(questions, args.voters, args.votes_per_voter, prefix, rng)
+            print(f"{label:<12} {votes:>6} {queries / votes:>13.2f} {elapsed / votes * 1000:>8.2f}")
+            baseline = baseline or queries
+        print(f"Queries saved: {baseline - queries} ({1 - queries / baseline:.1%}), "
+              f"cache hits {users.cache.hits}, misses {users.cache.misses}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Benchmark suite of the views of polls/urls.py.
+
+Seeds a throwaway test database with a Zipf-skewed dataset, then requests every URL of the polls app through the test
+client and reports the throughput, latency percentiles and query counts of every view. The results are saved as JSON,
+and a previous result file can be given to print the changes.
+
+Usage: python -m benchmarks.views [--requests 200] [--votes 200000] [--output FILE] [--compare FILE]
+"""
+import argparse
+import datetime
+import json
+import statistics
+import subprocess
+import time
+from pathlib import Path
+
+from benchmarks.common import setup, test_database
+
+API_KEY = 'benchmark-key'
+
+
+def request_builders(question, choice):
+    """
+    The function returns how every named URL of the polls app is requested.
+
+    :param question: The `question` parameter is the most popular question of the dataset
+    :param choice: The `choice` parameter is a Choice object of the question
+    :return: a dictionary mapping URL names to functions making one request with a client; None marks URLs skipped
+    with a reason.
+    """
+    from django.urls import reverse
+    from polls import access
+
+    voters = iter(range(10 ** 9))
+
+    def vote(client):
+        return client.post(reverse('polls:vote', args=(question.id,)),
+                           {'userId': f"bench{next(voters):015d}", 'choice': choice.id})
+
+    def bulk_import(client):
+        batch = next(voters)
+        body = "\n".join(json.dumps({'question_text': f"Imported {batch}-{number}", 'choices': ["A", "B", "C"]})
+                         for number in range(100))
+        return client.post(reverse('polls:bulk_import'), body, content_type='application/x-ndjson',
+                           HTTP_AUTHORIZATION=f"Bearer {API_KEY}")
+
+    def api_votes(client):
+        ballots = [[question.id, choice.id, f"batch{next(voters):015d}"] for _ in range(100)]
+        return client.post(reverse('polls:api_votes'), json.dumps(ballots), content_type='application/json',
+                           HTTP_AUTHORIZATION=f"Bearer {API_KEY}")
+
+    def bulk_export(client):
+        response = client.get(reverse('polls:bulk_export'))
+        b''.join(response.streaming_content)
+        return response
+
+    def choice_form(client):
+        client.cookies[access.COOKIE_NAME] = access.sign(question.id)
+        return client.get(reverse('polls:choice_form', args=(question.id,)))
+
+    return {
+        'index': lambda client: client.get(reverse('polls:index')),
+        'detail': lambda client: client.get(reverse('polls:detail', args=(question.id,))),
+        'question_form': lambda client: client.get(reverse('polls:question_form')),
+        'choice_form': choice_form,
+        'results': lambda client: client.get(reverse('polls:results', args=(question.id,))),
+        'results_stream': "needs ASGI; see benchmarks.live_results",
+        'vote': vote,
+        'bulk_import': bulk_import,
+        'bulk_export': bulk_export,
+        'api_questions': lambda client: client.get(reverse('polls:api_questions')),
+        'api_question_batch': lambda client: client.get(reverse('polls:api_question_batch'), {'ids': question.id}),
+        'api_question': lambda client: client.get(reverse('polls:api_question', args=(question.id,))),
+        'api_results': lambda client: client.get(reverse('polls:api_results', args=(question.id,))),
+        'api_votes': api_votes,
+    }
+
+
+def measure(make_request, requests, warmup=10):
+    """
+    The function makes `requests` requests to one view and measures them.
+
+    :param make_request: The `make_request` parameter is a function making one request with the given client
+    :param requests: The `requests` parameter is the number of measured requests
+    :param warmup: The `warmup` parameter is the number of requests made before measuring
+    :return: a dictionary with the throughput, the latency percentiles in milliseconds and the query counts.
+    """
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client = Client()
+    for _ in range(warmup):
+        make_request(client)
+
+    latencies, queries, statuses = [], [], set()
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = make_request(client)
+            latencies.append(time.perf_counter() - start)
+        queries.append(len(captured))
+        statuses.add(response.status_code)
+
+    latencies.sort()
+
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+    return {
+        'requests': requests,
+        'throughput': requests / sum(latencies),
+        'latency_ms': {'mean': statistics.mean(latencies) * 1000, 'p50': percentile(0.5), 'p90': percentile(0.9),
+                       'p99': percentile(0.99), 'max': latencies[-1] * 1000},
+        'queries': {'mean': statistics.mean(queries), 'max': max(queries)},
+        'statuses': sorted(statuses),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    """
+    The function seeds the dataset and measures every view of polls/urls.py.
+
+    :return: the report, a JSON-serializable dictionary.
+    """
+    from django.conf import settings
+    from polls import seeding
+    from polls.models import Question
+    from polls.urls import urlpatterns
+
+    dataset = seeding.seed(questions=args.questions, users=args.users, votes=args.votes, skew=args.skew,
+                           random_seed=0)
+    question = Question.objects.order_by('-choice__votes').first()
+    builders = request_builders(question, question.choice_set.order_by('pk').first())
+
+    views = {}
+    for pattern in urlpatterns:
+        builder = builders.get(pattern.name, "no request defined in benchmarks.views")
+        if isinstance(builder, str):
+            views[pattern.name] = {'skipped': builder}
+        else:
+            views[pattern.name] = measure(builder, args.requests)
+    return {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'dataset': dataset,
+        'settings': {name: getattr(settings, name, None) for name in
+                     ('POLLS_VOTE_COUNTER_SHARDS', 'POLLS_VOTE_BUFFER', 'POLLS_ASYNC_VIEWS', 'POLLS_RESULTS_CACHE')},
+        'views': views,
+    }
+
+
+def print_report(report, baseline=None):
+    print(f"{'view':<15} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'queries':>8}"
+          + (f" {'req/s vs base':>14}" if baseline else ""))
+    for name, result in report['views'].items():
+        if 'skipped' in result:
+            print(f"{name:<15} skipped: {result['skipped']}")
+            continue
+        latency = result['latency_ms']
+        line = (f"{name:<15} {result['throughput']:>8.0f} {latency['p50']:>8.2f} {latency['p90']:>8.2f} "
+                f"{latency['p99']:>8.2f} {result['queries']['mean']:>8.1f}")
+        base = (baseline or {}).get('views', {}).get(name, {})
+        if 'throughput' in base:
+            line += f" {result['throughput'] / base['throughput'] - 1:>+13.1%}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help="Measured requests per view.")
+    parser.add_argument('--questions', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--votes', type=int, default=200000)
+    parser.add_argument('--skew', type=float, default=1.0)
+    parser.add_argument('--output', type=Path, help="JSON file of the results; defaults to var/benchmarks/.")
+    parser.add_argument('--compare', type=Path, help="JSON file of an earlier run to compare with.")
+    args = parser.parse_args()
+
+    setup()
+    from django.conf import settings
+    from django.test import override_settings
+
+    with test_database(), override_settings(POLLS_API_KEYS={'benchmark': API_KEY}):
+        report = run(args)
+
+    output = args.output or (Path(settings.BASE_DIR) / 'var' / 'benchmarks'
+                             / f"views-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print_report(report, baseline)
+    print(f"Saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 """
 ASGI config for mysite project.
 
-It exposes the ASGI callable as a module-level variable named ``application``.
+It exposes the ASGI callable as a module-level variable named ``application``. The live results stream of the polls
+app (server-sent events) is served only through this entry point.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -13,4 +14,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from polls.live import cancel_on_disconnect  # noqa: E402 (needs the apps loaded by get_asgi_application)
+
+application = cancel_on_disconnect(django_application)
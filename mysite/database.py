@@ -0,0 +1,104 @@
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+from psycopg import ProgrammingError
+from psycopg.conninfo import conninfo_to_dict
+
+POSTGRESQL_ENGINE = 'django.db.backends.postgresql'
+POOLED_ENGINE = 'mysite.postgresql_pool'
+
+# The settings of the connection string stored in their own keys of the DATABASES entry; the others go to OPTIONS.
+KEYS = {'dbname': 'NAME', 'user': 'USER', 'password': 'PASSWORD', 'host': 'HOST', 'port': 'PORT'}
+
+
+def parse(conninfo):
+    """
+    The function reads a PostgreSQL connection string, either a libpq "key=value" string (as in
+    AZURE_POSTGRESQL_CONNECTIONSTRING) or a postgresql:// URL, with the libpq rules for quoting and escaping.
+
+    :param conninfo: The `conninfo` parameter is the connection string
+    :return: a dictionary with the NAME, USER, PASSWORD, HOST, PORT and OPTIONS (e.g. sslmode) keys of a DATABASES
+    entry. An ImproperlyConfigured error is raised for invalid strings.
+    """
+    try:
+        parameters = conninfo_to_dict(conninfo)
+    except ProgrammingError as error:
+        raise ImproperlyConfigured(f"Invalid PostgreSQL connection string: {error}") from None
+    database = {key: str(parameters.pop(name, '')) for name, key in KEYS.items()}
+    database['OPTIONS'] = parameters
+    return database
+
+
+def config(conninfo, conn_max_age=60, health_checks=True, pool=None):
+    """
+    The function builds the DATABASES entry of a PostgreSQL database, with persistent or pooled connections.
+
+    Persistent connections are kept by every thread for `conn_max_age` seconds and reused by its next requests.
+    Pooled connections are shared by the threads of a process: each request borrows one from a psycopg pool and gives
+    it back at its end, so fewer connections serve more threads (and ASGI, where persistent connections do not
+    apply). Either way, with `health_checks` a reused connection is checked before serving a request, so a connection
+    dropped by the server or a proxy is replaced rather than failing the request.
+
+    :param conninfo: The `conninfo` parameter is the connection string, see `parse`
+    :param conn_max_age: The `conn_max_age` parameter is the lifetime of persistent connections in seconds, 0 to
+    close them after every request or None to keep them forever; ignored with a pool
+    :param health_checks: The `health_checks` parameter enables the checks of reused connections
+    :param pool: The `pool` parameter is a dictionary of psycopg ConnectionPool options (e.g. min_size, max_size,
+    timeout), or None for no pool
+    :return: the DATABASES entry.
+    """
+    database = parse(conninfo)
+    database.update(ENGINE=POSTGRESQL_ENGINE, CONN_MAX_AGE=conn_max_age, CONN_HEALTH_CHECKS=health_checks)
+    if pool is not None:
+        # Every request gives its connection back to the pool.
+        database.update(ENGINE=POOLED_ENGINE, CONN_MAX_AGE=0)
+        database['OPTIONS']['pool'] = pool
+    return database
+
+
+def from_environment(default=None, environ=os.environ):
+    """
+    The function builds the DATABASES entry configured by the environment:
+
+    - DATABASE_URL or AZURE_POSTGRESQL_CONNECTIONSTRING: the connection string (`default` if neither is set);
+    - DB_CONN_MAX_AGE: the lifetime of persistent connections in seconds, 60 by default, "none" for unlimited;
+    - DB_HEALTH_CHECKS: "0" disables the checks of reused connections;
+    - DB_POOL: "1" enables the connection pool, sized by DB_POOL_MIN_SIZE (2) and DB_POOL_MAX_SIZE (10), with a
+      DB_POOL_TIMEOUT (10 seconds) to wait for a free connection.
+
+    :param default: The `default` parameter is the connection string used without one in the environment
+    :param environ: The `environ` parameter is the mapping of the environment variables
+    :return: the DATABASES entry.
+    """
+    conninfo = environ.get('DATABASE_URL') or environ.get('AZURE_POSTGRESQL_CONNECTIONSTRING') or default
+    if conninfo is None:
+        raise ImproperlyConfigured("Set DATABASE_URL or AZURE_POSTGRESQL_CONNECTIONSTRING")
+    try:
+        max_age = environ.get('DB_CONN_MAX_AGE', '60')
+        conn_max_age = None if max_age.lower() == 'none' else int(max_age)
+        pool = None
+        if environ.get('DB_POOL', '0') == '1':
+            pool = {'min_size': int(environ.get('DB_POOL_MIN_SIZE', 2)),
+                    'max_size': int(environ.get('DB_POOL_MAX_SIZE', 10)),
+                    'timeout': float(environ.get('DB_POOL_TIMEOUT', 10))}
+    except ValueError as error:
+        raise ImproperlyConfigured(f"Invalid database setting in the environment: {error}") from None
+    return config(conninfo, conn_max_age=conn_max_age, health_checks=environ.get('DB_HEALTH_CHECKS', '1') != '0',
+                  pool=pool)
+
+
+def replicas_from_environment(environ=os.environ):
+    """
+    The function builds the DATABASES entries of the read replicas listed by DATABASE_REPLICA_URLS, whitespace
+    separated postgresql:// URLs, connected like the primary (see `from_environment`). The replicas mirror the primary
+    in the tests.
+
+    :param environ: The `environ` parameter is the mapping of the environment variables
+    :return: a dictionary of the DATABASES entries by alias, 'replica1', 'replica2' and so on.
+    """
+    replicas = {}
+    for number, url in enumerate(environ.get('DATABASE_REPLICA_URLS', '').split(), 1):
+        replica = from_environment(environ={**environ, 'DATABASE_URL': url})
+        replica['TEST'] = {'MIRROR': 'default'}
+        replicas[f'replica{number}'] = replica
+    return replicas
@@ -1,6 +1,7 @@
 import os
 from .settings import *
 from .settings import BASE_DIR
+from . import database
 
 ALLOWED_HOSTS = [os.environ['WEBSITE_HOSTNAME']]
 CSRF_TRUSTED_ORIGINS = ['https://' + os.environ['WEBSITE_HOSTNAME']]
@@ -8,6 +9,8 @@ DEBUG = False
 SECRET_KEY = os.environ['SECRET_KEY']
 
 MIDDLEWARE = [
+    'polls.metrics.MetricsMiddleware',
+    'polls.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -18,18 +21,21 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Request metrics of a sample of the requests, served by /metrics to the local scraper only; the per-request log lines
+# and Server-Timing headers are left to development.
+POLLS_METRICS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 0.1,
+    'LOG': False,
+    'SERVER_TIMING': False,
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 STATIC_ROOT = (BASE_DIR.as_posix() + '/staticfiles')
 
-connection_string = os.environ['AZURE_POSTGRESQL_CONNECTIONSTRING']
-parameters = {pair.split('=')[0]: pair.split('=')[1] for pair in connection_string.split(' ')}
-
+# AZURE_POSTGRESQL_CONNECTIONSTRING is a libpq "key=value" string. Connections are pooled unless DB_POOL says otherwise.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': parameters['dbname'],
-        'HOST': parameters['host'],
-        'USER': parameters['user'],
-        'PASSWORD': parameters['password'],
-    }
+    'default': database.from_environment(environ={'DB_POOL': '1', **os.environ}),
+    **database.replicas_from_environment(environ={'DB_POOL': '1', **os.environ}),
 }
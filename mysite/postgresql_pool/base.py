@@ -0,0 +1,95 @@
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+from psycopg_pool import ConnectionPool
+
+
+# The DatabaseCreation class closes the pool before the test database is dropped, since its idle connections would
+# keep the database in use.
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        self.connection.close_pool()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+# The DatabaseWrapper class is the PostgreSQL backend with the connections of every database alias borrowed from a
+# psycopg connection pool shared by the threads of the process, configured by the "pool" dictionary of OPTIONS
+# (ConnectionPool arguments such as min_size, max_size and timeout). Closing the connection, which Django does at the
+# end of every request, gives it back to the pool; with CONN_HEALTH_CHECKS the pool checks it before lending it again.
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    # The pools of the process by alias, with the database name they connect to.
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    @property
+    def pool(self):
+        """
+        The function returns the connection pool of the database alias, created on first use.
+
+        :return: the ConnectionPool, or None for the connections to the 'postgres' database made outside of any alias.
+        """
+        if self.alias == NO_DB_ALIAS:
+            return None
+        key = (self.alias, self.settings_dict['NAME'])
+        pool = self._pools.get(key)
+        if pool is None:
+            if self.settings_dict['CONN_MAX_AGE'] != 0:
+                raise ImproperlyConfigured("A pooled database needs CONN_MAX_AGE = 0: connections live in the pool.")
+            with self._pools_lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    kwargs = self.get_connection_params()
+                    # Django switches to its own autocommit mode once the connection is lent.
+                    kwargs['autocommit'] = True
+                    check = ConnectionPool.check_connection if self.settings_dict['CONN_HEALTH_CHECKS'] else None
+                    pool = ConnectionPool(kwargs=kwargs, open=False, check=check, name=self.alias,
+                                          **self.settings_dict['OPTIONS'].get('pool', {}))
+                    self._pools[key] = pool
+        return pool
+
+    def close_pool(self):
+        """
+        The function closes the connection of the wrapper and all connections of the pool of its alias.
+        """
+        self.close()
+        pool = self._pools.pop((self.alias, self.settings_dict['NAME']), None)
+        if pool is not None:
+            pool.close()
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        # Opened on first use rather than at startup, so management commands never connect in vain.
+        pool.open()
+        connection = pool.getconn()
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        try:
+            self.isolation_level = base.IsolationLevel(
+                base.IsolationLevel.READ_COMMITTED if isolation_level is None else isolation_level)
+        except ValueError:
+            pool.putconn(connection)
+            raise ImproperlyConfigured(f"Invalid transaction isolation level {isolation_level} specified. Use one "
+                                       f"of the psycopg.IsolationLevel values.")
+        if isolation_level is not None:
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        pool = self.connection._pool if self.connection is not None else None
+        if pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            # The pool the connection came from, which is rolled back there if a transaction is still open.
+            pool.putconn(self.connection)
+        # Lent to another thread from now on, even if closed within an atomic block.
+        self.connection = None
@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+
+from . import database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'polls.metrics.MetricsMiddleware',
+    'polls.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,7 +59,7 @@ ROOT_URLCONF = 'mysite.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'polls.metrics.DjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -74,17 +79,19 @@ WSGI_APPLICATION = 'mysite.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# The connection string comes from DATABASE_URL (a postgresql:// URL or a libpq "key=value" string); connections are
+# kept for DB_CONN_MAX_AGE seconds and checked before reuse, or borrowed from a per-process pool with DB_POOL=1. See
+# mysite/database.py for all the variables. Read replicas are listed by DATABASE_REPLICA_URLS.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'mydatabase',
-        'USER': 'admin',
-        'PASSWORD': 'admin',
-        'HOST': '127.0.0.1',
-        'PORT': '5432',
-    }
+    'default': database.from_environment(
+        default='dbname=mydatabase user=admin password=admin host=127.0.0.1 port=5432'),
+    **database.replicas_from_environment(),
 }
 
+# The reads of the index, detail and results pages go to the read replicas of POLLS_READ_REPLICAS, the rest to
+# 'default' (polls/replicas.py).
+DATABASE_ROUTERS = ['polls.replicas.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -127,7 +134,100 @@ STATICFILES_DIRS = (str(BASE_DIR.joinpath('polls/static')),)
 STATIC_URL = '/polls/static/'
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Polls
+
+# Number of seconds the creator of a question may add choices to it, using the signed cookie set on question creation.
+POLLS_QUESTION_ACCESS_MAX_AGE = 3600
+
+# Number of counter rows the votes of a choice are spread over; 0 counts votes directly in Choice.votes. Shards are
+# folded back with `python manage.py compact_vote_shards`.
+POLLS_VOTE_COUNTER_SHARDS = 0
+
+# Seconds `python manage.py reconcile_votes` keeps re-checking the newest votes before its checkpoint moves past them;
+# longer than any transaction inserting votes, whose ids may commit out of order.
+POLLS_RECONCILE_SETTLE = 10
+
+# Write-behind vote buffer. When enabled, vote() appends accepted votes to an append-only log in PATH (relative to
+# BASE_DIR) and a background thread stores them in batches of up to FLUSH_SIZE votes every FLUSH_INTERVAL seconds.
+# Every worker process keeps its own log segments; segments of dead processes untouched for STALE_AFTER seconds are
+# replayed by the live ones.
+POLLS_VOTE_BUFFER = {
+    'ENABLED': False,
+    'PATH': 'var/vote-buffer',
+    'FLUSH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,
+    'FSYNC': False,
+    'STALE_AFTER': 60.0,
+}
+
+# User id cache of vote(): the primary keys of up to SIZE recent voters are kept for TTL seconds in every worker
+# process, so repeat voters skip the get_or_create() of their User. 0 disables the cache.
+POLLS_USER_CACHE_SIZE = 10000
+POLLS_USER_CACHE_TTL = 600
+
+# Serve the index, detail, results and vote pages with the asynchronous views of polls/async_views.py. Only worth it
+# under ASGI (mysite/asgi.py); under WSGI every async view is run through an event loop of its own.
+POLLS_ASYNC_VIEWS = False
+
+# Cache alias and timeout (seconds) of the rendered results fragments. Fragments are keyed by a results version that is
+# bumped whenever a vote or a choice of the question is committed.
+POLLS_RESULTS_CACHE = 'default'
+POLLS_RESULTS_CACHE_TIMEOUT = 300
+
+# Live results (server-sent events, ASGI only). Every TICK seconds the changed tallies are pushed to the subscribers, at
+# most one event per question; idle streams get a keep-alive comment every HEARTBEAT seconds. The broadcaster relies on
+# the results versions, so with several worker processes POLLS_RESULTS_CACHE must be a shared cache.
+POLLS_LIVE_RESULTS_TICK = 1.0
+POLLS_LIVE_RESULTS_HEARTBEAT = 15.0
+
+# Vote rollups (polls/rollups.py, `manage.py rollup_votes`): the per-choice minute, hour and day vote counts the time
+# series are read from. Votes are rolled up by id, by the first run at least SETTLE seconds after a run saw them (so
+# votes committed out of id order are not skipped), CHUNK_SIZE votes per transaction; minute buckets are kept for
+# MINUTE_RETENTION_DAYS days, hour and day buckets forever.
+POLLS_VOTE_ROLLUPS = {
+    'SETTLE': 10,
+    'CHUNK_SIZE': 100000,
+    'MINUTE_RETENTION_DAYS': 14,
+}
+
+# Request metrics. A SAMPLE_RATE fraction of the requests is measured (wall, database and template time, query and
+# duplicate query counts): the measurements are added to the per-URL-name histograms served by /metrics to the
+# ALLOWED_IPS (None allows everyone), logged as JSON to the 'polls.metrics' logger at INFO level (if LOG) and returned
+# in the Server-Timing response header (if SERVER_TIMING).
+POLLS_METRICS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,
+    'LOG': True,
+    'SERVER_TIMING': True,
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+# Read replicas (polls/replicas.py). The index, detail and results pages read from one of the database ALIASES, picked
+# at random per request; every other view and every write use 'default'. A successful POST pins the client to
+# 'default' for PIN_SECONDS seconds (a cookie), which must exceed the replication lag, so a voter is redirected to
+# results showing their own vote.
+POLLS_READ_REPLICAS = {
+    'ALIASES': [alias for alias in DATABASES if alias != 'default'],
+    'PIN_SECONDS': 5,
+}
+
+# API keys of the machine clients of api/votes/ (kiosks and offline clients) and import/ (which staff members may also
+# use from their session), mapping client names to keys. The clients send ``Authorization: Bearer <key>`` instead of a
+# CSRF token. Read from the POLLS_API_KEYS environment variable, a comma-separated list of name=key pairs.
+POLLS_API_KEYS = dict(entry.split('=', 1) for entry in os.environ.get('POLLS_API_KEYS', '').split(',') if '=' in entry)
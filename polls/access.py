@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+COOKIE_NAME = 'question_access'
+SALT = 'polls.question_access'
+
+
+def max_age():
+    """
+    The function returns how long the creator of a question may add choices to it.
+
+    :return: the value of the `POLLS_QUESTION_ACCESS_MAX_AGE` setting in seconds.
+    """
+    return getattr(settings, 'POLLS_QUESTION_ACCESS_MAX_AGE', 3600)
+
+
+def sign(question_id):
+    """
+    The function creates the signed, timestamped access token of a question.
+
+    :param question_id: The `question_id` parameter is the primary key of the question
+    :return: the token, a string as stored in the cookie.
+    """
+    return signing.get_cookie_signer(salt=COOKIE_NAME + SALT).sign(str(question_id))
+
+
+def grant(response, question_id):
+    """
+    The function gives the client access to the choice creation form of a question by setting a signed cookie. The
+    cookie is sent back only to the choice form of that question, so no server-side session is needed.
+
+    :param response: The `response` parameter is the HttpResponse sent to the creator of the question
+    :param question_id: The `question_id` parameter is the primary key of the created question
+    """
+    response.set_cookie(COOKIE_NAME, sign(question_id), max_age=max_age(),
+                        path=reverse('polls:choice_form', kwargs={'pk': question_id}), httponly=True, samesite='Lax')
+
+
+def has_access(request, question_id):
+    """
+    The function checks if the request carries a valid, unexpired access token of the question.
+
+    :param request: The `request` parameter is the HttpRequest of the choice creation form
+    :param question_id: The `question_id` parameter is the primary key of the question
+    :return: True if the client may add choices to the question, else False.
+    """
+    token = request.get_signed_cookie(COOKIE_NAME, default=None, salt=SALT, max_age=max_age())
+    return token == str(question_id)
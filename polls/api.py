@@ -0,0 +1,339 @@
+import collections
+import datetime
+import itertools
+import json
+
+from django.conf import settings
+from django.db.models import F
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlencode
+from django.views.decorators.http import require_GET, require_POST
+
+from . import keys, pagination, results_cache, rollups, stats, voting
+from .models import Choice, VoteRollup
+from .views import published_questions
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_BATCH_SIZE = 100
+MAX_BALLOTS = 10000
+# The status of ballots that are not a [question_id, choice_id, userid] array.
+MALFORMED = 'malformed'
+
+QUESTION_FIELDS = ('id', 'question_text', 'pub_date', 'exp_date')
+CHOICE_FIELDS = ('id', 'choice_text')
+RESULT_FIELDS = ('id', 'choice_text', 'votes', 'percentage', 'lower', 'upper')
+
+# The span of a time series without a `start`, before its `end`: one day of minutes, a month of hours, all the days.
+DEFAULT_SPANS = {
+    VoteRollup.MINUTE: datetime.timedelta(days=1),
+    VoteRollup.HOUR: datetime.timedelta(days=31),
+    VoteRollup.DAY: None,
+}
+
+
+def error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def sparse_fields(request, allowed, name='fields'):
+    """
+    The function reads a sparse fieldset, a comma-separated list of the fields a client wants in the response.
+
+    :param request: The `request` parameter is the HttpRequest of the API call
+    :param allowed: The `allowed` parameter is the tuple of the fields of the resource, all returned by default
+    :param name: The `name` parameter is the query parameter of the fieldset
+    :return: a tuple of the requested fields, in the order of `allowed`. A ValueError is raised for unknown fields.
+    """
+    value = request.GET.get(name)
+    if not value:
+        return allowed
+    fields = set(value.split(','))
+    if unknown := fields.difference(allowed):
+        raise ValueError(f"Unknown {name}: {', '.join(sorted(unknown))}")
+    return tuple(field for field in allowed if field in fields)
+
+
+def project(rows, fields):
+    """
+    The function keeps only the requested fields of rows fetched with additional ones.
+
+    :param rows: The `rows` parameter is a list of dictionaries
+    :param fields: The `fields` parameter is the tuple of the kept fields
+    :return: the list of the projected dictionaries, or `rows` itself if nothing is dropped.
+    """
+    if not rows or len(rows[0]) == len(fields):
+        return rows
+    return [{field: row[field] for field in fields} for row in rows]
+
+
+def with_choices(questions, choice_fields):
+    """
+    The function adds the list of choices, in primary key order, to every question, with one query for all of them.
+
+    :param questions: The `questions` parameter is a list of question dictionaries, with their `id`
+    :param choice_fields: The `choice_fields` parameter is the tuple of the fields of the choices
+    :return: the questions.
+    """
+    choices = (Choice.objects.filter(question_id__in=[question['id'] for question in questions])
+               .order_by('question_id', 'pk').values('question_id', *choice_fields))
+    choices_of = {question_id: [{field: choice[field] for field in choice_fields} for choice in group]
+                  for question_id, group in itertools.groupby(choices, key=lambda choice: choice['question_id'])}
+    for question in questions:
+        question['choices'] = choices_of.get(question['id'], [])
+    return questions
+
+
+def fetch_questions(ids, fields, choice_fields):
+    """
+    The function fetches published questions as dictionaries, without instantiating any model: one query for the
+    questions and, if the `choices` field is requested, one for all their choices.
+
+    :param ids: The `ids` parameter is a list of primary keys of questions
+    :param fields: The `fields` parameter is the tuple of the requested fields of the questions, possibly `choices`
+    :param choice_fields: The `choice_fields` parameter is the tuple of the requested fields of the choices
+    :return: a dictionary mapping the primary keys of the published questions among `ids` to their dictionaries.
+    """
+    columns = [field for field in fields if field != 'choices']
+    questions = list(published_questions().filter(pk__in=ids).values('id', *columns))
+    if 'choices' in fields:
+        with_choices(questions, choice_fields)
+    found = {question['id']: question for question in questions}
+    if 'id' not in fields:
+        for question in questions:
+            del question['id']
+    return found
+
+
+@require_GET
+def question_list(request):
+    """
+    The function lists the published questions as JSON, from the newest, one keyset-paginated page at a time. Only the
+    listed columns are fetched, straight into dictionaries.
+
+    :param request: The request object represents the HTTP request made by the user; the `limit` query parameter sets
+    the page size (20 by default, at most 100), the `after` query parameter is the cursor of the previous page and the
+    `fields` query parameter selects the fields of the questions
+    :return: a JsonResponse with the `questions` of the page and the URL of the `next` page (None on the last page), or
+    400 Bad Request for an invalid limit, cursor or field.
+    """
+    try:
+        limit = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        return error("limit must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return error(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    try:
+        fields = sparse_fields(request, QUESTION_FIELDS)
+        # The cursor of the next page is made of the id and pub_date of the last question.
+        questions = published_questions().values(*dict.fromkeys(('id', 'pub_date', *fields)))
+        questions, cursor = pagination.keyset_page(questions, request.GET.get('after'), limit)
+    except ValueError as exc:
+        return error(str(exc))
+    params = {'after': cursor, 'limit': limit}
+    if 'fields' in request.GET:
+        params['fields'] = request.GET['fields']
+    next_url = f"{reverse('polls:api_questions')}?{urlencode(params)}" if cursor else None
+    return JsonResponse({'questions': project(questions, fields), 'next': next_url})
+
+
+@require_GET
+def question_detail(request, pk):
+    """
+    The function returns a published question with its choices as JSON, with two queries.
+
+    :param request: The request object represents the HTTP request made by the user; the `fields` and `choice_fields`
+    query parameters select the fields of the question (including `choices`) and of its choices
+    :param pk: The `pk` parameter is the primary key of the question
+    :return: a JsonResponse with the question, 404 Not Found for an unpublished question or 400 Bad Request for an
+    unknown field.
+    """
+    try:
+        fields = sparse_fields(request, QUESTION_FIELDS + ('choices',))
+        choice_fields = sparse_fields(request, CHOICE_FIELDS, 'choice_fields')
+    except ValueError as exc:
+        return error(str(exc))
+    question = fetch_questions([pk], fields, choice_fields).get(pk)
+    if question is None:
+        return error("No published question matches the given id", status=404)
+    return JsonResponse(question)
+
+
+@require_GET
+def question_batch(request):
+    """
+    The function returns many published questions with their choices as JSON in one call, with two queries whatever
+    the number of questions, instead of one page request per question.
+
+    :param request: The request object represents the HTTP request made by the user; the `ids` query parameter is the
+    comma-separated list of the primary keys of the questions (at most 100) and the `fields` and `choice_fields` query
+    parameters select the fields as in `question_detail`
+    :return: a JsonResponse with the found `questions`, in the order of `ids`, and the ids `missing` among the
+    published questions, or 400 Bad Request for invalid ids or fields.
+    """
+    try:
+        ids = list(dict.fromkeys(int(pk) for pk in request.GET.get('ids', '').split(',') if pk))
+    except ValueError:
+        return error("ids must be a comma-separated list of integers")
+    if not 1 <= len(ids) <= MAX_BATCH_SIZE:
+        return error(f"ids must list 1 to {MAX_BATCH_SIZE} questions")
+    try:
+        fields = sparse_fields(request, QUESTION_FIELDS + ('choices',))
+        choice_fields = sparse_fields(request, CHOICE_FIELDS, 'choice_fields')
+    except ValueError as exc:
+        return error(str(exc))
+    found = fetch_questions(ids, fields, choice_fields)
+    return JsonResponse({'questions': [found[pk] for pk in ids if pk in found],
+                         'missing': [pk for pk in ids if pk not in found]})
+
+
+def with_statistics(choices):
+    """
+    The function adds the statistics of the results of a question to its choices.
+
+    :param choices: The `choices` parameter is the list of choice dictionaries of the results, with their `id` and
+    `votes`
+    :return: a tuple of the new choice dictionaries with the `lower` and `upper` bounds of the 95% confidence interval
+    of their percentage, and the `stats` dictionary with the `leader` choice id (None without votes or on a tie), the
+    `margin` of victory in votes and `margin_points` in percentage points and whether the race is `decided`.
+    """
+    summary = stats.summarize([[choice['votes'] for choice in choices]])[0]
+    choices = [{**choice, 'lower': lower, 'upper': upper}
+               for choice, (lower, upper) in zip(choices, summary['intervals'])]
+    leader = choices[summary['leader']]['id'] if summary['leader'] is not None else None
+    return choices, {'leader': leader, 'margin': summary['margin'], 'margin_points': summary['margin_points'],
+                     'decided': summary['decided']}
+
+
+@require_GET
+def question_results(request, pk):
+    """
+    The function returns the results of a published question as JSON: the vote tally and percentage of every choice
+    and the total. A finalized question is answered from its snapshot, fetched with the question in one query; the
+    tallies of an open question are read from the results cache, computed by the database on a miss.
+
+    :param request: The request object represents the HTTP request made by the user; the `choice_fields` query
+    parameter selects the fields of the choices
+    :param pk: The `pk` parameter is the primary key of the question
+    :return: a JsonResponse with the question `id`, the `total`, whether the results are `final`, the `choices` and
+    their `stats` (see `with_statistics`), 404 Not Found for an unpublished question or 400 Bad Request for an unknown
+    field.
+    """
+    try:
+        choice_fields = sparse_fields(request, RESULT_FIELDS, 'choice_fields')
+    except ValueError as exc:
+        return error(str(exc))
+    question = (published_questions().filter(pk=pk)
+                .values('id', total=F('snapshot__total'), choices=F('snapshot__choices')).first())
+    if question is None:
+        return error("No published question matches the given id", status=404)
+    if question['total'] is not None:
+        choices, statistics = with_statistics(question['choices'])
+        return JsonResponse({**question, 'final': True, 'choices': project(choices, choice_fields),
+                             'stats': statistics})
+
+    total, choices = results_cache.results_data(pk)
+    choices, statistics = with_statistics(choices)
+    return JsonResponse({'id': pk, 'total': total, 'final': False, 'choices': project(choices, choice_fields),
+                         'stats': statistics})
+
+
+def date_param(request, name):
+    """
+    The function reads an ISO 8601 date and time query parameter, in the time zone of the stored dates.
+
+    :param request: The `request` parameter is the HttpRequest of the API call
+    :param name: The `name` parameter is the query parameter
+    :return: the datetime, or None if the parameter is missing. A ValueError is raised for invalid values.
+    """
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"{name} must be an ISO 8601 date and time")
+    if settings.USE_TZ and timezone.is_naive(parsed):
+        return timezone.make_aware(parsed)
+    if not settings.USE_TZ and timezone.is_aware(parsed):
+        return timezone.make_naive(parsed)
+    return parsed
+
+
+@require_GET
+def question_timeseries(request, pk):
+    """
+    The function returns the votes over time of a published question as JSON: per bucket, the votes of every choice
+    and their cumulative votes and share. It is answered from the vote rollups with a fixed number of queries, however
+    many votes the question has; the votes of the last few seconds are not rolled up yet.
+
+    :param request: The request object represents the HTTP request made by the user; the `resolution` query parameter
+    is minute, hour (the default) or day, and the `start` and `end` query parameters bound the buckets with ISO 8601
+    dates and times (by default the last day of minutes, the last 31 days of hours or all the days)
+    :param pk: The `pk` parameter is the primary key of the question
+    :return: a JsonResponse with the question `id`, the `resolution`, the `choices` and the `buckets` with votes, 404
+    Not Found for an unpublished question or 400 Bad Request for an invalid resolution or date.
+    """
+    resolution = request.GET.get('resolution', VoteRollup.HOUR)
+    if resolution not in DEFAULT_SPANS:
+        return error(f"resolution must be one of {', '.join(DEFAULT_SPANS)}")
+    try:
+        start, end = date_param(request, 'start'), date_param(request, 'end')
+    except ValueError as exc:
+        return error(str(exc))
+    if not published_questions().filter(pk=pk).exists():
+        return error("No published question matches the given id", status=404)
+    if start is None and DEFAULT_SPANS[resolution]:
+        start = (end or timezone.now()) - DEFAULT_SPANS[resolution]
+    return JsonResponse({'id': pk, 'resolution': resolution, **rollups.series(pk, resolution, start, end)})
+
+
+def parse_ballot(ballot):
+    """
+    The function reads a submitted ballot.
+
+    :param ballot: The `ballot` parameter is the decoded JSON ballot, a [question_id, choice_id, userid] array
+    :return: a (question_id, choice_id, userid, vote_date) tuple for `voting.record_votes`, the vote dated on arrival,
+    or None for a malformed ballot.
+    """
+    if not isinstance(ballot, list) or len(ballot) != 3:
+        return None
+    question_id, choice_id, userid = ballot
+    if not all(type(pk) is int for pk in (question_id, choice_id)) or not isinstance(userid, str):
+        return None
+    return question_id, choice_id, userid, None
+
+
+@require_POST
+@keys.api_key_required
+def vote_batch(request):
+    """
+    The function records many ballots collected by kiosks and offline clients in one request. The ballots are
+    validated and stored with a fixed number of queries whatever their number (see `voting.record_votes`); every
+    ballot gets its own status, so one invalid or repeated ballot does not reject the others. The clients authenticate
+    with an API key instead of a CSRF token (see `keys.api_key_required`).
+
+    :param request: The request object represents the HTTP request made by the user; the body is a JSON array of at
+    most 10000 [question_id, choice_id, userid] ballots
+    :return: a JsonResponse with the `statuses` of the ballots, in order, and the `counts` of every status, 400 Bad
+    Request for a body that is not such an array, or 401 Unauthorized without a valid API key.
+    """
+    try:
+        ballots = json.loads(request.body)
+    except ValueError:
+        return error("The body must be a JSON array of ballots")
+    if not isinstance(ballots, list) or not 1 <= len(ballots) <= MAX_BALLOTS:
+        return error(f"The body must be a JSON array of 1 to {MAX_BALLOTS} ballots")
+
+    parsed = [parse_ballot(ballot) for ballot in ballots]
+    valid = [index for index, ballot in enumerate(parsed) if ballot is not None]
+    statuses = [MALFORMED] * len(parsed)
+    for index, status in zip(valid, voting.record_votes([parsed[index] for index in valid])):
+        statuses[index] = status
+    return JsonResponse({'statuses': statuses, 'counts': collections.Counter(statuses)})
@@ -1,6 +1,22 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save, pre_save
 
 
 class PollsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'polls'
+
+    def ready(self):
+        from .models import Choice, Question, User
+        from .results_cache import choice_changed
+        from .snapshots import question_saved, question_saving
+        from .users import forget_user
+        from .voting import forget_closed
+
+        post_save.connect(choice_changed, sender=Choice, dispatch_uid='polls.results_cache.choice_saved')
+        post_delete.connect(choice_changed, sender=Choice, dispatch_uid='polls.results_cache.choice_deleted')
+        post_save.connect(forget_closed, sender=Question, dispatch_uid='polls.voting.question_saved')
+        pre_save.connect(question_saving, sender=Question, dispatch_uid='polls.snapshots.question_saving')
+        post_save.connect(question_saved, sender=Question, dispatch_uid='polls.snapshots.question_saved')
+        post_save.connect(forget_user, sender=User, dispatch_uid='polls.users.user_saved')
+        post_delete.connect(forget_user, sender=User, dispatch_uid='polls.users.user_deleted')
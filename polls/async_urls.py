@@ -0,0 +1,24 @@
+from django.urls import path
+
+from . import api, async_views, views
+
+# The URLconf of the polls app with the asynchronous read and vote views, used instead of polls/urls.py when the
+# `POLLS_ASYNC_VIEWS` setting is enabled.
+app_name = "polls"
+urlpatterns = [
+    path("", async_views.IndexView.as_view(), name='index'),
+    path("<int:pk>/", async_views.DetailView.as_view(), name="detail"),
+    path("question_form/", views.QuestionCreateView.as_view(), name='question_form'),
+    path("<int:pk>/choice_form", views.ChoiceCreateView.as_view(), name='choice_form'),
+    path("<int:pk>/results/", async_views.ResultsView.as_view(), name="results"),
+    path("<int:pk>/results/live/", views.results_stream, name="results_stream"),
+    path("import/", views.bulk_import, name="bulk_import"),
+    path("export/", views.bulk_export, name="bulk_export"),
+    path("api/questions/", api.question_list, name="api_questions"),
+    path("api/questions/batch/", api.question_batch, name="api_question_batch"),
+    path("api/questions/<int:pk>/", api.question_detail, name="api_question"),
+    path("api/questions/<int:pk>/results/", api.question_results, name="api_results"),
+    path("api/questions/<int:pk>/timeseries/", api.question_timeseries, name="api_timeseries"),
+    path("api/votes/", api.vote_batch, name="api_votes"),
+    path("<int:question_id>/vote/", async_views.vote, name="vote"),
+]
@@ -0,0 +1,132 @@
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import Http404, HttpResponseForbidden, HttpResponseRedirect
+from django.shortcuts import render
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+from django.views import generic
+
+from . import buffer as vote_buffer, pagination, replicas, results_cache, snapshots, voting
+from .models import Question, Choice
+from .views import CLOSED_MESSAGE, check_conditions, csrf_etag_suffix, index_validators, published_questions, \
+    question_validators, set_validators
+
+# Asynchronous versions of the read views and of the vote view, served by polls/async_urls.py when the
+# `POLLS_ASYNC_VIEWS` setting is enabled. Under ASGI they run in the event loop, and only the database calls of the ORM
+# (and the vote transaction) leave it.
+
+
+async def get_published_question(pk, questions=None):
+    questions = published_questions() if questions is None else questions
+    question = await questions.filter(pk=pk).afirst()
+    if question is None:
+        raise Http404("No question found matching the query")
+    return question
+
+
+# The IndexView class renders the latest 5 published questions, or the 5 following the `after` cursor, answering
+# conditional requests like its synchronous counterpart.
+class IndexView(generic.View):
+    template_name = "polls/index.html"
+    replica_reads = True
+    page_size = 5
+
+    async def get(self, request):
+        try:
+            page = pagination.keyset(published_questions(), request.GET.get('after'))[:self.page_size + 1]
+        except ValueError:
+            raise Http404("Invalid page")
+        questions, next_cursor = pagination.split_page([question async for question in page], self.page_size)
+        etag, last_modified = index_validators(questions, next_cursor)
+        response = check_conditions(request, etag, last_modified)
+        if response is None:
+            response = render(request, self.template_name, {'latest_questions': questions, 'next_cursor': next_cursor})
+        return set_validators(response, etag, last_modified)
+
+
+# The DetailView class renders the vote form of a published question. The choices are fetched only when the client
+# does not have the current page.
+class DetailView(generic.View):
+    template_name = "polls/detail.html"
+    replica_reads = True
+
+    async def get(self, request, pk):
+        question = await get_published_question(pk)
+        etag, last_modified = question_validators('detail', question, await results_cache.aget_version(question.pk),
+                                                  csrf_etag_suffix(request))
+        response = check_conditions(request, etag, last_modified)
+        if response is None:
+            # From the primary, like the results version the ETag is made of (see `views.DetailView.get_object`).
+            with replicas.primary():
+                await sync_to_async(prefetch_related_objects)(
+                    [question], Prefetch('choice_set', queryset=Choice.objects.order_by('pk')))
+            response = render(request, self.template_name, {'question': question})
+        return set_validators(response, etag, last_modified)
+
+
+# The ResultsView class renders the results of a published question from its snapshot, once it is finalized, or else
+# from the results cache.
+class ResultsView(generic.View):
+    template_name = "polls/results.html"
+    replica_reads = True
+
+    async def get(self, request, pk):
+        question = await get_published_question(pk, published_questions().select_related('snapshot'))
+        snapshot = snapshots.get_snapshot(question)
+        version = snapshots.version(snapshot) if snapshot else await results_cache.aget_version(question.pk)
+        etag, last_modified = question_validators('results', question, version)
+        response = check_conditions(request, etag, last_modified)
+        if response is None:
+            if snapshot:
+                results, source = mark_safe(snapshot.html), 'snapshot'
+            else:
+                results, cached = await results_cache.aresults_fragment(question)
+                source = 'hit' if cached else 'miss'
+            response = render(request, self.template_name, {'question': question, 'results': results})
+            response['X-Results-Cache'] = source
+        return set_validators(response, etag, last_modified)
+
+
+async def vote(request, question_id):
+    """
+    The function is the asynchronous version of `views.vote`. The question and the choice are looked up with the async
+    ORM; the user lookup (through the user cache), the vote and the counter increment are still written in one worker
+    thread, as Django runs transactions only synchronously. With the write-behind buffer enabled the vote is appended
+    to the buffer in a worker thread as well.
+
+    :param request: The request object represents the HTTP request made by the user
+    :param question_id: The question_id parameter is the unique identifier of the question for which the user is voting
+    :return: an HTTP redirect response to the "polls:results" view with the question_id as an argument, or 403
+    Forbidden once the question has expired.
+    """
+    if voting.is_known_closed(question_id):
+        return HttpResponseForbidden(CLOSED_MESSAGE)
+    try:
+        question = await Question.objects.aget(pk=question_id)
+    except Question.DoesNotExist:
+        raise Http404("No Question matches the given query.")
+    if not voting.check_open(question):
+        return HttpResponseForbidden(CLOSED_MESSAGE)
+
+    # The error pages list the choices of the question, so they are rendered in a worker thread.
+    async def error(message):
+        return await sync_to_async(render)(request, "polls/detail.html",
+                                           {"question": question, "error_message": message})
+
+    userid = request.POST.get('userId')
+    if not userid:
+        return await error("Failed to authorize user. Please disable addBlock and try again")
+    try:
+        selected = await question.choice_set.aget(pk=request.POST['choice'])
+    except (KeyError, ValueError, Choice.DoesNotExist):
+        return await error("You didn't select a choice")
+    if vote_buffer.enabled():
+        # Starting the buffer and appending to its log write files and take locks, so they run in a worker thread too.
+        await sync_to_async(lambda: vote_buffer.get_buffer().append(question.id, selected.id, userid))()
+        return HttpResponseRedirect(reverse("polls:results", args=(question_id,)))
+    try:
+        await sync_to_async(voting.cast_vote)(question, selected, userid)
+    except IntegrityError:
+        return await error("You've already voted")
+    return HttpResponseRedirect(reverse("polls:results", args=(question_id,)))
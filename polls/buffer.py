@@ -0,0 +1,285 @@
+import atexit
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .voting import ACCEPTED, record_votes
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'PATH': 'var/vote-buffer',
+    'FLUSH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,
+    'FSYNC': False,
+    'STALE_AFTER': 60.0,
+}
+
+
+def buffer_settings():
+    """
+    The function returns the write-behind buffer configuration, the `POLLS_VOTE_BUFFER` setting merged over the
+    defaults.
+
+    :return: a dictionary with the ENABLED, PATH, FLUSH_SIZE, FLUSH_INTERVAL, FSYNC and STALE_AFTER keys.
+    """
+    return {**DEFAULTS, **getattr(settings, 'POLLS_VOTE_BUFFER', {})}
+
+
+def enabled():
+    return buffer_settings()['ENABLED']
+
+
+def buffer_path(path=None):
+    """
+    The function returns the directory of the buffer log.
+
+    :param path: The `path` parameter is the directory to use instead of the configured one; relative paths are
+    resolved against BASE_DIR
+    :return: an absolute Path of the log directory.
+    """
+    path = Path(path or buffer_settings()['PATH'])
+    if not path.is_absolute():
+        path = Path(settings.BASE_DIR) / path
+    return path
+
+
+# The VoteBuffer class collects accepted votes in memory and in an append-only log on the local disk, and writes them
+# to the database in batches: one bulk insert of Vote rows and one grouped UPDATE of the counters per flush.
+#
+# Every batch has its own log segment. A segment is deleted only after its votes are committed, so after a crash the
+# votes are replayed from the disk (at-least-once); replayed duplicates are dropped on the (question, user) unique
+# constraint. Segments left behind by a process that died are claimed by any live buffer using the same directory
+# once they have not been touched for STALE_AFTER seconds.
+class VoteBuffer:
+    def __init__(self, path, flush_size=500, flush_interval=1.0, fsync=False, stale_after=60.0):
+        self.path = Path(path)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.stale_after = stale_after
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pending = []
+        self._segments = []
+        self._log = None
+        self._log_path = None
+
+    def open(self, claim_all=False):
+        """
+        The function prepares the log directory and loads the votes of the segments left behind by earlier runs.
+
+        :param claim_all: The `claim_all` parameter tells whether to load all segments in the directory, even the ones
+        touched recently; only safe when no other process is using the directory
+        :return: the number of votes replayed from the disk.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        return self._claim_segments(stale_after=None if claim_all else self.stale_after)
+
+    def start(self):
+        """
+        The function opens the buffer and starts the background thread flushing it every FLUSH_INTERVAL seconds or as
+        soon as FLUSH_SIZE votes are waiting.
+        """
+        self.open()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='vote-buffer-flusher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        The function stops the background thread and flushes the votes still waiting.
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        with self._lock:
+            self._close_log()
+
+    def append(self, question_id, choice_id, userid, vote_date=None):
+        """
+        The function accepts a vote: it is written to the log segment on the disk and queued for the next flush.
+
+        :param question_id: The `question_id` parameter is the primary key of the question voted on
+        :param choice_id: The `choice_id` parameter is the primary key of the selected choice
+        :param userid: The `userid` parameter is the FingerprintJS id of the voter
+        :param vote_date: The `vote_date` parameter is the time of the vote; defaults to the current time
+        """
+        ballot = (question_id, choice_id, userid, vote_date or timezone.now())
+        line = json.dumps({'q': question_id, 'c': choice_id, 'u': userid, 't': ballot[3].isoformat()}) + '\n'
+        with self._lock:
+            if self._log is None:
+                self._open_log()
+            self._log.write(line)
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            self._pending.append(ballot)
+            if len(self._pending) >= self.flush_size:
+                self._wakeup.set()
+
+    def flush(self):
+        """
+        The function writes all queued votes to the database and deletes their log segments. When the write fails the
+        votes stay queued and on the disk, and are retried by the next flush.
+
+        :return: the number of votes stored; duplicates and votes for deleted choices are not counted.
+        """
+        with self._flush_lock:
+            with self._lock:
+                ballots, segments = self._pending, self._segments
+                if self._log_path is not None:
+                    segments.append(self._log_path)
+                    self._close_log()
+                self._pending, self._segments = [], []
+            if not ballots:
+                self._remove(segments)
+                return 0
+
+            try:
+                statuses = record_votes(ballots)
+            except Exception:
+                logger.exception("Flushing %d buffered votes failed", len(ballots))
+                with self._lock:
+                    self._pending[:0] = ballots
+                    self._segments[:0] = segments
+                raise
+            self._remove(segments)
+            return statuses.count(ACCEPTED)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                # The flusher thread has its own connection; drop it if the database went away in the meantime.
+                close_old_connections()
+                self._claim_segments(stale_after=self.stale_after)
+                self.flush()
+            except Exception:
+                # Already logged by flush(); the votes are retried in the next interval.
+                time.sleep(self.flush_interval)
+        connection.close()
+
+    def _open_log(self):
+        self._log_path = self.path / f'{uuid.uuid4().hex}.log'
+        self._log = open(self._log_path, 'a', encoding='utf-8')
+
+    def _close_log(self):
+        if self._log is not None:
+            self._log.close()
+        self._log = None
+        self._log_path = None
+
+    def _owned(self):
+        owned = set(self._segments)
+        if self._log_path is not None:
+            owned.add(self._log_path)
+        return owned
+
+    def _claim_segments(self, stale_after):
+        """
+        The function takes over the log segments of other (dead) buffers and queues their votes.
+
+        :param stale_after: The `stale_after` parameter is the number of seconds a segment must be untouched to be
+        claimed; None claims all segments not owned by this buffer
+        :return: the number of votes loaded.
+        """
+        loaded = 0
+        with self._lock:
+            owned = self._owned()
+        for segment in sorted(self.path.glob('*.log')):
+            if segment in owned:
+                continue
+            try:
+                if stale_after is not None and time.time() - segment.stat().st_mtime < stale_after:
+                    continue
+                claimed = self.path / f'{uuid.uuid4().hex}.log'
+                # Renaming is atomic, so only one buffer can claim a segment.
+                os.rename(segment, claimed)
+            except FileNotFoundError:
+                continue
+            ballots = list(self._read(claimed))
+            with self._lock:
+                self._pending.extend(ballots)
+                self._segments.append(claimed)
+            loaded += len(ballots)
+        if loaded:
+            logger.info("Replaying %d buffered votes from %s", loaded, self.path)
+        return loaded
+
+    @staticmethod
+    def _read(segment):
+        with open(segment, encoding='utf-8') as log:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                    yield entry['q'], entry['c'], entry['u'], datetime.datetime.fromisoformat(entry['t'])
+                except (ValueError, KeyError, TypeError):
+                    # A line torn by a crash in the middle of a write.
+                    logger.warning("Skipping malformed line in %s", segment)
+
+    @staticmethod
+    def _remove(segments):
+        for segment in segments:
+            try:
+                os.remove(segment)
+            except FileNotFoundError:
+                pass
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """
+    The function returns the vote buffer of the process, creating and starting it on first use. Starting the buffer
+    replays the votes left on the disk by earlier runs.
+
+    :return: the VoteBuffer object configured by the `POLLS_VOTE_BUFFER` setting.
+    """
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            config = buffer_settings()
+            vote_buffer = VoteBuffer(buffer_path(), flush_size=config['FLUSH_SIZE'],
+                                     flush_interval=config['FLUSH_INTERVAL'], fsync=config['FSYNC'],
+                                     stale_after=config['STALE_AFTER'])
+            vote_buffer.start()
+            _buffer = vote_buffer
+        return _buffer
+
+
+def close_buffer():
+    """
+    The function stops the vote buffer of the process, flushing the votes still waiting.
+    """
+    global _buffer
+    with _buffer_lock:
+        if _buffer is not None:
+            _buffer.stop()
+            _buffer = None
+
+
+atexit.register(close_buffer)
@@ -0,0 +1,241 @@
+import csv
+import datetime
+import io
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Question, Choice
+
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+FORMAT_OF_CONTENT_TYPE = {content_type: format for format, content_type in CONTENT_TYPES.items()}
+CSV_COLUMNS = ['question_id', 'question_text', 'pub_date', 'exp_date', 'choice_id', 'choice_text', 'votes']
+TEXT_LENGTH = 200
+
+
+# The RecordError class is raised for a record that cannot be imported; the message is reported with its line number.
+class RecordError(ValueError):
+    pass
+
+
+def _parse_date(value, default):
+    if value in (None, ''):
+        return default
+    parsed = parse_datetime(value) if isinstance(value, str) else None
+    if parsed is None:
+        raise RecordError(f"Invalid date: {value!r}")
+    if timezone.is_aware(parsed) and not timezone.is_aware(default):
+        parsed = timezone.make_naive(parsed)
+    return parsed
+
+
+def _text(value, name):
+    if not isinstance(value, str) or not 1 <= len(value) <= TEXT_LENGTH:
+        raise RecordError(f"{name} must be a text of 1 to {TEXT_LENGTH} characters")
+    return value
+
+
+def clean_record(record):
+    """
+    The function validates an imported question with its choices, without touching the database.
+
+    :param record: The `record` parameter is a dictionary with the `question_text`, the optional `pub_date` and
+    `exp_date` (ISO 8601 texts) and the `choices`, a list of choice texts or of dictionaries with a `choice_text`
+    :return: a (Question, list of Choice) tuple of unsaved objects. A RecordError is raised for invalid records.
+    """
+    if not isinstance(record, dict):
+        raise RecordError("A record must be an object")
+    now = timezone.now()
+    question_text = _text(record.get('question_text'), 'question_text')
+    pub_date = _parse_date(record.get('pub_date'), now)
+    exp_date = _parse_date(record.get('exp_date'), pub_date + datetime.timedelta(days=7))
+    if exp_date < pub_date:
+        raise RecordError("exp_date is before pub_date")
+
+    choices = record.get('choices') or []
+    if not isinstance(choices, list):
+        raise RecordError("choices must be a list")
+    texts = [_text(choice.get('choice_text') if isinstance(choice, dict) else choice, 'choice_text')
+             for choice in choices]
+    if len(set(texts)) != len(texts):
+        raise RecordError("Duplicate choice_text")
+    return (Question(question_text=question_text, pub_date=pub_date, exp_date=exp_date),
+            [Choice(choice_text=text) for text in texts])
+
+
+def read_ndjson(lines):
+    """
+    The function reads NDJSON records, one question object with its choices per line.
+
+    :param lines: The `lines` parameter is an iterable of text lines
+    :return: a generator of (line number, record) tuples; the record is a RecordError for unreadable lines.
+    """
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, RecordError("Invalid JSON")
+
+
+def read_csv(lines):
+    """
+    The function reads CSV records with a header row and one row per choice; consecutive rows with the same
+    `question_text` form one question. A row with an empty `choice_text` is a question without choices. Other columns,
+    such as the ids and votes of an export, are ignored.
+
+    :param lines: The `lines` parameter is an iterable of text lines
+    :return: a generator of (line number, record) tuples, the line number being the first row of the question.
+    """
+    reader = csv.DictReader(lines)
+    current = None
+    for row in reader:
+        if current is None or row.get('question_text') != current[1]['question_text']:
+            if current is not None:
+                yield current
+            current = (reader.line_num, {'question_text': row.get('question_text'), 'pub_date': row.get('pub_date'),
+                                         'exp_date': row.get('exp_date'), 'choices': []})
+        if row.get('choice_text'):
+            current[1]['choices'].append(row['choice_text'])
+    if current is not None:
+        yield current
+
+
+def import_polls(lines, format='ndjson', batch_size=500):
+    """
+    The function imports questions with their choices. The records are validated as they are read and saved with
+    `bulk_create`, `batch_size` questions per transaction: one query finds the texts already taken, then one INSERT
+    creates the questions and one their choices. Invalid records and questions whose text is taken are skipped and
+    reported; the other records of their batch are imported.
+
+    :param lines: The `lines` parameter is an iterable of text lines in the given format, read lazily
+    :param format: The `format` parameter is 'ndjson' or 'csv'
+    :param batch_size: The `batch_size` parameter is the number of questions saved per transaction
+    :return: a dictionary with the number of created `questions` and `choices` and the list of `errors`, each a
+    dictionary with the `line` and the `error`.
+    """
+    reader = read_csv if format == 'csv' else read_ndjson
+    result = {'questions': 0, 'choices': 0, 'errors': []}
+    batch = []
+    for number, record in reader(lines):
+        try:
+            if isinstance(record, RecordError):
+                raise record
+            batch.append((number, *clean_record(record)))
+        except RecordError as error:
+            result['errors'].append({'line': number, 'error': str(error)})
+        if len(batch) >= batch_size:
+            _save(batch, result)
+            batch = []
+    if batch:
+        _save(batch, result)
+    return result
+
+
+def _save(batch, result):
+    taken = set(Question.objects.filter(question_text__in=[question.question_text for _, question, _ in batch])
+                .values_list('question_text', flat=True))
+    new = []
+    for number, question, choices in batch:
+        if question.question_text in taken:
+            result['errors'].append({'line': number, 'error': "question_text already exists"})
+        else:
+            taken.add(question.question_text)
+            new.append((number, question, choices))
+    if not new:
+        return
+    try:
+        with transaction.atomic():
+            Question.objects.bulk_create([question for _, question, _ in new])
+            choices = []
+            for _, question, question_choices in new:
+                for choice in question_choices:
+                    choice.question = question
+                    choices.append(choice)
+            Choice.objects.bulk_create(choices)
+    except IntegrityError:
+        # A question with one of the texts was created in the meantime.
+        result['errors'] += [{'line': number, 'error': "Conflicts with a concurrent change; retry"}
+                             for number, _, _ in new]
+        return
+    result['questions'] += len(new)
+    result['choices'] += len(choices)
+
+
+def export_batch(questions, after, size):
+    """
+    The function returns the next batch of exported questions: the `size` questions following the primary key `after`
+    with their choices and vote tallies, fetched with two queries.
+
+    :param questions: The `questions` parameter is the queryset of the exported questions
+    :param after: The `after` parameter is the primary key of the last question of the previous batch, 0 at first
+    :param size: The `size` parameter is the number of questions of the batch
+    :return: a list of dictionaries of the questions, each with its list of choices.
+    """
+    choices = Choice.objects.with_tallies().order_by('pk')
+    batch = questions.filter(pk__gt=after).order_by('pk').prefetch_related(Prefetch('choice_set', queryset=choices))
+    return [{'id': question.pk, 'question_text': question.question_text,
+             'pub_date': question.pub_date.isoformat(), 'exp_date': question.exp_date.isoformat(),
+             'choices': [{'id': choice.pk, 'choice_text': choice.choice_text, 'votes': choice.tally}
+                         for choice in question.choice_set.all()]}
+            for question in batch[:size]]
+
+
+def encode(records, format):
+    """
+    The function encodes exported questions in the given format.
+
+    :param records: The `records` parameter is a list of question dictionaries of `export_batch`
+    :param format: The `format` parameter is 'ndjson' or 'csv'
+    :return: the text of the records; CSV has one row per choice, and a row without choice for questions without any.
+    """
+    if format == 'ndjson':
+        return ''.join(json.dumps(record) + '\n' for record in records)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for record in records:
+        question = [record['id'], record['question_text'], record['pub_date'], record['exp_date']]
+        for choice in record['choices'] or [{'id': '', 'choice_text': '', 'votes': ''}]:
+            writer.writerow(question + [choice['id'], choice['choice_text'], choice['votes']])
+    return buffer.getvalue()
+
+
+def _header(format):
+    return ','.join(CSV_COLUMNS) + '\r\n' if format == 'csv' else ''
+
+
+def export(questions, format='ndjson', batch_size=500):
+    """
+    The function exports questions with their choices and vote tallies, batch by batch, so memory use does not grow
+    with the number of questions or votes. The batches are read by keyset pagination, which needs no open cursor or
+    transaction between them.
+
+    :param questions: The `questions` parameter is the queryset of the exported questions
+    :param format: The `format` parameter is 'ndjson' or 'csv'
+    :param batch_size: The `batch_size` parameter is the number of questions fetched per batch
+    :return: a generator of text chunks.
+    """
+    if header := _header(format):
+        yield header
+    after = 0
+    while records := export_batch(questions, after, batch_size):
+        yield encode(records, format)
+        after = records[-1]['id']
+
+
+async def aexport(questions, format='ndjson', batch_size=500):
+    """
+    The function is the asynchronous version of `export`, for streaming under ASGI without buffering the whole export.
+    """
+    if header := _header(format):
+        yield header
+    after = 0
+    while records := await sync_to_async(export_batch)(questions, after, batch_size):
+        yield encode(records, format)
+        after = records[-1]['id']
@@ -0,0 +1,125 @@
+import random
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+
+from .models import Choice, ChoiceCounterShard, Vote
+
+
+def shard_count():
+    """
+    The function returns the number of counter shards votes of a choice are spread over.
+
+    :return: the value of the `POLLS_VOTE_COUNTER_SHARDS` setting; 0 means that votes are counted directly in
+    `Choice.votes`.
+    """
+    return getattr(settings, 'POLLS_VOTE_COUNTER_SHARDS', 0)
+
+
+def increment(choice_id):
+    """
+    The function increments the vote counter of a choice with a database-side update. When sharding is enabled a random
+    shard row of the choice is incremented instead of the Choice row, so concurrent voters rarely wait for each other.
+
+    :param choice_id: The `choice_id` parameter is the primary key of the choice that received the vote
+    """
+    shards = shard_count()
+    if shards <= 0:
+        Choice.objects.filter(pk=choice_id).update(votes=F('votes') + 1)
+        return
+
+    shard = random.randrange(shards)
+    counter = ChoiceCounterShard.objects.filter(choice_id=choice_id, shard=shard)
+    if counter.update(votes=F('votes') + 1):
+        return
+    try:
+        with transaction.atomic():
+            ChoiceCounterShard.objects.create(choice_id=choice_id, shard=shard, votes=1)
+    except IntegrityError:
+        # Another voter created the shard row in the meantime.
+        counter.update(votes=F('votes') + 1)
+
+
+def tally(choice_id):
+    """
+    The function returns the number of votes of a choice, including the votes not yet folded from its shards.
+
+    :param choice_id: The `choice_id` parameter is the primary key of the choice
+    :return: the total number of votes of the choice.
+    """
+    return Choice.objects.with_tallies().values_list('tally', flat=True).get(pk=choice_id)
+
+
+def compact():
+    """
+    The function folds the votes of all counter shards back into `Choice.votes`.
+
+    The shard rows are locked for the duration of the transaction, so votes arriving in the meantime wait for the
+    compaction instead of being lost. All choices are updated with a single grouped UPDATE.
+
+    :return: the number of votes moved from the shards to the choices.
+    """
+    with transaction.atomic():
+        shards = list(ChoiceCounterShard.objects.select_for_update().filter(votes__gt=0).order_by('pk')
+                      .values_list('pk', 'choice_id', 'votes'))
+        if not shards:
+            return 0
+
+        totals = {}
+        for _, choice_id, votes in shards:
+            totals[choice_id] = totals.get(choice_id, 0) + votes
+        Choice.objects.filter(pk__in=totals).update(
+            votes=Case(*[When(pk=choice_id, then=F('votes') + votes) for choice_id, votes in totals.items()],
+                       default=F('votes')))
+        ChoiceCounterShard.objects.filter(pk__in=[pk for pk, _, _ in shards]).update(votes=0)
+    return sum(totals.values())
+
+
+def add(deltas):
+    """
+    The function adds the votes of a batch to the counters of their choices with one grouped UPDATE, so its cost grows
+    with the batch rather than with the votes already stored. The choice rows are locked in primary key order by a
+    subquery of the same statement, so concurrent batches wait for each other instead of deadlocking.
+
+    :param deltas: The `deltas` parameter is a dictionary mapping the primary keys of the choices to their new votes
+    """
+    deltas = {choice_id: votes for choice_id, votes in deltas.items() if votes}
+    if not deltas:
+        return
+    locked = Choice.objects.filter(pk__in=deltas).order_by('pk').select_for_update().values('pk')
+    Choice.objects.filter(pk__in=locked).update(
+        votes=Case(*[When(pk=choice_id, then=F('votes') + votes) for choice_id, votes in deltas.items()],
+                   default=F('votes')))
+
+
+def recount(choice_ids):
+    """
+    The function sets `Choice.votes` of the given choices from the Vote table with one grouped UPDATE, leaving out the
+    votes still kept in the counter shards. It must be called inside a transaction.
+
+    The choice rows are locked before the UPDATE, so every vote whose increment was committed before is visible to the
+    recount and concurrent increments of the regular vote path are never overwritten.
+
+    :param choice_ids: The `choice_ids` parameter is an iterable of primary keys of the choices to recount
+    """
+    choice_ids = sorted(set(choice_ids))
+    if not choice_ids:
+        return
+    list(Choice.objects.select_for_update().filter(pk__in=choice_ids).order_by('pk').values_list('pk', flat=True))
+
+    votes = Vote.objects.filter(choice=OuterRef('pk')).order_by().values('choice').annotate(total=Count('pk'))
+    shards = ChoiceCounterShard.objects.filter(choice=OuterRef('pk')).order_by().values('choice')
+    shards = shards.annotate(total=Sum('votes'))
+    Choice.objects.filter(pk__in=choice_ids).update(votes=Coalesce(Subquery(votes.values('total')), 0)
+                                                    - Coalesce(Subquery(shards.values('total')), 0))
+
+
+def pending_votes():
+    """
+    The function returns the number of votes waiting in the counter shards to be compacted.
+
+    :return: the sum of all shard counters.
+    """
+    return ChoiceCounterShard.objects.aggregate(total=Sum('votes'))['total'] or 0
@@ -0,0 +1,85 @@
+import functools
+import hmac
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+SCHEME = 'Bearer'
+
+
+def api_keys():
+    """
+    The function returns the API keys of the machine clients (kiosks, offline clients, importers).
+
+    :return: the `POLLS_API_KEYS` setting, a dictionary mapping client names to their keys.
+    """
+    return getattr(settings, 'POLLS_API_KEYS', {})
+
+
+def authenticate(request):
+    """
+    The function identifies the client of a request from the API key of its ``Authorization: Bearer <key>`` header.
+    Every key is compared in constant time, so response times do not reveal how much of a key was guessed.
+
+    :param request: The `request` parameter is the HttpRequest
+    :return: the name of the client, or None without a valid key.
+    """
+    scheme, _, key = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    key = key.strip().encode()
+    if scheme.lower() != SCHEME.lower() or not key:
+        return None
+    client = None
+    for name, secret in api_keys().items():
+        if secret and hmac.compare_digest(key, secret.encode()):
+            client = name
+    return client
+
+
+def unauthorized():
+    response = JsonResponse({'error': "A valid API key is required"}, status=401)
+    response['WWW-Authenticate'] = SCHEME
+    return response
+
+
+def api_key_required(view):
+    """
+    The function decorates a view called by machine clients rather than browsers: the request must carry one of the
+    `POLLS_API_KEYS`, and is exempt from the CSRF check, which such clients cannot pass and which a key sent in a header
+    makes unnecessary. The name of the client is stored in `request.api_client`.
+
+    :param view: The `view` parameter is the view function
+    :return: the decorated view, answering 401 Unauthorized without a valid key.
+    """
+    @csrf_exempt
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.api_client = authenticate(request)
+        if request.api_client is None:
+            return unauthorized()
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def api_key_or_staff_required(view):
+    """
+    The function decorates a view used both by machine clients and by staff members: like `api_key_required`, except
+    that requests without an API key are served to logged-in staff members, with the CSRF check their browser session
+    calls for.
+
+    :param view: The `view` parameter is the view function
+    :return: the decorated view, answering 401 Unauthorized to other clients.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.api_client = authenticate(request)
+        if request.api_client is not None:
+            return view(request, *args, **kwargs)
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_active and user.is_staff:
+            return protected(request, *args, **kwargs)
+        return unauthorized()
+    return wrapper
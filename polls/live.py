@@ -0,0 +1,296 @@
+import asyncio
+import contextvars
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from . import results_cache, stats
+from .models import Choice, Question
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = b': keep-alive\n\n'
+
+
+def tick_interval():
+    """
+    The function returns how often the broadcaster looks for changed results.
+
+    :return: the value of the `POLLS_LIVE_RESULTS_TICK` setting in seconds.
+    """
+    return getattr(settings, 'POLLS_LIVE_RESULTS_TICK', 1.0)
+
+
+def heartbeat_interval():
+    """
+    The function returns how long a stream may stay silent before a keep-alive comment is sent.
+
+    :return: the value of the `POLLS_LIVE_RESULTS_HEARTBEAT` setting in seconds.
+    """
+    return getattr(settings, 'POLLS_LIVE_RESULTS_HEARTBEAT', 15.0)
+
+
+def encode(question_id, version, tallies, summary):
+    """
+    The function encodes the tallies of a question as one server-sent event.
+
+    :param question_id: The `question_id` parameter is the primary key of the question
+    :param version: The `version` parameter is the results version the tallies were read at, used as the event id
+    :param tallies: The `tallies` parameter is a list of `(choice_id, votes)` tuples
+    :param summary: The `summary` parameter is the summary of the statistics of the tallies (see `stats.summarize`)
+    :return: the event as bytes.
+    """
+    leader = tallies[summary['leader']][0] if summary['leader'] is not None else None
+    data = json.dumps({'question': question_id, 'version': version, 'total': summary['total'],
+                       'choices': [{'id': choice_id, 'votes': votes, 'lower': lower, 'upper': upper}
+                                   for (choice_id, votes), (lower, upper) in zip(tallies, summary['intervals'])],
+                       'leader': leader, 'margin': summary['margin'], 'margin_points': summary['margin_points'],
+                       'decided': summary['decided']},
+                      separators=(',', ':'))
+    return f'id: {version}\nevent: results\ndata: {data}\n\n'.encode()
+
+
+def _close_connection():
+    connection.close()
+
+
+def _is_published(question_id):
+    return Question.objects.filter(pk=question_id, pub_date__lte=timezone.now()).exists()
+
+
+def _versions(question_ids):
+    cache = results_cache.get_cache()
+    found = cache.get_many([results_cache.version_key(question_id) for question_id in question_ids])
+    return {question_id: found.get(results_cache.version_key(question_id)) or results_cache.get_version(question_id)
+            for question_id in question_ids}
+
+
+def _tallies(question_ids):
+    tallies = {question_id: [] for question_id in question_ids}
+    choices = Choice.objects.with_tallies().filter(question_id__in=question_ids).order_by('pk')
+    for question_id, choice_id, tally in choices.values_list('question_id', 'pk', 'tally'):
+        tallies[question_id].append((choice_id, tally))
+    return tallies
+
+
+# The Subscription class is the mailbox of one connected client. It holds only the latest message, so a slow client
+# skips intermediate tallies instead of queueing them, and costs the same memory however busy the question is.
+class Subscription:
+    __slots__ = ('question_id', 'message', '_ready')
+
+    def __init__(self, question_id, message):
+        self.question_id = question_id
+        self.message = message
+        self._ready = asyncio.Event()
+        self._ready.set()
+
+    def deliver(self, message):
+        self.message = message
+        self._ready.set()
+
+    async def receive(self, timeout=None):
+        """
+        The function waits for the next message.
+
+        :param timeout: The `timeout` parameter is the number of seconds to wait; None waits forever
+        :return: the latest message, or None if nothing was delivered in time.
+        """
+        if not self._ready.is_set():
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        self._ready.clear()
+        return self.message
+
+
+# The Broadcaster class pushes the tallies of the questions to their subscribers. Once per tick it reads the results
+# versions of all watched questions in one cache read, queries the tallies of the changed ones in one query and encodes
+# one message per changed question, which is handed to every subscriber of the question. However many votes arrive in
+# a tick, a question gets at most one message.
+#
+# The broadcaster lives in the event loop of the ASGI server; results versions are bumped on every committed vote, so
+# with several worker processes the results cache must be shared between them. With an `executor` all its database and
+# cache reads run in that executor, so thousands of open streams share one database connection instead of holding one
+# each in the threads of their requests.
+class Broadcaster:
+    def __init__(self, executor=None):
+        self._executor = executor
+        self._subscribers = {}
+        self._sent = {}
+        self._task = None
+        self._loop = None
+
+    async def is_published(self, question_id):
+        """
+        The function checks if a question exists and is published.
+
+        :param question_id: The `question_id` parameter is the primary key of the question
+        :return: True if the question may be watched, else False.
+        """
+        return await self._call(_is_published, question_id)
+
+    async def subscribe(self, question_id):
+        """
+        The function adds a subscriber to the tallies of a question. The subscriber receives the current tallies
+        first.
+
+        :param question_id: The `question_id` parameter is the primary key of the question
+        :return: the Subscription object, to be passed to `unsubscribe` once the client leaves.
+        """
+        versions = await self._call(_versions, [question_id])
+        sent = self._sent.get(question_id)
+        if sent is not None and sent[0] == versions[question_id]:
+            message = sent[1]
+        else:
+            message = (await self._render(versions))[question_id]
+            if question_id not in self._sent:
+                self._sent[question_id] = (versions[question_id], message)
+        subscription = Subscription(question_id, message)
+        self._subscribers.setdefault(question_id, set()).add(subscription)
+        self.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscribers = self._subscribers.get(subscription.question_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.question_id]
+            self._sent.pop(subscription.question_id, None)
+
+    def subscriber_count(self):
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    async def tick(self):
+        """
+        The function sends the tallies of every watched question whose results version changed since the last
+        message.
+
+        :return: the number of messages sent, one per changed question.
+        """
+        if not self._subscribers:
+            return 0
+        versions = await self._call(_versions, list(self._subscribers))
+        changed = {question_id: version for question_id, version in versions.items()
+                   if self._sent.get(question_id, (None,))[0] != version}
+        if not changed:
+            return 0
+        # The versions are read before the tallies, so a vote committed in between is sent again on the next tick
+        # rather than lost.
+        messages = await self._render(changed)
+        for question_id, message in messages.items():
+            subscribers = self._subscribers.get(question_id)
+            if not subscribers:
+                continue
+            self._sent[question_id] = (changed[question_id], message)
+            for subscription in subscribers:
+                subscription.deliver(message)
+        return len(messages)
+
+    def start(self):
+        """
+        The function starts the tick loop in the running event loop unless it is already running there.
+        """
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        # The loop is started from a request, but must not inherit its context (and its thread for sync code), which
+        # ends with the request.
+        self._task = loop.create_task(self._run(), context=contextvars.Context())
+
+    async def _run(self):
+        while self._subscribers:
+            await asyncio.sleep(tick_interval())
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Broadcasting live results failed")
+        if self._executor is not None:
+            # Nobody is watching anymore; do not keep the connection of the executor open.
+            await self._call(_close_connection)
+
+    async def _call(self, function, *args):
+        if self._executor is None:
+            return await sync_to_async(function)(*args)
+
+        def job():
+            # The executor thread outlives any request; drop its connection if the database went away in the meantime.
+            close_old_connections()
+            return function(*args)
+        return await sync_to_async(job, thread_sensitive=False, executor=self._executor)()
+
+    async def _render(self, versions):
+        tallies = await self._call(_tallies, list(versions))
+        # The statistics of all the changed questions in one pass.
+        summaries = stats.summarize([[votes for _, votes in tallies[question_id]] for question_id in versions])
+        return {question_id: encode(question_id, version, tallies[question_id], summary)
+                for (question_id, version), summary in zip(versions.items(), summaries)}
+
+
+_broadcaster = Broadcaster(executor=ThreadPoolExecutor(max_workers=1, thread_name_prefix='live-results'))
+
+
+def get_broadcaster():
+    return _broadcaster
+
+
+async def stream(question_id):
+    """
+    The function is the body of the server-sent events response of a question: the current tallies, then one event
+    per tick in which they changed, and a keep-alive comment when nothing changed for a while.
+
+    :param question_id: The `question_id` parameter is the primary key of the question
+    """
+    broadcaster = get_broadcaster()
+    subscription = await broadcaster.subscribe(question_id)
+    try:
+        yield f'retry: {int(tick_interval() * 1000)}\n\n'.encode()
+        while True:
+            message = await subscription.receive(timeout=heartbeat_interval())
+            yield HEARTBEAT if message is None else message
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+def cancel_on_disconnect(application):
+    """
+    The function wraps an ASGI application so that event stream requests are cancelled as soon as the client
+    disconnects. Django 4.2 does not watch for disconnects while streaming, so an abandoned stream would otherwise
+    stay subscribed until its next write fails.
+
+    :param application: The `application` parameter is the ASGI application to wrap
+    :return: the wrapped ASGI application.
+    """
+    async def wrapper(scope, receive, send):
+        if scope['type'] != 'http' or (b'accept', b'text/event-stream') not in scope.get('headers', ()):
+            return await application(scope, receive, send)
+
+        messages = asyncio.Queue()
+        app_task = asyncio.ensure_future(application(scope, messages.get, send))
+
+        async def listen():
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message['type'] == 'http.disconnect':
+                    app_task.cancel()
+                    return
+
+        listener = asyncio.ensure_future(listen())
+        try:
+            await app_task
+        except asyncio.CancelledError:
+            if not listener.done():
+                raise
+        finally:
+            listener.cancel()
+
+    return wrapper
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from polls import counters
+
+
+# The Command class folds the votes collected in the counter shards back into `Choice.votes`, once or periodically.
+class Command(BaseCommand):
+    help = "Folds the votes of the choice counter shards back into Choice.votes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Repeat the compaction every INTERVAL seconds instead of running it once.")
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            folded = counters.compact()
+            self.stdout.write(f"Folded {folded} vote{'s' if folded != 1 else ''} into choices.")
+            if interval <= 0:
+                break
+            time.sleep(interval)
@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from polls import seeding
+from polls.models import Question
+
+EXPLAINED = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+
+# The Command class runs the views of the polls app, captures their queries and checks the query plans of PostgreSQL
+# for sequential scans of large tables. Everything runs in a transaction that is rolled back, including the vote and
+# the optional seeded dataset.
+class Command(BaseCommand):
+    help = "Explains the queries of the polls views and fails if any of them sequentially scans a large table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000,
+                            help="Fail on sequential scans of tables with more than ROWS rows (default: 1000). Smaller "
+                                 "tables are cheaper to scan than to look up in an index.")
+        parser.add_argument('--seed', action='store_true',
+                            help="Explain against a freshly seeded dataset, rolled back afterwards.")
+        parser.add_argument('--questions', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--votes', type=int, default=50000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("explain_queries needs PostgreSQL.")
+
+        with transaction.atomic():
+            if options['seed']:
+                created = seeding.seed(questions=options['questions'], users=options['users'],
+                                       votes=options['votes'])
+                self.stdout.write("Seeded " + ", ".join(f"{count} {name}" for name, count in created.items()) + ".")
+            with connection.cursor() as cursor:
+                # Plans depend on the statistics of the tables.
+                cursor.execute('ANALYZE polls_question, polls_choice, polls_choicecountershard, polls_user, '
+                               'polls_vote')
+            problems = self.check_views(options['rows'])
+            transaction.set_rollback(True)
+
+        if problems:
+            raise CommandError(f"{len(problems)} sequential scan{'s' if len(problems) != 1 else ''} above "
+                               f"{options['rows']} rows:\n" + "\n".join(problems))
+        self.stdout.write(self.style.SUCCESS("No sequential scans above the threshold."))
+
+    def check_views(self, rows):
+        """
+        The function requests every view and explains its queries.
+
+        :param rows: The `rows` parameter is the row threshold of sequential scans
+        :return: a list of descriptions of the offending scans.
+        """
+        question = Question.objects.filter(pub_date__lte=timezone.now(), choice__isnull=False).order_by('-pub_date')[:1]
+        question = question.first()
+        if question is None:
+            raise CommandError("No published question with choices; run with --seed.")
+        choice = question.choice_set.order_by('pk').first()
+
+        factory = RequestFactory()
+        requests = {
+            'index': factory.get(reverse('polls:index')),
+            'detail': factory.get(reverse('polls:detail', args=(question.id,))),
+            'results': factory.get(reverse('polls:results', args=(question.id,))),
+            'vote': factory.post(reverse('polls:vote', args=(question.id,)),
+                                 {'userId': 'explain-queries-user', 'choice': choice.id}),
+        }
+        sizes = self.table_sizes()
+        problems = []
+        for name, request in requests.items():
+            match = resolve(request.path)
+            view = match.func
+            if asyncio.iscoroutinefunction(view):
+                view = async_to_sync(view)
+            # The vote must reach the database (and be rolled back), not the write-behind buffer.
+            with CaptureQueriesContext(connection) as captured, override_settings(POLLS_VOTE_BUFFER={'ENABLED': False}):
+                with transaction.atomic():
+                    view(request, *match.args, **match.kwargs)
+                    transaction.set_rollback(True)
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name}:"))
+            for query in captured:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith(EXPLAINED):
+                    continue
+                scans = self.sequential_scans(sql)
+                self.stdout.write(f"  {sql[:120]}")
+                for table in scans:
+                    size = sizes.get(table, 0)
+                    self.stdout.write(f"    Seq Scan on {table} ({size} rows)")
+                    if size > rows:
+                        problems.append(f"{name}: Seq Scan on {table} ({size} rows) in {sql}")
+        return problems
+
+    @staticmethod
+    def table_sizes():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relname, reltuples::bigint FROM pg_class WHERE relkind = 'r'")
+            return dict(cursor.fetchall())
+
+    @staticmethod
+    def sequential_scans(sql):
+        """
+        The function explains a query and collects the tables it scans sequentially.
+
+        :param sql: The `sql` parameter is the query with its parameters interpolated
+        :return: a list of table names.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        tables = []
+        nodes = [entry['Plan'] for entry in plan]
+        while nodes:
+            node = nodes.pop()
+            if node['Node Type'] == 'Seq Scan':
+                tables.append(node['Relation Name'])
+            nodes.extend(node.get('Plans', ()))
+        return tables
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from polls import bulk
+from polls.models import Question
+
+
+# The Command class writes all questions with their choices and vote tallies as NDJSON or CSV, batch by batch.
+class Command(BaseCommand):
+    help = "Exports all questions with their choices and vote tallies as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=bulk.FORMATS, default='ndjson')
+        parser.add_argument('--output', help="File to write; the standard output by default.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Questions fetched per query.")
+
+    def handle(self, *args, **options):
+        chunks = bulk.export(Question.objects.all(), options['format'], options['batch_size'])
+        if options['output'] is None:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            output.writelines(chunks)
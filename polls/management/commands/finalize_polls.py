@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from polls import snapshots
+
+
+# The Command class freezes the results of the expired questions into snapshots and optionally archives their votes.
+class Command(BaseCommand):
+    help = "Stores the final results of the expired questions as snapshots served by the results page."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archive', action='store_true',
+                            help="Also move the votes of the finalized questions to the archive table.")
+        parser.add_argument('--batch-size', type=int, default=100, help="Questions finalized per transaction.")
+        parser.add_argument('--archive-batch-size', type=int, default=10000, help="Votes archived per transaction.")
+
+    def handle(self, *args, **options):
+        finalized = snapshots.finalize(batch_size=options['batch_size'])
+        self.stdout.write(f"Finalized {finalized} question{'s' if finalized != 1 else ''}.")
+        if options['archive']:
+            archived = snapshots.archive(batch_size=options['archive_batch_size'])
+            self.stdout.write(f"Archived {archived} vote{'s' if archived != 1 else ''}.")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from polls.buffer import VoteBuffer, buffer_path
+
+
+# The Command class stores the votes left in the write-behind buffer log, e.g. after a crash of the web workers.
+class Command(BaseCommand):
+    help = ("Replays the votes kept in the write-behind buffer log into the database. Run it while no web worker is "
+            "using the log directory.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help="Directory of the buffer log; defaults to POLLS_VOTE_BUFFER['PATH'].")
+
+    def handle(self, *args, **options):
+        vote_buffer = VoteBuffer(buffer_path(options['path']))
+        replayed = vote_buffer.open(claim_all=True)
+        stored = vote_buffer.flush()
+        self.stdout.write(f"Replayed {replayed} buffered votes, {stored} of them were new.")
@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls import bulk
+
+
+# The Command class imports questions with their choices from an NDJSON or CSV file, in batched transactions.
+class Command(BaseCommand):
+    help = "Imports questions with their choices from NDJSON (one question per line) or CSV (one choice per row)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for the standard input.")
+        parser.add_argument('--format', choices=bulk.FORMATS,
+                            help="Format of the file; by default taken from its extension, NDJSON otherwise.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Questions saved per transaction.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        try:
+            source = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as error:
+            raise CommandError(error)
+        with source:
+            result = bulk.import_polls(source, format, options['batch_size'])
+
+        self.stdout.write(f"Imported {result['questions']} questions with {result['choices']} choices.")
+        for error in result['errors']:
+            self.stderr.write(f"Line {error['line']}: {error['error']}")
+        if result['errors']:
+            raise CommandError(f"{len(result['errors'])} record{'s' if len(result['errors']) != 1 else ''} rejected.")
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from polls import reconcile
+
+
+# The Command class repairs the drift of the denormalized Choice.votes counters against the Vote table, once or
+# periodically.
+class Command(BaseCommand):
+    help = "Recounts Choice.votes from the Vote table where they drifted apart."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Check every choice instead of only the choices voted for since the last run.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Choices checked per query.")
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Repeat the reconciliation every INTERVAL seconds instead of running it once.")
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        run = reconcile.full if options['full'] else reconcile.incremental
+        while True:
+            result = run(chunk_size=options['chunk_size'])
+            self.stdout.write(f"Checked {result['checked']} choices, repaired {result['repaired']}; "
+                              f"checkpoint at vote {result['last_vote_id']}.")
+            if interval <= 0:
+                break
+            time.sleep(interval)
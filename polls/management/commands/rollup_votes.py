@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from polls import rollups
+
+
+# The Command class adds the new votes to the minute, hour and day vote rollups, once or periodically.
+class Command(BaseCommand):
+    help = "Rolls the votes cast since the last run up into per-choice minute, hour and day buckets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Drop the rollups and recompute them from all the votes, e.g. after votes were "
+                                 "deleted.")
+        parser.add_argument('--chunk-size', type=int, help="Votes read per transaction (default: 100000).")
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Repeat the rollup every INTERVAL seconds instead of running it once.")
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        run = rollups.rebuild if options['rebuild'] else rollups.update
+        while True:
+            result = run(chunk_size=options['chunk_size'])
+            self.stdout.write(f"Rolled up {result['chunks']} chunks of votes; "
+                              f"checkpoint at vote {result['last_vote_id']}.")
+            if interval <= 0:
+                break
+            run = rollups.update
+            time.sleep(interval)
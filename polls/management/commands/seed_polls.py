@@ -0,0 +1,39 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from polls import seeding
+
+
+# The Command class fills the database with a synthetic dataset for load tests and query plan checks.
+class Command(BaseCommand):
+    help = ("Bulk-generates questions, choices, users and votes, with a Zipf-skewed popularity of the questions and "
+            "choices. Meant for load tests; never run it against production data.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=1000)
+        parser.add_argument('--choices', type=int, default=4, help="Number of choices of every question.")
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--votes', type=int, default=1000000)
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help="Zipf exponent of the popularity; 0 spreads the votes evenly (default: 1.0).")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--random-seed', type=int, help="Makes the generated votes reproducible.")
+        parser.add_argument('--days', type=float, default=0,
+                            help="Spread the vote dates over the last DAYS days instead of dating them all now.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with transaction.atomic():
+            created = seeding.seed(questions=options['questions'], choices=options['choices'],
+                                   users=options['users'], votes=options['votes'], skew=options['skew'],
+                                   batch_size=options['batch_size'], random_seed=options['random_seed'],
+                                   period=datetime.timedelta(days=options['days']))
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # Fresh statistics, so the planner knows about the new rows right away.
+                cursor.execute('ANALYZE polls_question, polls_choice, polls_user, polls_vote')
+        self.stdout.write("Created " + ", ".join(f"{count} {name}" for name, count in created.items())
+                          + f" in {time.perf_counter() - start:.1f}s.")
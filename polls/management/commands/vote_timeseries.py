@@ -0,0 +1,41 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from polls import rollups
+from polls.models import Question, VoteRollup
+
+
+def parse_time(value):
+    if value is None:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise CommandError(f"Invalid date and time: {value!r}")
+    return parsed
+
+
+# The Command class prints the vote time series of a question as CSV: the votes of every choice per bucket, their
+# cumulative shares and the leader, read from the vote rollups.
+class Command(BaseCommand):
+    help = "Prints the votes over time, the cumulative share of every choice and the leader of a question, as CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('question_id', type=int)
+        parser.add_argument('--resolution', choices=rollups.RESOLUTIONS, default=VoteRollup.HOUR)
+        parser.add_argument('--start', help="First bucket, an ISO 8601 date and time (default: the first vote).")
+        parser.add_argument('--end', help="End of the buckets, an ISO 8601 date and time (default: the last vote).")
+
+    def handle(self, *args, **options):
+        if not Question.objects.filter(pk=options['question_id']).exists():
+            raise CommandError(f"Question {options['question_id']} does not exist")
+        data = rollups.series(options['question_id'], options['resolution'], parse_time(options['start']),
+                              parse_time(options['end']))
+        texts = [choice['choice_text'] for choice in data['choices']]
+        text_of = {choice['id']: choice['choice_text'] for choice in data['choices']}
+        writer = csv.writer(self.stdout)
+        writer.writerow(['bucket', *texts, *(f"{text} share %" for text in texts), 'leader', 'leader changed'])
+        for bucket in data['buckets']:
+            writer.writerow([bucket['bucket'].isoformat(), *bucket['votes'], *bucket['share'],
+                             text_of.get(bucket['leader'], ''), int(bucket['leader_changed'])])
@@ -0,0 +1,313 @@
+import bisect
+import contextlib
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+from . import results_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,
+    'LOG': True,
+    'SERVER_TIMING': True,
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+# Upper bounds of the histogram buckets, in seconds.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def metrics_settings():
+    """
+    The function returns the instrumentation configuration, the `POLLS_METRICS` setting merged over the defaults.
+
+    :return: a dictionary with the ENABLED, SAMPLE_RATE, LOG, SERVER_TIMING and ALLOWED_IPS keys.
+    """
+    return {**DEFAULTS, **getattr(settings, 'POLLS_METRICS', {})}
+
+
+# The Histogram class counts observations in fixed buckets, like a Prometheus histogram.
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        The function returns the cumulative bucket counts.
+
+        :return: a list of (upper bound, count) tuples, the last bound being '+Inf'.
+        """
+        total = 0
+        result = []
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+# The ViewStats class holds the histograms and counters of the sampled requests of one URL name.
+class ViewStats:
+    def __init__(self):
+        self.wall = Histogram()
+        self.db = Histogram()
+        self.template = Histogram()
+        self.queries = 0
+        self.duplicates = 0
+
+
+# The Registry class keeps the statistics of all URL names of this process.
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, record):
+        with self._lock:
+            stats = self.views.get(record.view_name)
+            if stats is None:
+                stats = self.views[record.view_name] = ViewStats()
+            stats.wall.observe(record.wall)
+            stats.db.observe(record.db_time)
+            stats.template.observe(record.template_time)
+            stats.queries += record.queries
+            stats.duplicates += record.duplicates
+
+    def reset(self):
+        with self._lock:
+            self.views = {}
+
+    def exposition(self, sample_rate):
+        """
+        The function renders the statistics in the Prometheus text format.
+
+        :param sample_rate: The `sample_rate` parameter is the current sampling rate, exported so that the sampled
+        counts can be scaled
+        :return: the text, a string.
+        """
+        lines = ['# HELP polls_metrics_sample_rate Fraction of the requests that are measured.',
+                 '# TYPE polls_metrics_sample_rate gauge',
+                 f'polls_metrics_sample_rate {sample_rate}']
+        with self._lock:
+            views = sorted(self.views.items())
+            for name, attribute, help_text in (
+                    ('polls_request_duration_seconds', 'wall', 'Wall time of the sampled requests.'),
+                    ('polls_request_db_duration_seconds', 'db', 'Time spent in database queries.'),
+                    ('polls_request_template_duration_seconds', 'template', 'Time spent rendering templates.')):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for view, stats in views:
+                    histogram = getattr(stats, attribute)
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+            for name, attribute, help_text in (
+                    ('polls_request_queries_total', 'queries', 'Database queries of the sampled requests.'),
+                    ('polls_request_duplicate_queries_total', 'duplicates',
+                     'Queries repeating an earlier query of the same request.')):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                lines += [f'{name}{{view="{view}"}} {getattr(stats, attribute)}' for view, stats in views]
+
+        cache = results_cache.metrics.snapshot()
+        lines += ['# HELP polls_results_cache_requests_total Lookups of the rendered results fragments.',
+                  '# TYPE polls_results_cache_requests_total counter',
+                  f'polls_results_cache_requests_total{{result="hit"}} {cache["hits"]}',
+                  f'polls_results_cache_requests_total{{result="miss"}} {cache["misses"]}']
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+_current = contextvars.ContextVar('polls_request_metrics', default=None)
+
+
+# The RequestMetrics class collects the measurements of one sampled request.
+class RequestMetrics:
+    def __init__(self):
+        self.view_name = None
+        self.wall = 0.0
+        self.db_time = 0.0
+        self.queries = 0
+        self.duplicates = 0
+        self.template_time = 0.0
+        self._seen = set()
+        self._rendering = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # The execute wrapper of the database connections.
+        if not many:
+            key = (sql, repr(params))
+            if key in self._seen:
+                self.duplicates += 1
+            else:
+                self._seen.add(key)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+    def server_timing(self):
+        return (f'app;dur={self.wall * 1000:.1f}, db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", '
+                f'tpl;dur={self.template_time * 1000:.1f}')
+
+    def as_dict(self):
+        return {'view': self.view_name, 'wall_ms': round(self.wall * 1000, 3), 'db_ms': round(self.db_time * 1000, 3),
+                'queries': self.queries, 'duplicate_queries': self.duplicates,
+                'template_ms': round(self.template_time * 1000, 3)}
+
+
+# The Template class times the rendering of Django templates for the sampled requests.
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        metrics._rendering += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics._rendering -= 1
+            # Templates rendered by other templates are part of the outer rendering.
+            if not metrics._rendering:
+                metrics.template_time += time.perf_counter() - start
+
+
+# The DjangoTemplates class is the Django template backend returning templates that report their rendering time to
+# the metrics middleware.
+class DjangoTemplates(django_backend.DjangoTemplates):
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+# The MetricsMiddleware class measures a sample of the requests: the wall time, the time and number of database
+# queries (with the queries repeated within the request), and the template rendering time. The measurements are added
+# to the per-URL-name histograms of the process, logged as one JSON line and returned in the Server-Timing header.
+# Requests not sampled cost a single random number. The middleware supports both WSGI and ASGI, so it does not force
+# the asynchronous views into a thread.
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        config = metrics_settings()
+        if not sampled(config):
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        with measuring(metrics):
+            response = self.get_response(request)
+        return self.report(request, response, metrics, config)
+
+    async def __acall__(self, request):
+        config = metrics_settings()
+        if not sampled(config):
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        # The database connections belong to threads, and the ORM calls of the asynchronous views run in the thread
+        # of sync_to_async(), so the queries are intercepted there.
+        wrappers = await sync_to_async(wrap_connections)(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrappers.close)()
+            metrics.wall = time.perf_counter() - start
+            _current.reset(token)
+        return self.report(request, response, metrics, config)
+
+    @staticmethod
+    def report(request, response, metrics, config):
+        match = getattr(request, 'resolver_match', None)
+        metrics.view_name = match.view_name if match else 'unresolved'
+        registry.observe(metrics)
+        if config['SERVER_TIMING']:
+            response['Server-Timing'] = metrics.server_timing()
+        if config['LOG'] and logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({**metrics.as_dict(), 'method': request.method, 'status': response.status_code}))
+        return response
+
+
+def sampled(config):
+    return config['ENABLED'] and random.random() < config['SAMPLE_RATE']
+
+
+def wrap_connections(metrics):
+    """
+    The function makes the queries of the database connections of the current thread count towards `metrics`.
+
+    :param metrics: The `metrics` parameter is the RequestMetrics object of the request
+    :return: an ExitStack removing the execute wrappers when closed.
+    """
+    stack = contextlib.ExitStack()
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(metrics))
+    return stack
+
+
+@contextlib.contextmanager
+def measuring(metrics):
+    """
+    The function makes the queries and template renderings of the enclosed code count towards `metrics`, and measures
+    its wall time.
+
+    :param metrics: The `metrics` parameter is the RequestMetrics object of the request
+    """
+    token = _current.set(metrics)
+    start = time.perf_counter()
+    try:
+        with wrap_connections(metrics):
+            yield
+    finally:
+        metrics.wall = time.perf_counter() - start
+        _current.reset(token)
+
+
+def metrics_view(request):
+    """
+    The function exposes the request histograms of this process in the Prometheus text format. Every worker process
+    keeps its own statistics.
+
+    :param request: The `request` parameter is the HttpRequest of the scraper; only the addresses listed in
+    POLLS_METRICS['ALLOWED_IPS'] are served (all of them if it is None)
+    :return: an HttpResponse with the metrics.
+    """
+    config = metrics_settings()
+    if config['ALLOWED_IPS'] is not None and request.META.get('REMOTE_ADDR') not in config['ALLOWED_IPS']:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.exposition(config['SAMPLE_RATE']), content_type='text/plain; version=0.0.4')
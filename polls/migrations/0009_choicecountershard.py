@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-17 08:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0008_alter_question_exp_date_alter_vote_vote_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChoiceCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('votes', models.IntegerField(default=0)),
+                ('choice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='polls.choice')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='choicecountershard',
+            constraint=models.UniqueConstraint(fields=('choice', 'shard'), name='Unique counter shard of choice'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0009_choicecountershard'),
+    ]
+
+    # The composite indexes are created before the foreign key indexes they make redundant are dropped.
+    operations = [
+        migrations.AddIndex(
+            model_name='choice',
+            index=models.Index(fields=['question', 'id'], include=('choice_text', 'votes'), name='choice_question_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-pub_date'], include=('id', 'question_text', 'exp_date'), name='question_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['question', 'choice'], name='vote_question_choice_idx'),
+        ),
+        migrations.AlterField(
+            model_name='choice',
+            name='question',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='polls.question'),
+        ),
+        migrations.AlterField(
+            model_name='choicecountershard',
+            name='choice',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='polls.choice'),
+        ),
+        migrations.AlterField(
+            model_name='vote',
+            name='question',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='polls.question'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0011_reconcilecheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultsSnapshot',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='polls.question')),
+                ('total', models.IntegerField()),
+                ('choices', models.JSONField()),
+                ('html', models.TextField()),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedVote',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('vote_date', models.DateTimeField()),
+                ('choice', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='polls.choice')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.question')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='polls.user')),
+            ],
+        ),
+    ]
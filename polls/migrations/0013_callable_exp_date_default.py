@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:22
+
+from django.db import migrations, models
+import polls.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0012_results_snapshots'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='question',
+            name='exp_date',
+            field=models.DateTimeField(default=polls.models.default_exp_date, verbose_name='expiration date'),
+        ),
+    ]
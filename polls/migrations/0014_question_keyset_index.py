@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0013_callable_exp_date_default'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='question',
+            name='question_pub_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-pub_date', '-id'], include=('question_text', 'exp_date'), name='question_pub_date_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0014_question_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=6)),
+                ('bucket', models.DateTimeField()),
+                ('votes', models.BigIntegerField(default=0)),
+                ('choice', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to='polls.choice')),
+                ('question', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to='polls.question')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['question', 'resolution', 'bucket'], name='rollup_question_bucket_idx'), models.Index(condition=models.Q(('resolution', 'minute')), fields=['bucket'], name='rollup_minute_bucket_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='voterollup',
+            constraint=models.UniqueConstraint(fields=('choice', 'resolution', 'bucket'), name='Unique rollup bucket of choice'),
+        ),
+    ]
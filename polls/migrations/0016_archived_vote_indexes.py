@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0015_vote_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedvote',
+            name='choice',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.choice'),
+        ),
+        migrations.AlterField(
+            model_name='archivedvote',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.user'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0016_archived_vote_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reconcilecheckpoint',
+            name='horizon_seen',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reconcilecheckpoint',
+            name='horizon_vote_id',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -1,28 +1,44 @@
 import datetime
 
 from django.db import models
-from django.db.models.functions import Length
+from django.db.models.functions import Coalesce, Length, NullIf
 from django.utils import timezone
 from django.urls import reverse
-from django.core.exceptions import ValidationError, ObjectDoesNotExist
+from django.core.exceptions import ValidationError
 from .validators import validate_votes, validate_text, validate_userid, validate_date
 from django.core.validators import MaxValueValidator
 
 models.CharField.register_lookup(Length)
 
 
+def default_exp_date():
+    """
+    The function returns the default expiration date of a question, one week from now. It is evaluated for every new
+    question, not once per process, so long-running workers do not hand out a stale date.
+
+    :return: a datetime.
+    """
+    return timezone.now() + datetime.timedelta(days=7)
+
+
 # The `Question` class represents a model for a question with text, publication date, and expiration date, and includes
 # methods for checking if the question was published recently.
 class Question(models.Model):
     question_text = models.CharField(max_length=200, unique=True, validators=[validate_text])
     pub_date = models.DateTimeField('date published', default=timezone.now)
-    exp_date = models.DateTimeField('expiration date', default=timezone.now() + timezone.timedelta(7))
+    exp_date = models.DateTimeField('expiration date', default=default_exp_date)
 
     class Meta:
         constraints = [
             models.CheckConstraint(check=models.Q(question_text__length__gte=1), name="question_text_length"),
             models.CheckConstraint(check=models.Q(exp_date__gte=models.F("pub_date")), name="Expiration date")
         ]
+        indexes = [
+            # The index lists the latest published questions, page by page from a (pub_date, id) cursor: an index-only
+            # scan stopping after one page of rows.
+            models.Index(fields=['-pub_date', '-id'], include=['question_text', 'exp_date'],
+                         name='question_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.question_text
@@ -52,38 +68,132 @@ class Question(models.Model):
 
         return now - datetime.timedelta(days=days) < self.pub_date <= now
 
+    def is_closed(self, now=None):
+        """
+        The function checks if voting on the question has ended.
+
+        :param now: The `now` parameter is the time to check at, the current time by default
+        :return: True if the expiration date has passed, False otherwise.
+        """
+        return self.exp_date <= (now or timezone.now())
+
+
+# The ChoiceQuerySet class provides queryset methods for choices, such as annotating the full vote tally that includes
+# votes not yet folded from the counter shards into `Choice.votes`.
+class ChoiceQuerySet(models.QuerySet):
+    def with_tallies(self):
+        """
+        The function annotates every choice with `tally`, the sum of `votes` and all its counter shards.
+
+        :return: a queryset of Choice objects annotated with the `tally` attribute.
+        """
+        shards = ChoiceCounterShard.objects.filter(choice=models.OuterRef('pk')).order_by().values('choice')
+        shard_votes = shards.annotate(total=models.Sum('votes')).values('total')
+        return self.annotate(tally=models.F('votes') + Coalesce(models.Subquery(shard_votes), 0))
+
+    def with_results(self):
+        """
+        The function annotates every choice with its `tally`, the `total` of votes of its question and its `percentage`
+        share of that total, all computed by the database in the same query.
+
+        :return: a queryset of Choice objects annotated with the `tally`, `total` and `percentage` attributes.
+        """
+        total = models.Window(models.Sum('tally'), partition_by=models.F('question_id'))
+        return self.with_tallies().annotate(total=total).annotate(
+            percentage=Coalesce(models.ExpressionWrapper(models.F('tally') * 100.0 / NullIf(models.F('total'), 0),
+                                                         output_field=models.FloatField()), 0.0))
+
 
 # The Choice class represents a choice for a question in a poll, with attributes for the choice text, number of votes,
 # and a foreign key to the associated question.
 class Choice(models.Model):
-    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    # Indexed by the (question, id) index below.
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, db_index=False)
     choice_text = models.CharField(max_length=200, validators=[validate_text])
     votes = models.IntegerField(default=0, validators=[validate_votes])
 
+    objects = ChoiceQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.CheckConstraint(check=models.Q(choice_text__length__gte=1), name="choice_text_length"),
             models.CheckConstraint(check=models.Q(votes__gte=0), name="negative votes number"),
             models.UniqueConstraint(fields=['question', 'choice_text'], name='Unique answers to question'),
         ]
+        indexes = [
+            # The choices of a question in pk order (detail and results pages) and the (question, pk) lookup of vote().
+            models.Index(fields=['question', 'id'], include=['choice_text', 'votes'], name='choice_question_id_idx'),
+        ]
 
     def __str__(self):
         return self.choice_text
 
     def clean(self):
         """
-        The function checks if a choice already exists in a question and raises a validation error if it does.
+        The function checks that no other choice of the question has the same text, with one EXISTS query on the
+        `Unique answers to question` constraint index instead of counting the matching choices. Concurrent saves are
+        still caught by the constraint itself.
         """
-        try:
-            if self.question.choice_set.filter(choice_text=self.choice_text).count():
-                raise ValidationError('Choice already exists')
-        except ObjectDoesNotExist:
-            pass
+        if self.question_id is None:
+            return
+        duplicates = Choice.objects.filter(question_id=self.question_id, choice_text=self.choice_text)
+        if duplicates.exclude(pk=self.pk).exists():
+            raise ValidationError({'choice_text': 'Choice already exists'})
 
     def get_absolute_url(self):
         return reverse('polls:detail', args=[self.question.id])
 
 
+# The ChoiceCounterShard class represents one of the counter rows a hot choice's votes are spread over, so that
+# concurrent voters do not queue up on the lock of a single Choice row. Shards are folded back into `Choice.votes` by
+# the `compact_vote_shards` management command.
+class ChoiceCounterShard(models.Model):
+    # Indexed by the unique (choice, shard) constraint.
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE, related_name='shards', db_index=False)
+    shard = models.PositiveSmallIntegerField()
+    votes = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['choice', 'shard'], name='Unique counter shard of choice'),
+        ]
+
+
+# The ReconcileCheckpoint class stores how far a job reading the Vote table incrementally (the reconciliation or the
+# vote rollups) has read it: the Vote id below which every vote has been read. The next run only reads the votes above
+# it. Vote ids are allocated when the votes are inserted but only become visible when their transaction commits, so the
+# highest id a run sees is only kept as the horizon, which becomes the checkpoint once it is old enough (see `settle`).
+class ReconcileCheckpoint(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    last_vote_id = models.BigIntegerField(default=0)
+    horizon_vote_id = models.BigIntegerField(default=0)
+    horizon_seen = models.DateTimeField(null=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_vote_id}"
+
+    def settle(self, last_vote_id, seconds, now=None):
+        """
+        The function returns the Vote id below which all votes have committed: the horizon, once it was seen at least
+        `seconds` seconds ago (longer than the transactions inserting votes), or else the checkpoint. A new horizon is
+        recorded once the previous one has settled. The caller saves the checkpoint.
+
+        :param last_vote_id: The `last_vote_id` parameter is the highest Vote id seen by the run
+        :param seconds: The `seconds` parameter is the settle interval
+        :param now: The `now` parameter is the time the run saw `last_vote_id` at, by default the current time
+        :return: the settled Vote id.
+        """
+        now = now or timezone.now()
+        settled = self.last_vote_id
+        if self.horizon_seen is not None and self.horizon_seen <= now - datetime.timedelta(seconds=seconds):
+            settled = max(settled, self.horizon_vote_id)
+            self.horizon_seen = None
+        if self.horizon_seen is None and last_vote_id > settled:
+            self.horizon_vote_id, self.horizon_seen = last_vote_id, now
+        return settled
+
+
 # The User class is a model that represents a user with a username and a unique userid.
 class User(models.Model):
     username = models.CharField(max_length=20, default='Guest', validators=[validate_text])
@@ -99,7 +209,8 @@ class User(models.Model):
 # The Vote class represents a vote made by a user on a specific question and choice, with a unique constraint on the
 # combination of question and user.
 class Vote(models.Model):
-    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    # Indexed by the unique (question, user) constraint and the (question, choice) index.
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, db_index=False)
     choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     vote_date = models.DateTimeField(default=timezone.now, validators=[MaxValueValidator(limit_value=timezone.now)])
@@ -108,11 +219,80 @@ class Vote(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['question', 'user'], name='Unique user votes required'),
         ]
+        indexes = [
+            # Votes of a question grouped by choice, e.g. when counting the votes of the choices.
+            models.Index(fields=['question', 'choice'], name='vote_question_choice_idx'),
+        ]
 
     def clean(self):
-        try:
-            if self.choice not in self.question.choice_set.all():
-                raise ValidationError('Choice does not exist for this question')
-        except ObjectDoesNotExist:
-            pass
+        """
+        The function checks that the choice belongs to the question, with one EXISTS query on the primary key of the
+        choice instead of loading every choice of the question.
+        """
+        if self.question_id is None or self.choice_id is None:
+            return
+        if not Choice.objects.filter(pk=self.choice_id, question_id=self.question_id).exists():
+            raise ValidationError({'choice': 'Choice does not exist for this question'})
+
+
+# The ResultsSnapshot class stores the final results of an expired question: the tallies and percentages of its
+# choices, their total and the rendered results fragment. Expired questions take no more votes, so the results page is
+# served from the snapshot without reading the choices. Snapshots are created by the `finalize_polls` command and
+# deleted when the expiration date of their question is moved into the future (see `snapshots.reopen`).
+class ResultsSnapshot(models.Model):
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    total = models.IntegerField()
+    # A list of {"id", "choice_text", "votes", "percentage"} objects in the order of the results page.
+    choices = models.JSONField()
+    html = models.TextField()
+    created = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.question_id}: {self.total} votes"
 
+
+# The ArchivedVote class keeps the votes of finalized questions, moved out of the Vote table by `finalize_polls
+# --archive`, so the indexes of the Vote table only cover the questions still being voted on.
+class ArchivedVote(models.Model):
+    # The id of the original vote.
+    id = models.BigIntegerField(primary_key=True)
+    # Every foreign key is indexed, so deleting a question, choice or user finds its archived votes without scanning
+    # the whole archive.
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    vote_date = models.DateTimeField()
+
+
+# The VoteRollup class holds the number of votes a choice received in one minute, hour or day, maintained
+# incrementally from the new votes by `rollup_votes`. The vote time series are read from these rows instead of being
+# grouped from the Vote table.
+class VoteRollup(models.Model):
+    MINUTE = 'minute'
+    HOUR = 'hour'
+    DAY = 'day'
+    RESOLUTIONS = [(MINUTE, 'Minute'), (HOUR, 'Hour'), (DAY, 'Day')]
+
+    # Derived from the votes, which are constrained already: the foreign keys are not checked by the database, which
+    # would double the cost of a rollup. Deleted questions and choices still delete their rollups (on_delete).
+    # Indexed by the (question, resolution, bucket) index below.
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, db_index=False, db_constraint=False)
+    # Indexed by the unique (choice, resolution, bucket) constraint.
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE, db_index=False, db_constraint=False)
+    resolution = models.CharField(max_length=6, choices=RESOLUTIONS)
+    bucket = models.DateTimeField()
+    votes = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['choice', 'resolution', 'bucket'], name='Unique rollup bucket of choice'),
+        ]
+        indexes = [
+            # The time series of a question, and the totals before its start.
+            models.Index(fields=['question', 'resolution', 'bucket'], name='rollup_question_bucket_idx'),
+            # The pruning of the old minute buckets.
+            models.Index(fields=['bucket'], condition=models.Q(resolution='minute'), name='rollup_minute_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.choice_id} {self.resolution} {self.bucket}: {self.votes}"
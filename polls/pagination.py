@@ -0,0 +1,75 @@
+import base64
+import binascii
+import datetime
+
+
+def encode_cursor(pub_date, pk):
+    """
+    The function encodes the position of a question in the (pub_date, id) order as an opaque URL-safe cursor.
+
+    :param pub_date: The `pub_date` parameter is the publication date of the last question of a page
+    :param pk: The `pk` parameter is the primary key of that question
+    :return: the cursor, a string.
+    """
+    return base64.urlsafe_b64encode(f'{pub_date.isoformat()}|{pk}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    The function decodes a cursor of `encode_cursor`.
+
+    :param cursor: The `cursor` parameter is the cursor string
+    :return: a tuple of the publication date and the primary key. A ValueError is raised for malformed cursors.
+    """
+    try:
+        pub_date, pk = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split('|')
+        return datetime.datetime.fromisoformat(pub_date), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as error:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from error
+
+
+def keyset(questions, cursor=None):
+    """
+    The function orders questions from the newest and seeks past the cursor. The seek is a range condition on the
+    (pub_date, id) index, so every page reads only its own rows, however deep it is, unlike OFFSET, which reads and
+    discards all the rows of the previous pages.
+
+    :param questions: The `questions` parameter is a queryset of questions, which may be a values() queryset
+    :param cursor: The `cursor` parameter is the cursor of the previous page, or None for the first page
+    :return: the ordered queryset, to be sliced to the page size plus one.
+    """
+    questions = questions.order_by('-pub_date', '-pk')
+    if cursor:
+        pub_date, pk = decode_cursor(cursor)
+        # (pub_date, id) < (cursor): the first condition bounds the index scan, the second skips the ties.
+        questions = questions.filter(pub_date__lte=pub_date).exclude(pub_date=pub_date, pk__gte=pk)
+    return questions
+
+
+def split_page(rows, size):
+    """
+    The function splits the `size` + 1 rows fetched for a page into the page and the cursor of the next one.
+
+    :param rows: The `rows` parameter is the list of fetched questions (model instances or dictionaries)
+    :param size: The `size` parameter is the page size
+    :return: a tuple of the rows of the page and the cursor of the next page, None on the last page.
+    """
+    page = rows[:size]
+    if len(rows) <= size:
+        return page, None
+    last = page[-1]
+    if isinstance(last, dict):
+        return page, encode_cursor(last['pub_date'], last['id'])
+    return page, encode_cursor(last.pub_date, last.pk)
+
+
+def keyset_page(questions, cursor, size):
+    """
+    The function fetches one page of questions, from the newest, with one query.
+
+    :param questions: The `questions` parameter is a queryset of questions
+    :param cursor: The `cursor` parameter is the cursor of the previous page, or None for the first page
+    :param size: The `size` parameter is the page size
+    :return: a tuple of the list of questions and the cursor of the next page, None on the last page.
+    """
+    return split_page(list(keyset(questions, cursor)[:size + 1]), size)
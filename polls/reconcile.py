@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import counters, results_cache
+from .models import Choice, ReconcileCheckpoint, Vote
+
+CHECKPOINT = 'choice_votes'
+
+
+def settle_seconds():
+    """
+    The function returns how long the highest Vote id seen by a run is re-read before the checkpoint moves past it.
+
+    :return: the value of the `POLLS_RECONCILE_SETTLE` setting in seconds.
+    """
+    return getattr(settings, 'POLLS_RECONCILE_SETTLE', 10)
+
+
+def drifted(choice_ids):
+    """
+    The function returns the choices whose tally (`Choice.votes` plus the counter shards) differs from the number of
+    their rows in the Vote table, with one query. The choices of finalized questions are skipped: their results are
+    frozen in the snapshots and their votes may have been archived.
+
+    :param choice_ids: The `choice_ids` parameter is a list of primary keys of the choices to check
+    :return: a dictionary mapping the primary keys of the drifted choices to the primary keys of their questions.
+    """
+    votes = Vote.objects.filter(choice=OuterRef('pk')).order_by().values('choice').annotate(total=Count('pk'))
+    choices = Choice.objects.filter(pk__in=choice_ids, question__snapshot__isnull=True).with_tallies()
+    choices = choices.annotate(counted=Coalesce(Subquery(votes.values('total')), 0)).exclude(tally=F('counted'))
+    return dict(choices.values_list('pk', 'question_id'))
+
+
+def repair(choice_ids, chunk_size):
+    """
+    The function recounts the drifted choices among `choice_ids`, `chunk_size` choices at a time. Each chunk is
+    checked with one query and repaired with one grouped UPDATE in its own short transaction, so voters never wait for
+    the whole run.
+
+    :param choice_ids: The `choice_ids` parameter is an iterable of primary keys of the choices to check
+    :param chunk_size: The `chunk_size` parameter is the number of choices checked per query
+    :return: the number of repaired choices.
+    """
+    choice_ids = sorted(set(choice_ids))
+    repaired = 0
+    for start in range(0, len(choice_ids), chunk_size):
+        repaired += _repair_chunk(choice_ids[start:start + chunk_size])
+    return repaired
+
+
+def _repair_chunk(choice_ids):
+    found = drifted(choice_ids)
+    if not found:
+        return 0
+    with transaction.atomic():
+        # The recount locks the rows and counts again, so votes committed since the check are not lost.
+        counters.recount(found)
+        results_cache.bump_on_commit(set(found.values()))
+    return len(found)
+
+
+def _advance(checkpoint, last_vote_id, now):
+    checkpoint.last_vote_id = checkpoint.settle(last_vote_id, settle_seconds(), now)
+    checkpoint.save()
+    return checkpoint.last_vote_id
+
+
+def incremental(chunk_size=1000, now=None):
+    """
+    The function repairs the drift of `Choice.votes` caused since the last run. Only the choices that received votes
+    with an id above the checkpoint are recounted, so the cost grows with the new votes rather than with the table.
+    Votes may commit out of id order, so the checkpoint only moves up to the highest Vote id seen by a run at least
+    `POLLS_RECONCILE_SETTLE` seconds earlier (see `ReconcileCheckpoint.settle`); the votes above it are checked again
+    by the next runs, and a vote committed late with a lower id is never skipped.
+
+    Drift of choices without new votes (e.g. after votes were deleted) is only found by `full()`.
+
+    :param chunk_size: The `chunk_size` parameter is the number of choices checked and repaired per query
+    :param now: The `now` parameter is the current time, by default the real one
+    :return: a dictionary with the number of `checked` and `repaired` choices and the new `last_vote_id` checkpoint.
+    """
+    now = now or timezone.now()
+    checkpoint, _ = ReconcileCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    last_vote_id = Vote.objects.aggregate(last=Max('pk'))['last'] or checkpoint.last_vote_id
+    touched = set(Vote.objects.filter(pk__gt=checkpoint.last_vote_id, pk__lte=last_vote_id).order_by()
+                  .values_list('choice_id', flat=True).distinct())
+    repaired = repair(touched, chunk_size)
+    return {'checked': len(touched), 'repaired': repaired, 'last_vote_id': _advance(checkpoint, last_vote_id, now)}
+
+
+def full(chunk_size=1000, now=None):
+    """
+    The function checks every choice against the Vote table and repairs the drifted ones, then moves the checkpoint
+    like `incremental`. The choices are walked in primary key order, `chunk_size` at a time, and the votes of each
+    chunk are counted by the database, so neither the choices nor the votes are ever held in memory at once.
+
+    :param chunk_size: The `chunk_size` parameter is the number of choices checked and repaired per query
+    :param now: The `now` parameter is the current time, by default the real one
+    :return: a dictionary with the number of `checked` and `repaired` choices and the new `last_vote_id` checkpoint.
+    """
+    now = now or timezone.now()
+    checkpoint, _ = ReconcileCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    last_vote_id = Vote.objects.aggregate(last=Max('pk'))['last'] or checkpoint.last_vote_id
+    checked = repaired = 0
+    after = 0
+    while chunk := list(Choice.objects.filter(pk__gt=after).order_by('pk').values_list('pk', flat=True)[:chunk_size]):
+        checked += len(chunk)
+        repaired += _repair_chunk(chunk)
+        after = chunk[-1]
+    return {'checked': checked, 'repaired': repaired, 'last_vote_id': _advance(checkpoint, last_vote_id, now)}
@@ -0,0 +1,134 @@
+import contextlib
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+COOKIE_NAME = 'polls_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+DEFAULTS = {
+    'ALIASES': [],
+    'PIN_SECONDS': 5,
+}
+
+# The replica alias the reads of the current request go to, or None for the primary database.
+_replica = contextvars.ContextVar('polls_read_replica', default=None)
+
+
+def replica_settings():
+    """
+    The function returns the read replica settings.
+
+    :return: the `POLLS_READ_REPLICAS` setting merged over the defaults.
+    """
+    return {**DEFAULTS, **getattr(settings, 'POLLS_READ_REPLICAS', {})}
+
+
+def choose(request):
+    """
+    The function picks the database the reads of a request go to.
+
+    :param request: The `request` parameter is the HttpRequest
+    :return: a random replica alias, or None (the primary) without replicas or for a client pinned to the primary.
+    """
+    aliases = replica_settings()['ALIASES']
+    if not aliases or COOKIE_NAME in request.COOKIES:
+        return None
+    return random.choice(aliases)
+
+
+@contextlib.contextmanager
+def reading_from(alias):
+    """
+    The function sends the reads of the enclosed code, and of the sync_to_async() calls it makes, to a database.
+
+    :param alias: The `alias` parameter is the replica alias, or None for the primary
+    """
+    token = _replica.set(alias)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def primary():
+    """
+    The function sends the reads of the enclosed code to the primary database, for data that must not be stale.
+    """
+    return reading_from(None)
+
+
+def pin(response):
+    """
+    The function makes the client read from the primary for `PIN_SECONDS` seconds, longer than the replication lag,
+    so it sees its own writes (e.g. its vote on the results page it is redirected to).
+
+    :param response: The `response` parameter is the HttpResponse of a write
+    """
+    response.set_cookie(COOKIE_NAME, '1', max_age=replica_settings()['PIN_SECONDS'], httponly=True, samesite='Lax')
+
+
+# The ReplicaRouter class sends the reads of the views with a true `replica_reads` attribute (the view class or
+# function) to the replica picked by the ReplicaMiddleware, and everything else, all writes included, to the
+# primary. Outside of a replica, the related objects of objects read from a replica (which Django would read from that
+# replica too) are read from the primary.
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        instance = hints.get('instance')
+        if alias is None and instance is not None and instance._state.db in replica_settings()['ALIASES']:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary.
+        databases = {DEFAULT_DB_ALIAS, *replica_settings()['ALIASES']}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+# The ReplicaMiddleware class picks the database of the reads of every request: a random replica for the views with a
+# true `replica_reads` attribute, the primary for the others. The choice holds until the response is rendered, lazily
+# rendered template responses included. Successful writes (requests with an unsafe method answered without an error)
+# pin the client to the primary for a few seconds. The middleware supports both WSGI and ASGI.
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # A coroutine, so the handler does not run it in a thread.
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with reading_from(None):
+            response = self.get_response(request)
+        return self.pin_writes(request, response)
+
+    async def __acall__(self, request):
+        with reading_from(None):
+            response = await self.get_response(request)
+        return self.pin_writes(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(getattr(view_func, 'view_class', view_func), 'replica_reads', False):
+            _replica.set(choose(request))
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        ReplicaMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+    @staticmethod
+    def pin_writes(request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400 and replica_settings()['ALIASES']:
+            pin(response)
+        return response
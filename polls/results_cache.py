@@ -0,0 +1,221 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import replicas, stats
+from .models import Choice
+
+
+def get_cache():
+    """
+    The function returns the cache the rendered results are kept in.
+
+    :return: the cache configured by the `POLLS_RESULTS_CACHE` setting (an alias of CACHES).
+    """
+    return caches[getattr(settings, 'POLLS_RESULTS_CACHE', 'default')]
+
+
+def version_key(question_id):
+    return f'polls:results:version:{question_id}'
+
+
+def fragment_key(question_id, version):
+    return f'polls:results:{question_id}:{version}'
+
+
+def data_key(question_id, version):
+    return f'polls:results:data:{question_id}:{version}'
+
+
+def _now():
+    return time.time_ns() // 1000
+
+
+def get_version(question_id):
+    """
+    The function returns the current results version of a question. Versions are timestamps in microseconds; a
+    question without a version gets the current time, so fragments rendered under an evicted version are never
+    reused.
+
+    :param question_id: The `question_id` parameter is the primary key of the question
+    :return: the version, an integer.
+    """
+    cache = get_cache()
+    version = cache.get(version_key(question_id))
+    if version is None:
+        version = _now()
+        if not cache.add(version_key(question_id), version, timeout=None):
+            version = cache.get(version_key(question_id), version)
+    return version
+
+
+async def aget_version(question_id):
+    """
+    The function is the asynchronous variant of `get_version`.
+
+    :param question_id: The `question_id` parameter is the primary key of the question
+    :return: the version, an integer.
+    """
+    cache = get_cache()
+    version = await cache.aget(version_key(question_id))
+    if version is None:
+        version = _now()
+        if not await cache.aadd(version_key(question_id), version, timeout=None):
+            version = await cache.aget(version_key(question_id), version)
+    return version
+
+
+def bump(question_id):
+    """
+    The function moves the results of a question to a new version, so the rendered fragments of the previous one are
+    no longer served.
+
+    :param question_id: The `question_id` parameter is the primary key of the question
+    """
+    cache = get_cache()
+    previous = cache.get(version_key(question_id), 0)
+    cache.set(version_key(question_id), max(_now(), previous + 1), timeout=None)
+
+
+def bump_on_commit(question_ids):
+    """
+    The function bumps the results version of the questions once the current transaction commits.
+
+    :param question_ids: The `question_ids` parameter is an iterable of primary keys of the questions
+    """
+    question_ids = set(question_ids)
+    transaction.on_commit(lambda: [bump(question_id) for question_id in question_ids])
+
+
+def choice_changed(sender, instance, **kwargs):
+    """
+    The function is the receiver of the post_save and post_delete signals of Choice: adding, editing or removing a
+    choice changes the results of its question.
+    """
+    bump_on_commit([instance.question_id])
+
+
+# The CacheMetrics class counts the hits and misses of the results cache of this process.
+class CacheMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def snapshot(self):
+        """
+        The function returns the current counters.
+
+        :return: a dictionary with the number of hits, misses and the hit ratio.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'ratio': self.hits / total if total else 0.0}
+
+
+metrics = CacheMetrics()
+
+
+def render_choices(question, choices, summary):
+    """
+    The function renders the list of choices of the results page with their tallies, percentages and confidence
+    intervals, and the leader of the question.
+
+    :param question: The `question` parameter is the Question object
+    :param choices: The `choices` parameter is the list of its choices, annotated by `stats.annotate`
+    :param summary: The `summary` parameter is the summary of the question returned by `stats.annotate`
+    :return: the HTML fragment.
+    """
+    leader = choices[summary['leader']] if summary['leader'] is not None else None
+    return render_to_string('polls/results_choices.html',
+                            {'question': question, 'choices': choices, 'summary': summary, 'leader': leader})
+
+
+def results_fragment(question):
+    """
+    The function returns the rendered list of choices with their tallies for the results page of a question. The
+    fragment is rendered and cached once per results version, so the choices are queried only on a cache miss.
+
+    :param question: The `question` parameter is the Question object
+    :return: a tuple of the HTML fragment and True on a cache hit, else False.
+    """
+    cache = get_cache()
+    key = fragment_key(question.id, get_version(question.id))
+    fragment = cache.get(key)
+    if fragment is not None:
+        metrics.hit()
+        return mark_safe(fragment), True
+
+    metrics.miss()
+    # A lagging replica would cache stale tallies under the current version, so the fragment is read from the primary.
+    with replicas.primary():
+        choices = list(Choice.objects.with_results().filter(question=question).order_by('pk'))
+    fragment = render_choices(question, choices, stats.annotate([choices])[0])
+    cache.set(key, fragment, getattr(settings, 'POLLS_RESULTS_CACHE_TIMEOUT', 300))
+    return fragment, False
+
+
+def results_data(question_id):
+    """
+    The function returns the results of a question as plain data for the JSON API, cached once per results version like
+    the rendered fragment.
+
+    :param question_id: The `question_id` parameter is the primary key of the question
+    :return: a tuple of the total of votes and the list of choice dictionaries with their `id`, `choice_text`, `votes`
+    and `percentage`.
+    """
+    cache = get_cache()
+    key = data_key(question_id, get_version(question_id))
+    data = cache.get(key)
+    if data is not None:
+        metrics.hit()
+        return data
+
+    metrics.miss()
+    choices = list(Choice.objects.with_results().filter(question_id=question_id).order_by('pk')
+                   .values('id', 'choice_text', 'tally', 'total', 'percentage'))
+    total = choices[0]['total'] if choices else 0
+    data = total, [{'id': choice['id'], 'choice_text': choice['choice_text'], 'votes': choice['tally'],
+                    'percentage': choice['percentage']} for choice in choices]
+    cache.set(key, data, getattr(settings, 'POLLS_RESULTS_CACHE_TIMEOUT', 300))
+    return data
+
+
+async def aresults_fragment(question):
+    """
+    The function is the asynchronous variant of `results_fragment`, reading the cache and the choices with the async
+    cache and ORM interfaces.
+
+    :param question: The `question` parameter is the Question object
+    :return: a tuple of the HTML fragment and True on a cache hit, else False.
+    """
+    cache = get_cache()
+    key = fragment_key(question.id, await aget_version(question.id))
+    fragment = await cache.aget(key)
+    if fragment is not None:
+        metrics.hit()
+        return mark_safe(fragment), True
+
+    metrics.miss()
+    with replicas.primary():
+        choices = [choice async for choice in Choice.objects.with_results().filter(question=question).order_by('pk')]
+    fragment = render_choices(question, choices, stats.annotate([choices])[0])
+    await cache.aset(key, fragment, getattr(settings, 'POLLS_RESULTS_CACHE_TIMEOUT', 300))
+    return fragment, False
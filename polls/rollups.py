@@ -0,0 +1,199 @@
+import datetime
+import itertools
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import CharField, Count, Max, Q, Sum, Value
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from . import stats
+from .models import ArchivedVote, Choice, ReconcileCheckpoint, Vote, VoteRollup
+
+CHECKPOINT = 'vote_rollups'
+RESOLUTIONS = (VoteRollup.MINUTE, VoteRollup.HOUR, VoteRollup.DAY)
+
+DEFAULTS = {
+    'SETTLE': 10,
+    'CHUNK_SIZE': 100000,
+    'MINUTE_RETENTION_DAYS': 14,
+}
+
+
+def rollup_settings():
+    """
+    The function returns the vote rollups configuration, the `POLLS_VOTE_ROLLUPS` setting merged over the defaults.
+
+    :return: a dictionary with the SETTLE, CHUNK_SIZE and MINUTE_RETENTION_DAYS keys.
+    """
+    return {**DEFAULTS, **getattr(settings, 'POLLS_VOTE_ROLLUPS', {})}
+
+
+def _add(votes, resolution):
+    # One INSERT ... SELECT grouping the votes by choice and bucket in the database, adding the counts to the buckets
+    # already rolled up.
+    buckets = votes.order_by().values('question_id', 'choice_id', resolution=Value(resolution, CharField()),
+                                      bucket=Trunc('vote_date', resolution)).annotate(votes=Count('pk'))
+    sql, params = buckets.query.sql_with_params()
+    table = connection.ops.quote_name(VoteRollup._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(column)
+                        for column in (*buckets.query.values_select, *buckets.query.annotation_select))
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {table} ({columns}) {sql} ON CONFLICT (choice_id, resolution, bucket) "
+                       f"DO UPDATE SET votes = {table}.votes + EXCLUDED.votes", params)
+
+
+def highest_vote_id():
+    """
+    The function returns the highest id of the votes, archived or not.
+
+    :return: the vote id, 0 without votes.
+    """
+    return max(Vote.objects.aggregate(last=Max('pk'))['last'] or 0,
+               ArchivedVote.objects.aggregate(last=Max('pk'))['last'] or 0)
+
+
+def update(chunk_size=None, now=None):
+    """
+    The function adds the votes stored since the last run to the minute, hour and day rollups. The votes are read by
+    id, in chunks of `chunk_size` votes, each grouped by the database with three INSERT ... SELECT statements adding
+    to the buckets already rolled up and committed with the checkpoint in one transaction, so every vote is counted
+    exactly once even when runs are interrupted, and votes dated in the past (buffered or batch votes) are added to
+    their buckets. A run only reads up to the highest vote id seen by a run at least SETTLE seconds earlier (see
+    `ReconcileCheckpoint.settle`), so transactions still inserting votes with lower ids have committed. The
+    checkpoint row is locked, so concurrent runs wait for each other. Votes archived before they were rolled up are
+    read from the ArchivedVote table, which keeps their ids. Minute buckets older than MINUTE_RETENTION_DAYS are
+    skipped, and then dropped as they age.
+
+    :param chunk_size: The `chunk_size` parameter is the number of votes read per transaction
+    :param now: The `now` parameter is the current time, by default the real one
+    :return: a dictionary with the number of `chunks` and the new `last_vote_id`.
+    """
+    config = rollup_settings()
+    chunk_size = chunk_size or config['CHUNK_SIZE']
+    now = now or timezone.now()
+    # Minute buckets past their retention would be pruned right away, so they are not rolled up at all.
+    retained = now - datetime.timedelta(days=config['MINUTE_RETENTION_DAYS'])
+    highest = highest_vote_id()
+    with transaction.atomic():
+        checkpoint, _ = ReconcileCheckpoint.objects.select_for_update().get_or_create(name=CHECKPOINT)
+        last_vote_id = checkpoint.settle(highest, config['SETTLE'], now)
+        checkpoint.save(update_fields=['horizon_vote_id', 'horizon_seen', 'updated'])
+    chunks = 0
+    while True:
+        with transaction.atomic():
+            checkpoint = ReconcileCheckpoint.objects.select_for_update().get(name=CHECKPOINT)
+            start = checkpoint.last_vote_id
+            if start >= last_vote_id:
+                break
+            # The id of the chunk_size-th vote, read from the primary key index, so gaps in the ids cost nothing.
+            end = (Vote.objects.filter(pk__gt=start, pk__lte=last_vote_id).order_by('pk')
+                   .values_list('pk', flat=True)[chunk_size - 1:chunk_size].first() or last_vote_id)
+            sources = [Vote]
+            if ArchivedVote.objects.filter(pk__gt=start, pk__lte=end).exists():
+                sources.append(ArchivedVote)
+            for model in sources:
+                votes = model.objects.filter(pk__gt=start, pk__lte=end)
+                _add(votes.filter(vote_date__gte=retained), VoteRollup.MINUTE)
+                _add(votes, VoteRollup.HOUR)
+                _add(votes, VoteRollup.DAY)
+            checkpoint.last_vote_id = end
+            checkpoint.save(update_fields=['last_vote_id', 'updated'])
+        chunks += 1
+    prune(now)
+    return {'chunks': chunks, 'last_vote_id': start}
+
+
+def prune(now=None):
+    """
+    The function drops the minute buckets older than MINUTE_RETENTION_DAYS; the hour and day buckets are kept.
+
+    :param now: The `now` parameter is the current time, by default the real one
+    :return: the number of deleted buckets.
+    """
+    cutoff = (now or timezone.now()) - datetime.timedelta(days=rollup_settings()['MINUTE_RETENTION_DAYS'])
+    return VoteRollup.objects.filter(resolution=VoteRollup.MINUTE, bucket__lt=cutoff).delete()[0]
+
+
+def rebuild(chunk_size=None, now=None):
+    """
+    The function recomputes all rollups from the votes, e.g. after votes were deleted. The votes up to the checkpoint
+    have settled already, so they are rolled up again at once.
+
+    :return: the result of `update`.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        checkpoint, _ = ReconcileCheckpoint.objects.select_for_update().get_or_create(name=CHECKPOINT)
+        VoteRollup.objects.all().delete()
+        checkpoint.horizon_vote_id, checkpoint.last_vote_id = checkpoint.last_vote_id, 0
+        checkpoint.horizon_seen = now - datetime.timedelta(seconds=rollup_settings()['SETTLE'])
+        checkpoint.save()
+    return update(chunk_size, now)
+
+
+def series(question_id, resolution, start=None, end=None):
+    """
+    The function returns the vote time series of a question from its rollups, with two queries whatever the number
+    of votes: the votes of every choice in the buckets with votes between `start` and `end`, and, from `start` on, the
+    cumulative votes and share of every choice. The votes before `start` are summed from the day buckets and the
+    buckets of the requested resolution since the start of that day, or for minutes the hour buckets since the start
+    of that day and the minute buckets since the start of that hour. Minute series start at the first whole hour whose
+    minute buckets are still kept (see MINUTE_RETENTION_DAYS), whatever `start`. Votes not rolled up by `update` yet,
+    the votes of the last SETTLE seconds at least, are not counted.
+
+    :param question_id: The `question_id` parameter is the primary key of the question
+    :param resolution: The `resolution` parameter is 'minute', 'hour' or 'day'
+    :param start: The `start` parameter is the time of the first bucket, or None for the first vote (or, for minutes,
+    the first retained bucket)
+    :param end: The `end` parameter is the time the buckets end before, or None for the last vote
+    :return: a dictionary with the `choices` (dictionaries with the `id` and `choice_text`) and the `buckets`, each a
+    dictionary with the `bucket` time, the `votes`, `cumulative` votes and cumulative `share` (a percentage) of the
+    choices, in the order of `choices`, the id of the `leader` choice after the bucket (None without votes or on a tie)
+    and whether the `leader_changed` in the bucket.
+    """
+    choices = list(Choice.objects.filter(question_id=question_id).order_by('pk').values('id', 'choice_text'))
+    position = {choice['id']: number for number, choice in enumerate(choices)}
+    rollups = VoteRollup.objects.filter(question_id=question_id).order_by()
+
+    initial = [0] * len(choices)
+    if resolution == VoteRollup.MINUTE:
+        # The first whole hour of minute buckets not pruned yet.
+        retained = timezone.now() - datetime.timedelta(days=rollup_settings()['MINUTE_RETENTION_DAYS'])
+        retained = retained.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+        start = max(start or retained, retained)
+    if start is not None:
+        day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        before = Q(resolution=VoteRollup.DAY, bucket__lt=day)
+        if resolution == VoteRollup.MINUTE:
+            hour = start.replace(minute=0, second=0, microsecond=0)
+            before |= (Q(resolution=VoteRollup.HOUR, bucket__gte=day, bucket__lt=hour)
+                       | Q(resolution=VoteRollup.MINUTE, bucket__gte=hour, bucket__lt=start))
+        else:
+            before |= Q(resolution=resolution, bucket__gte=day, bucket__lt=start)
+        totals = rollups.filter(before).values('choice_id').annotate(total=Sum('votes'))
+        for choice_id, votes in totals.values_list('choice_id', 'total'):
+            initial[position[choice_id]] = votes
+
+    window = rollups.filter(resolution=resolution)
+    if start is not None:
+        window = window.filter(bucket__gte=start)
+    if end is not None:
+        window = window.filter(bucket__lt=end)
+    totals = initial
+    buckets = []
+    for bucket, rows in itertools.groupby(window.order_by('bucket').values_list('bucket', 'choice_id', 'votes'),
+                                          key=lambda row: row[0]):
+        votes = [0] * len(choices)
+        for _, choice_id, count in rows:
+            votes[position[choice_id]] = count
+        totals = [total + count for total, count in zip(totals, votes)]
+        overall = sum(totals)
+        buckets.append({'bucket': bucket, 'votes': votes, 'cumulative': totals,
+                        'share': [round(total * 100 / overall, 2) if overall else 0.0 for total in totals]})
+    # The leaders of all the buckets in one pass.
+    leaders = stats.leaders([bucket['cumulative'] for bucket in buckets], initial)
+    for bucket, (leader, changed) in zip(buckets, leaders):
+        bucket['leader'] = choices[leader]['id'] if leader is not None else None
+        bucket['leader_changed'] = changed
+    return {'choices': choices, 'buckets': buckets}
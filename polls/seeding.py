@@ -0,0 +1,150 @@
+import collections
+import datetime
+import itertools
+import random
+import uuid
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import Question, Choice, User, Vote
+
+
+def zipf_weights(count, skew):
+    """
+    The function returns the Zipf weights of `count` ranks: rank r gets 1 / r ** skew.
+
+    :param count: The `count` parameter is the number of ranks
+    :param skew: The `skew` parameter is the exponent of the distribution; 0 gives equal weights
+    :return: a list of weights, the most popular rank first.
+    """
+    return [1 / rank ** skew for rank in range(1, count + 1)]
+
+
+def allocate(total, weights, cap):
+    """
+    The function splits `total` into integer shares proportional to `weights`, none of them above `cap`.
+
+    :param total: The `total` parameter is the number to split
+    :param weights: The `weights` parameter is the list of weights of the shares
+    :param cap: The `cap` parameter is the largest allowed share
+    :return: a list of shares, summing to `total` unless all shares are capped.
+    """
+    scale = sum(weights)
+    shares = [min(cap, int(total * weight / scale)) for weight in weights]
+    remaining = total - sum(shares)
+    while remaining > 0 and any(share < cap for share in shares):
+        for index in range(len(shares)):
+            if remaining and shares[index] < cap:
+                shares[index] += 1
+                remaining -= 1
+    return shares
+
+
+def _copy(table, columns, rows):
+    with connection.cursor() as cursor:
+        with cursor.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
+
+
+def seed_questions(count, batch_size=10000):
+    """
+    The function bulk-generates published questions without choices, one per second back from now with three
+    questions sharing every publication date. On PostgreSQL the rows are generated by the database, so tens of
+    millions of questions take a single statement.
+
+    :param count: The `count` parameter is the number of questions
+    :param batch_size: The `batch_size` parameter is the number of rows inserted per statement without PostgreSQL
+    :return: the number of created questions.
+    """
+    run = uuid.uuid4().hex[:8]
+    now = timezone.now()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {Question._meta.db_table} (question_text, pub_date, exp_date) "
+                "SELECT %s || number, %s::timestamp - (number / 3) * interval '1 second', %s::timestamp "
+                "FROM generate_series(1, %s) AS number",
+                [f"Seeded question {run}-", now, now + datetime.timedelta(days=7), count])
+        return count
+    for start in range(0, count, batch_size):
+        Question.objects.bulk_create(
+            [Question(question_text=f"Seeded question {run}-{number}",
+                      pub_date=now - datetime.timedelta(seconds=number // 3), exp_date=now + datetime.timedelta(days=7))
+             for number in range(start + 1, min(count, start + batch_size) + 1)])
+    return count
+
+
+def seed(questions=2000, choices=4, users=5000, votes=50000, skew=1.0, batch_size=5000, random_seed=None,
+         period=None):
+    """
+    The function bulk-generates a synthetic dataset of published questions with their choices, users and votes. The
+    popularity of the questions, and of the choices within a question, follows a Zipf distribution, so a few hot
+    questions get most of the votes. The `votes` counters of the choices match the generated votes.
+
+    On PostgreSQL users and votes are loaded with COPY, which keeps millions of votes practical.
+
+    :param questions: The `questions` parameter is the number of questions
+    :param choices: The `choices` parameter is the number of choices of every question
+    :param users: The `users` parameter is the number of users
+    :param votes: The `votes` parameter is the total number of votes; a question gets at most one vote per user, so
+    fewer votes are created when the most popular questions run out of users
+    :param skew: The `skew` parameter is the Zipf exponent of the popularity; 0 spreads the votes evenly
+    :param batch_size: The `batch_size` parameter is the number of rows inserted per statement without COPY
+    :param random_seed: The `random_seed` parameter makes the generated votes reproducible
+    :param period: The `period` parameter is a timedelta the vote dates are spread over, uniformly, before now; by
+    default all votes are dated now
+    :return: a dictionary with the number of rows created per model.
+    """
+    rng = random.Random(random_seed)
+    # Keeps the unique texts and user ids of repeated runs apart.
+    run = uuid.uuid4().hex[:8]
+    now = timezone.now()
+    use_copy = connection.vendor == 'postgresql'
+
+    question_objects = Question.objects.bulk_create(
+        [Question(question_text=f"Seeded question {run}-{number}", pub_date=now - datetime.timedelta(minutes=number),
+                  exp_date=now + datetime.timedelta(days=7)) for number in range(questions)],
+        batch_size=batch_size)
+    choice_objects = Choice.objects.bulk_create(
+        [Choice(question=question, choice_text=f"Choice {number}")
+         for question in question_objects for number in range(choices)], batch_size=batch_size)
+
+    userids = [f"{run}{number:012d}" for number in range(users)]
+    if use_copy:
+        _copy(User._meta.db_table, ['username', 'userid'], (('Guest', userid) for userid in userids))
+        user_ids = list(User.objects.filter(userid__startswith=run).values_list('pk', flat=True))
+    else:
+        user_ids = [user.pk for user in User.objects.bulk_create([User(userid=userid) for userid in userids],
+                                                                 batch_size=batch_size)]
+
+    choices_of = collections.defaultdict(list)
+    for choice in choice_objects:
+        choices_of[choice.question_id].append(choice.pk)
+    choice_weights = list(itertools.accumulate(zipf_weights(choices, skew)))
+    # The popularity ranks are shuffled, so the hot questions are not simply the newest ones.
+    ranked = rng.sample(question_objects, len(question_objects))
+    shares = allocate(votes, zipf_weights(len(ranked), skew), len(user_ids))
+    tallies = collections.Counter()
+
+    def generate():
+        for question, share in zip(ranked, shares):
+            picked = rng.choices(choices_of[question.pk], cum_weights=choice_weights, k=share)
+            for user_id, choice_id in zip(rng.sample(user_ids, share), picked):
+                tallies[choice_id] += 1
+                yield question.pk, choice_id, user_id, now - period * rng.random() if period else now
+
+    columns = ['question_id', 'choice_id', 'user_id', 'vote_date']
+    if use_copy:
+        _copy(Vote._meta.db_table, columns, generate())
+    else:
+        rows = generate()
+        while batch := list(itertools.islice(rows, batch_size)):
+            Vote.objects.bulk_create([Vote(**dict(zip(columns, row))) for row in batch])
+
+    for choice in choice_objects:
+        choice.votes = tallies[choice.pk]
+    Choice.objects.bulk_update(choice_objects, ['votes'], batch_size=batch_size)
+    return {'questions': len(question_objects), 'choices': len(choice_objects), 'users': len(user_ids),
+            'votes': sum(tallies.values())}
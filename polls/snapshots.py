@@ -0,0 +1,139 @@
+import itertools
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import results_cache, stats
+from .models import ArchivedVote, Choice, Question, ResultsSnapshot, Vote
+
+
+def get_snapshot(question):
+    """
+    The function returns the results snapshot of a question, without a query when it was fetched with
+    `select_related('snapshot')`.
+
+    :param question: The `question` parameter is the Question object
+    :return: the ResultsSnapshot object, or None if the question is not finalized.
+    """
+    try:
+        return question.snapshot
+    except ResultsSnapshot.DoesNotExist:
+        return None
+
+
+def version(snapshot):
+    """
+    The function returns the results version of a finalized question, which never changes: the creation time of its
+    snapshot in microseconds.
+
+    :param snapshot: The `snapshot` parameter is the ResultsSnapshot object
+    :return: the version, an integer.
+    """
+    return int(snapshot.created.timestamp() * 1e6)
+
+
+def finalize(now=None, batch_size=100):
+    """
+    The function freezes the results of the expired questions that have no snapshot yet. Every batch of questions
+    costs one query of the choices with their tallies and percentages and one bulk INSERT of the snapshots. Votes still
+    waiting in the write-behind buffer are not part of the snapshot, so the buffer should be flushed first.
+
+    :param now: The `now` parameter is the time the questions must have expired by; the current time by default
+    :param batch_size: The `batch_size` parameter is the number of questions finalized per transaction
+    :return: the number of finalized questions.
+    """
+    expired = Question.objects.filter(exp_date__lte=now or timezone.now(), snapshot__isnull=True).order_by('pk')
+    finalized = 0
+    after = 0
+    while questions := list(expired.filter(pk__gt=after)[:batch_size]):
+        choices = Choice.objects.with_results().filter(question__in=questions).order_by('question_id', 'pk')
+        choices_of = {question_id: list(group)
+                      for question_id, group in itertools.groupby(choices, key=lambda choice: choice.question_id)}
+        groups = [choices_of.get(question.pk, []) for question in questions]
+        # The statistics of the whole batch in one pass.
+        summaries = stats.annotate(groups)
+        snapshots = []
+        for question, question_choices, summary in zip(questions, groups, summaries):
+            snapshots.append(ResultsSnapshot(
+                question=question,
+                total=question_choices[0].total if question_choices else 0,
+                choices=[{'id': choice.pk, 'choice_text': choice.choice_text, 'votes': choice.tally,
+                          'percentage': choice.percentage} for choice in question_choices],
+                html=results_cache.render_choices(question, question_choices, summary)))
+        with transaction.atomic():
+            # A concurrent run may have finalized some of the questions already.
+            ResultsSnapshot.objects.bulk_create(snapshots, ignore_conflicts=True)
+            results_cache.bump_on_commit([question.pk for question in questions])
+        finalized += len(questions)
+        after = questions[-1].pk
+    return finalized
+
+
+def archive(batch_size=10000):
+    """
+    The function moves the votes of the finalized questions from the Vote table to the ArchivedVote table, `batch_size`
+    votes per transaction, so the Vote table and its indexes only hold the votes of open questions.
+
+    :param batch_size: The `batch_size` parameter is the number of votes moved per transaction
+    :return: the number of archived votes.
+    """
+    finalized = Vote.objects.filter(question__snapshot__isnull=False).order_by('pk')
+    archived = 0
+    while True:
+        with transaction.atomic():
+            votes = list(finalized.values_list('pk', 'question_id', 'choice_id', 'user_id', 'vote_date')[:batch_size])
+            if not votes:
+                return archived
+            ArchivedVote.objects.bulk_create(
+                [ArchivedVote(id=pk, question_id=question_id, choice_id=choice_id, user_id=user_id, vote_date=vote_date)
+                 for pk, question_id, choice_id, user_id, vote_date in votes], ignore_conflicts=True)
+            Vote.objects.filter(pk__in=[vote[0] for vote in votes]).delete()
+        archived += len(votes)
+
+
+def reopen(question_ids, batch_size=10000):
+    """
+    The function undoes the finalization of questions taking votes again: their snapshots are deleted and their
+    archived votes moved back to the Vote table, with their ids, `batch_size` votes at a time, so the results are read
+    from the choices again and the votes cast before the snapshot still count against the repeated votes of their
+    users.
+
+    :param question_ids: The `question_ids` parameter is an iterable of primary keys of the reopened questions
+    :param batch_size: The `batch_size` parameter is the number of votes read and moved back at a time
+    :return: the number of deleted snapshots.
+    """
+    question_ids = list(question_ids)
+    with transaction.atomic():
+        reopened, _ = ResultsSnapshot.objects.filter(question__in=question_ids).delete()
+        if not reopened:
+            return 0
+        archived = ArchivedVote.objects.filter(question__in=question_ids).order_by('pk')
+        while votes := list(archived.values_list('pk', 'question_id', 'choice_id', 'user_id', 'vote_date')[:batch_size]):
+            Vote.objects.bulk_create(
+                [Vote(id=pk, question_id=question_id, choice_id=choice_id, user_id=user_id, vote_date=vote_date)
+                 for pk, question_id, choice_id, user_id, vote_date in votes])
+            ArchivedVote.objects.filter(pk__in=[vote[0] for vote in votes]).delete()
+        results_cache.bump_on_commit(question_ids)
+    return reopened
+
+
+def question_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    The function is the receiver of the pre_save signal of Question: it notes whether the save moves the expiration
+    date of a closed question into the future, from the stored date, which is only looked up in that case.
+    """
+    instance._reopening = not (raw or instance._state.adding or instance.is_closed()
+                               or (update_fields is not None and 'exp_date' not in update_fields))
+    if instance._reopening:
+        stored = Question.objects.filter(pk=instance.pk).values_list('exp_date', flat=True).first()
+        instance._reopening = stored is not None and stored <= timezone.now()
+
+
+def question_saved(sender, instance, **kwargs):
+    """
+    The function is the receiver of the post_save signal of Question: a finalized question whose expiration date was
+    moved into the future is reopened (see `reopen`), instead of taking votes while its frozen results are served.
+    Other edits leave the snapshot alone.
+    """
+    if getattr(instance, '_reopening', False):
+        reopen([instance.pk])
@@ -0,0 +1,35 @@
+function liveResults(url){
+    // Update the tallies on the results page with the events pushed by the server.
+    if (!window.EventSource) {
+        return;
+    }
+    let source = new EventSource(url);
+    source.addEventListener('results', event => {
+        let results = JSON.parse(event.data);
+        for (const choice of results.choices) {
+            let item = document.querySelector(`li[data-choice="${choice.id}"]`);
+            if (item === null) {
+                continue;
+            }
+            let percentage = results.total ? choice.votes * 100 / results.total : 0;
+            let votes = choice.votes === 1 ? 'vote' : 'votes';
+            item.querySelector('.tally').textContent =
+                `${item.dataset.text} -- ${choice.votes} ${votes} (${percentage.toFixed(1)}%)`;
+            item.querySelector('.interval').textContent =
+                results.total ? `95% CI ${choice.lower.toFixed(1)}-${choice.upper.toFixed(1)}%` : '';
+        }
+        let summary = document.querySelector('p.summary');
+        if (summary === null) {
+            return;
+        }
+        let leader = document.querySelector(`li[data-choice="${results.leader}"]`);
+        if (leader !== null) {
+            let votes = results.margin === 1 ? 'vote' : 'votes';
+            let error = results.decided ? 'beyond' : 'within';
+            summary.textContent = `${leader.dataset.text} leads by ${results.margin} ${votes} ` +
+                `(${results.margin_points.toFixed(1)} points), ${error} the margin of error.`;
+        } else {
+            summary.textContent = results.total ? 'Tied for the lead.' : 'No votes yet.';
+        }
+    });
+}
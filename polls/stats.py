@@ -0,0 +1,130 @@
+import itertools
+
+import numpy as np
+
+# The z-score of a two-sided 95% confidence level.
+Z_95 = 1.959963984540054
+
+
+def pad(tallies):
+    """
+    The function packs the tallies of many questions, which have different numbers of choices, into one matrix.
+
+    :param tallies: The `tallies` parameter is a list of lists of vote counts, one list per question in choice order
+    :return: a tuple of the (questions, most choices) int64 matrix of votes, padded with zeros, and the boolean matrix
+    marking the real choices.
+    """
+    counts = np.fromiter(map(len, tallies), dtype=np.int64, count=len(tallies))
+    width = int(counts.max()) if len(counts) else 0
+    votes = np.zeros((len(tallies), width), dtype=np.int64)
+    mask = np.arange(width) < counts[:, None]
+    votes[mask] = np.fromiter(itertools.chain.from_iterable(tallies), dtype=np.int64, count=int(counts.sum()))
+    return votes, mask
+
+
+def compute(votes, mask=None, previous=None, z=Z_95):
+    """
+    The function computes the results statistics of many questions at once, with array operations over the whole
+    matrix instead of a loop over the choices: the shares, the Wilson score interval of every share, the leader, the
+    margin of victory over the runner-up and, given earlier tallies, whether the leader changed. The Wilson interval
+    stays within [0, 1] and remains meaningful for small samples and shares close to 0 or 1, unlike the normal
+    approximation; without votes it is [0, 1].
+
+    :param votes: The `votes` parameter is the (questions, choices) matrix of vote counts
+    :param mask: The `mask` parameter marks the real choices of padded rows (see `pad`); all choices by default
+    :param previous: The `previous` parameter is an earlier votes matrix of the same shape, or None
+    :param z: The `z` parameter is the z-score of the confidence level of the intervals, 95% by default
+    :return: a dictionary of arrays, one row per question: the `total` votes, the `share`, `lower` and `upper` bounds
+    (fractions, one column per choice), the index of the `leader` (-1 without votes or when the first place is tied),
+    the `margin` in votes and `margin_share` between the first two choices, whether the race is `decided` (the
+    intervals of the first two choices do not overlap) and, given `previous`, whether the `leader_changed`.
+    """
+    votes = np.asarray(votes, dtype=np.int64)
+    if mask is None:
+        mask = np.ones(votes.shape, dtype=bool)
+    if not votes.shape[1]:
+        # Questions without choices: one padding column keeps the arrays two-dimensional.
+        votes, mask = np.zeros((len(votes), 1), dtype=np.int64), np.zeros((len(votes), 1), dtype=bool)
+    total = votes.sum(axis=1)
+    n = total[:, None].astype(np.float64)
+    voted = n > 0
+    safe_n = np.where(voted, n, 1.0)
+    share = votes / safe_n
+    z2 = z * z
+    denominator = 1 + z2 / safe_n
+    center = (share + z2 / (2 * safe_n)) / denominator
+    half_width = z * np.sqrt(share * (1 - share) / safe_n + z2 / (4 * safe_n * safe_n)) / denominator
+    lower = np.where(voted, np.clip(center - half_width, 0.0, 1.0), 0.0)
+    upper = np.where(voted, np.clip(center + half_width, 0.0, 1.0), 1.0)
+
+    # The first two choices of every row, the lowest index first on ties; padding ranks below any real choice.
+    rows = np.arange(len(votes))
+    ranked = np.where(mask, votes, -1)
+    leader = ranked.argmax(axis=1)
+    ranked[rows, leader] = -1
+    runner_up = ranked.argmax(axis=1)
+    has_runner_up = ranked[rows, runner_up] >= 0
+    margin = votes[rows, leader] - np.where(has_runner_up, votes[rows, runner_up], 0)
+    leads = (total > 0) & (margin > 0)
+    decided = leads & (lower[rows, leader] > np.where(has_runner_up, upper[rows, runner_up], 0.0))
+    stats = {'total': total, 'share': share, 'lower': lower, 'upper': upper, 'leader': np.where(leads, leader, -1),
+             'margin': margin, 'margin_share': margin / safe_n[:, 0], 'decided': decided}
+    if previous is not None:
+        stats['leader_changed'] = compute(previous, mask)['leader'] != stats['leader']
+    return stats
+
+
+def summarize(tallies, z=Z_95):
+    """
+    The function computes the statistics of the results of many questions in one vectorized pass and converts them to
+    plain Python values for the templates and the JSON API.
+
+    :param tallies: The `tallies` parameter is a list of lists of vote counts, one list per question in choice order
+    :param z: The `z` parameter is the z-score of the confidence level of the intervals
+    :return: a list with a dictionary per question: the `total`, the index of the `leader` choice (None without votes
+    or on a tie for the first place), the `margin` in votes and `margin_points` in percentage points, whether the race
+    is `decided`, and the `intervals` of the choices, (lower, upper) percentages.
+    """
+    if not tallies:
+        return []
+    votes, mask = pad(tallies)
+    stats = compute(votes, mask, z=z)
+    # The bounds of the real choices, flattened in question order, then sliced per question.
+    intervals = list(zip((stats['lower'][mask] * 100).tolist(), (stats['upper'][mask] * 100).tolist()))
+    offsets = list(itertools.accumulate(map(len, tallies), initial=0))
+    return [{'total': total, 'leader': None if leader < 0 else leader, 'margin': margin,
+             'margin_points': margin_share * 100, 'decided': decided, 'intervals': intervals[start:end]}
+            for start, end, total, leader, margin, margin_share, decided in zip(
+                offsets, offsets[1:], stats['total'].tolist(), stats['leader'].tolist(), stats['margin'].tolist(),
+                stats['margin_share'].tolist(), stats['decided'].tolist())]
+
+
+def leaders(cumulative, initial):
+    """
+    The function detects the leader changes of a vote time series, in one pass over all its buckets.
+
+    :param cumulative: The `cumulative` parameter is the list of the cumulative votes of the choices after each bucket
+    :param initial: The `initial` parameter is the list of the votes of the choices before the first bucket
+    :return: a list with a tuple per bucket: the index of the leading choice after it (None without votes or on a tie
+    for the first place) and True if it differs from the leader before the bucket.
+    """
+    if not cumulative:
+        return []
+    computed = compute(cumulative, previous=[initial, *cumulative[:-1]])
+    return [(None if leader < 0 else leader, changed)
+            for leader, changed in zip(computed['leader'].tolist(), computed['leader_changed'].tolist())]
+
+
+def annotate(choice_groups):
+    """
+    The function sets the `lower` and `upper` bounds of the 95% confidence interval of the share, as percentages, on
+    Choice objects annotated with their `tally`, for many questions at once.
+
+    :param choice_groups: The `choice_groups` parameter is a list of lists of the choices of a question
+    :return: the list of the summaries of the questions (see `summarize`).
+    """
+    summaries = summarize([[choice.tally for choice in choices] for choices in choice_groups])
+    for choices, summary in zip(choice_groups, summaries):
+        for choice, (lower, upper) in zip(choices, summary['intervals']):
+            choice.lower, choice.upper = lower, upper
+    return summaries
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = "polls"
 urlpatterns = [
@@ -9,5 +9,14 @@ urlpatterns = [
     path("question_form/", views.QuestionCreateView.as_view(), name='question_form'),
     path("<int:pk>/choice_form", views.ChoiceCreateView.as_view(), name='choice_form'),
     path("<int:pk>/results/", views.ResultsView.as_view(), name="results"),
+    path("<int:pk>/results/live/", views.results_stream, name="results_stream"),
+    path("import/", views.bulk_import, name="bulk_import"),
+    path("export/", views.bulk_export, name="bulk_export"),
+    path("api/questions/", api.question_list, name="api_questions"),
+    path("api/questions/batch/", api.question_batch, name="api_question_batch"),
+    path("api/questions/<int:pk>/", api.question_detail, name="api_question"),
+    path("api/questions/<int:pk>/results/", api.question_results, name="api_results"),
+    path("api/questions/<int:pk>/timeseries/", api.question_timeseries, name="api_timeseries"),
+    path("api/votes/", api.vote_batch, name="api_votes"),
     path("<int:question_id>/vote/", views.vote, name="vote"),
 ]
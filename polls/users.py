@@ -0,0 +1,101 @@
+import collections
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete
+
+from .models import User
+
+
+# The UserCache class maps the FingerprintJS user ids of the voters to the primary keys of their User rows, so repeat
+# voters skip the get_or_create() queries. It keeps at most `POLLS_USER_CACHE_SIZE` ids, evicting the least recently
+# used, each for `POLLS_USER_CACHE_TTL` seconds. Only users known to exist are cached; unknown ids always reach the
+# database.
+class UserCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self):
+        return getattr(settings, 'POLLS_USER_CACHE_SIZE', 10000)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'POLLS_USER_CACHE_TTL', 600)
+
+    def get(self, userid):
+        """
+        The function returns the cached primary key of a user.
+
+        :param userid: The `userid` parameter is the user id of the voter
+        :return: the primary key, or None if the id is not cached or its entry expired.
+        """
+        if self.size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(userid)
+            if entry is None or entry[1] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(userid)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, userid, pk):
+        size = self.size
+        if size <= 0:
+            return
+        with self._lock:
+            self._entries[userid] = (pk, time.monotonic() + self.ttl)
+            self._entries.move_to_end(userid)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def forget(self, userid):
+        with self._lock:
+            self._entries.pop(userid, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+cache = UserCache()
+
+
+def get_user(userid):
+    """
+    The function returns the User of a voter, creating it on the first vote. Cached users cost no query; the others
+    cost the get_or_create() queries, which also settle races between concurrent first votes on the unique `userid`
+    constraint. A user is only cached once the transaction creating it commits, so a rolled back user is never served.
+
+    :param userid: The `userid` parameter is the user id of the voter
+    :return: a tuple of the User object (only its `pk` and `userid` are loaded for cached users) and True if it was
+    served from the cache.
+    """
+    pk = cache.get(userid)
+    if pk is not None:
+        user = User(pk=pk, userid=userid)
+        user._state.adding = False
+        return user, True
+    user, _ = User.objects.get_or_create(userid=userid)
+    transaction.on_commit(lambda: cache.set(userid, user.pk))
+    return user, False
+
+
+def forget_user(sender, instance, created=False, **kwargs):
+    """
+    The function is the receiver of the post_save and post_delete signals of User: a deleted user must not be served
+    from the cache, and an edited one may have changed its id, which is not known any more, so the whole cache is
+    dropped.
+    """
+    if kwargs['signal'] is post_delete:
+        cache.forget(instance.userid)
+    elif not created:
+        cache.clear()
@@ -1,48 +1,218 @@
-from django.http import HttpResponseRedirect, Http404
+import codecs
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseRedirect, Http404, JsonResponse, \
+    StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django import forms
 from django.urls import reverse
 from django.views import generic
 from django.utils import timezone
 from django.contrib.admin.widgets import AdminDateWidget
-from .models import Question, Choice, User, Vote
-
-
-# The ChoiceForm class is a ModelForm that is used to create and update Choice objects,
-# excluding the question field and including the choice_text and votes fields with
-# an initial value of 0.
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import require_GET, require_POST
+from . import access, bulk, buffer as vote_buffer, keys, live, pagination, replicas, results_cache, snapshots, \
+    voting
+from .models import Question, Choice
+
+
+# The ChoiceForm class is a ModelForm that is used to create and update Choice objects with their choice_text. The
+# votes are only counted by the vote views, so they are not editable.
 class ChoiceForm(forms.ModelForm):
     class Meta:
         model = Choice
-        exclude = ('question',)
-        fields = ['choice_text', 'votes']
-        initial = {'votes': 0}
+        fields = ['choice_text']
+
+
+def check_conditions(request, etag, last_modified):
+    """
+    The function evaluates the conditional headers of a GET request against the validators of the page.
+
+    :param request: The `request` parameter is the HttpRequest of the page
+    :param etag: The `etag` parameter is the ETag of the current representation of the page (a quoted string) or None
+    :param last_modified: The `last_modified` parameter is the Last-Modified time of the page (a datetime) or None
+    :return: a 304 Not Modified (or 412 Precondition Failed) response, or None if the page must be rendered.
+    """
+    last_modified = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def set_validators(response, etag, last_modified):
+    """
+    The function adds the ETag and Last-Modified headers to a response, unless it already has them.
+
+    :param response: The `response` parameter is the HttpResponse of the page
+    :param etag: The `etag` parameter is the ETag of the page or None
+    :param last_modified: The `last_modified` parameter is the Last-Modified time of the page (a datetime) or None
+    :return: the response.
+    """
+    if etag and not response.has_header('ETag'):
+        response.headers['ETag'] = etag
+    if last_modified and not response.has_header('Last-Modified'):
+        response.headers['Last-Modified'] = http_date(int(last_modified.timestamp()))
+    return response
+
+
+CLOSED_MESSAGE = "Voting on this question has ended."
+
+
+def published_questions():
+    return Question.objects.filter(pub_date__lte=timezone.now())
+
+
+def index_validators(questions, next_cursor=None):
+    """
+    The function derives the validators of the index from the listed questions. The Last-Modified time is the newest
+    pub_date.
+
+    :param questions: The `questions` parameter is the list of questions shown on the index
+    :param next_cursor: The `next_cursor` parameter is the cursor of the next page, linked from the page
+    :return: a tuple of the ETag and the Last-Modified time, or (None, None) if no question is published.
+    """
+    if not questions:
+        return None, None
+    listing = ';'.join(f'{question.id}:{question.pub_date.timestamp()}:{question.question_text}'
+                       for question in questions) + f';{next_cursor}'
+    return f'"index-{hashlib.sha1(listing.encode()).hexdigest()}"', max(q.pub_date for q in questions)
+
+
+def question_validators(prefix, question, version, suffix=''):
+    """
+    The function derives the validators of a page of one question from its publication date and its results version,
+    which is bumped whenever a vote or a choice of the question is committed.
+
+    :param prefix: The `prefix` parameter tells the pages of the question apart, e.g. 'detail' or 'results'
+    :param question: The `question` parameter is the Question object of the page
+    :param version: The `version` parameter is the results version of the question
+    :param suffix: The `suffix` parameter is appended to the ETag, for pages depending on the client
+    :return: a tuple of the ETag and the Last-Modified time.
+    """
+    etag = f'"{prefix}-{question.pk}-{version}{suffix}"'
+    return etag, max(question.pub_date, datetime.datetime.fromtimestamp(version / 1e6))
+
+
+def csrf_etag_suffix(request):
+    """
+    The function ties the ETag of a page embedding a CSRF token to the CSRF cookie of the client; a client that lost
+    the cookie gets a fresh page.
+
+    :param request: The `request` parameter is the HttpRequest of the page
+    :return: the ETag suffix, empty without the cookie.
+    """
+    csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return f'-{hashlib.sha1(csrf_cookie.encode()).hexdigest()[:12]}' if csrf_cookie else ''
+
+
+# The ConditionalGetMixin class adds ETag and Last-Modified headers to a view and answers conditional GET requests with
+# 304 Not Modified before the object is fetched or the template is rendered. Views provide the validators with the
+# cheap `get_validators` method.
+class ConditionalGetMixin:
+    def get_validators(self):
+        """
+        The function returns the validators of the current representation of the page.
+
+        :return: a tuple of the ETag (a quoted string) and the Last-Modified time (a datetime), either may be None.
+        """
+        return None, None
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        response = check_conditions(request, etag, last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+
+# The QuestionValidatorsMixin class derives the validators of a page of one question from its publication date and its
+# results version. It costs one indexed lookup of the question, which is reused as the object of the view, and one
+# cache read.
+class QuestionValidatorsMixin(ConditionalGetMixin):
+    question = None
+
+    def get_validators(self):
+        self.question = self.get_queryset().filter(pk=self.kwargs['pk']).first()
+        if self.question is None:
+            # Let the view answer with 404.
+            return None, None
+        return question_validators(self.validators_prefix, self.question, self.get_version(self.question),
+                                   self.get_etag_suffix())
+
+    def get_version(self, question):
+        return results_cache.get_version(question.pk)
+
+    def get_etag_suffix(self):
+        return ''
+
+    def get_object(self, queryset=None):
+        if self.question is None:
+            return super().get_object(queryset)
+        return self.question
 
 
 # The IndexView class is a generic ListView that renders a template called "polls/index.html" and provides a context
-# variable called "latest_questions".
-class IndexView(generic.ListView):
+# variable called "latest_questions". Older questions are listed page by page with keyset pagination: the `after` query
+# parameter is the cursor of the previous page.
+class IndexView(ConditionalGetMixin, generic.ListView):
     template_name = "polls/index.html"
     context_object_name = "latest_questions"
+    page_size = 5
+    replica_reads = True
+
+    latest_questions = None
+    next_cursor = None
+
+    def get_validators(self):
+        """
+        The function derives the validators of the index from the listed questions, which are fetched once with the
+        indexed pub_date lookup and reused for rendering. The Last-Modified time is the newest pub_date.
+
+        :return: a tuple of the ETag and the Last-Modified time, or (None, None) if no question is published.
+        """
+        return index_validators(self.get_queryset(), self.next_cursor)
 
     def get_queryset(self):
         """
-        The function returns the latest 5 questions that have a publication date before or equal to the current time.
-        :return: The code is returning a queryset of Question objects that meet the following criteria:
+        The function returns the latest 5 questions that have a publication date before or equal to the current time,
+        or the 5 following the cursor of the `after` query parameter.
+        :return: The code is returning a list of Question objects that meet the following criteria:
         - The pub_date of the Question is less than or equal to the current time.
-        - The queryset is ordered by the pub_date in descending order.
-        - Only the first 5 Question objects are included in the queryset.
+        - The questions are ordered by the pub_date (and id) in descending order.
+        - Only the first 5 Question objects after the cursor are included in the list.
+        The same list is returned for the whole request, so it is evaluated only once.
         """
-        self.request.session.flush()
-        return Question.objects.filter(pub_date__lte=timezone.now()).order_by("-pub_date")[:5]
+        if self.latest_questions is None:
+            try:
+                self.latest_questions, self.next_cursor = pagination.keyset_page(
+                    published_questions(), self.request.GET.get('after'), self.page_size)
+            except ValueError:
+                raise Http404("Invalid page")
+        return self.latest_questions
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = self.next_cursor
+        return context
 
 
 # The DetailView class returns a queryset of Question objects that have a pub_date
 # earlier than or equal to the current
 # time.
-class DetailView(generic.DetailView):
+class DetailView(QuestionValidatorsMixin, generic.DetailView):
     template_name = "polls/detail.html"
     model = Question
+    validators_prefix = 'detail'
+    replica_reads = True
+
+    def get_etag_suffix(self):
+        # The page embeds a CSRF token in the vote form.
+        return csrf_etag_suffix(self.request)
 
     def get_queryset(self):
         """
@@ -50,28 +220,67 @@ class DetailView(generic.DetailView):
         time. :return: The code is returning a queryset of Question objects that have a pub_date less than or equal
         to the current time.
         """
-        self.request.session.flush()
         return Question.objects.filter(pub_date__lte=timezone.now())
 
+    def get_object(self, queryset=None):
+        """
+        The function returns the question with its choices prefetched in one additional query. The choices are read
+        from the primary: the ETag comes from the results version, bumped on the primary when a choice is added, so a
+        lagging replica would send a page missing the choice under the new ETag.
+        """
+        question = super().get_object(queryset)
+        with replicas.primary():
+            prefetch_related_objects([question], Prefetch('choice_set', queryset=Choice.objects.order_by('pk')))
+        return question
+
 
 # The ResultsView class is a generic detail view that displays the results of a specific question in a template, and it
 # filters the queryset to only include questions that have a publication date before or equal to the current time.
-class ResultsView(generic.DetailView):
+# The list of choices with their tallies is served from the snapshot of a finalized question, fetched with the question,
+# or else from the results cache.
+class ResultsView(QuestionValidatorsMixin, generic.DetailView):
     template_name = "polls/results.html"
     model = Question
+    validators_prefix = 'results'
+    replica_reads = True
 
     def get_queryset(self):
         """
         The function returns a queryset of Question objects that have a pub_date earlier than or equal to the current
-        time. :return: The code is returning a queryset of Question objects that have a pub_date less than or equal
-        to the current time.
+        time, joined with their results snapshots. :return: The code is returning a queryset of Question objects that
+        have a pub_date less than or equal to the current time.
         """
-        self.request.session.flush()
-        return Question.objects.filter(pub_date__lte=timezone.now())
+        return Question.objects.filter(pub_date__lte=timezone.now()).select_related('snapshot')
+
+    def get_version(self, question):
+        snapshot = snapshots.get_snapshot(question)
+        return snapshots.version(snapshot) if snapshot else super().get_version(question)
+
+    def get_context_data(self, **kwargs):
+        """
+        The function adds the rendered list of choices, with their vote tallies and percentages, to the context. The
+        choices are queried only when the question is not finalized and the list is not cached for its current results
+        version.
+
+        :return: the context dictionary with the `results` fragment.
+        """
+        context = super().get_context_data(**kwargs)
+        snapshot = snapshots.get_snapshot(self.object)
+        if snapshot:
+            context['results'], self.results_source = mark_safe(snapshot.html), 'snapshot'
+        else:
+            context['results'], cached = results_cache.results_fragment(self.object)
+            self.results_source = 'hit' if cached else 'miss'
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        response['X-Results-Cache'] = self.results_source
+        return response
 
 
 # The `QuestionCreateView` class is a generic view for creating a new question object with a form, and it sets the
-# success URL and saves the question ID to the session.
+# success URL and gives its creator a signed access token to the choice creation form.
 class QuestionCreateView(generic.CreateView):
     template_name = "polls/question_form.html"
     model = Question
@@ -79,14 +288,12 @@ class QuestionCreateView(generic.CreateView):
 
     def get_form(self, form_class=None):
         """
-        The function `get_form` clears the session, modifies the widgets of two fields in a form, and returns the
-        modified form.
+        The function `get_form` modifies the widgets of two fields in a form, and returns the modified form.
 
         :param form_class: The `form_class` parameter is used to specify the form class that should be used for the
         view. If `form_class` is not provided, the default form class for the view will be used :return: the form
         object.
         """
-        self.request.session.flush()
         form = super(QuestionCreateView, self).get_form(form_class)
         form.fields['pub_date'].widget = AdminDateWidget(attrs={'type': 'datetime-local'})
         form.fields['exp_date'].widget = AdminDateWidget(attrs={'type': 'datetime-local'})
@@ -97,15 +304,17 @@ class QuestionCreateView(generic.CreateView):
 
     def form_valid(self, form):
         """
-        The function saves a form, sets a session variable, and redirects to a success URL.
+        The function saves a form, grants access to the choice form of the new question, and redirects to a success
+        URL.
 
         :param form: The `form` parameter is an instance of a Django form that has been submitted by the user. It
         contains the data entered by the user :return: The method `form_valid` is returning an `HttpResponseRedirect`
         object.
         """
         self.object = form.save()
-        self.request.session['question_id_access'] = self.object.id
-        return HttpResponseRedirect(self.get_success_url())
+        response = HttpResponseRedirect(self.get_success_url())
+        access.grant(response, self.object.id)
+        return response
 
 
 # The `ChoiceCreateView` class is a generic CreateView that handles the creation of Choice objects, with additional
@@ -125,33 +334,40 @@ class ChoiceCreateView(generic.CreateView):
         """
         form = super(ChoiceCreateView, self).get_form(form_class)
         self.check_access()
+        # The choice is validated against the other choices of its question.
+        form.instance.question_id = self.kwargs['pk']
         return form
 
     def form_valid(self, form):
         """
-        The function saves a form object, associates it with a question object, and redirects to a success URL.
+        The function saves a form object, associated with its question, and redirects to a success URL. A choice of
+        the same text saved concurrently is rejected by the `Unique answers to question` constraint and reported as a
+        form error.
 
         :param form: The `form` parameter is an instance of a Django form that has been submitted by the user. It
         contains the data entered by the user and can be used to validate and save the data :return: an
         HttpResponseRedirect object.
         """
         self.check_access()
-        self.object = form.save(False)
-        self.object.question = Question.objects.get(pk=self.kwargs['pk'])
-        self.object.save()
+        try:
+            with transaction.atomic():
+                self.object = form.save()
+        except IntegrityError:
+            if not Question.objects.filter(pk=self.kwargs['pk']).exists():
+                raise Http404("No Question matches the given query.")
+            form.add_error('choice_text', 'Choice already exists')
+            return self.form_invalid(form)
         return HttpResponseRedirect(self.get_success_url())
 
     def get_success_url(self):
-        return reverse('polls:choice_form', kwargs={'pk': self.object.question.id})
+        return reverse('polls:choice_form', kwargs={'pk': self.object.question_id})
 
     def check_access(self):
         """
-        The function checks if the 'question_id_access' key is present in the session and if its value matches the 'pk'
-        value from the kwargs, otherwise it raises a Http404 exception.
+        The function checks if the request carries the signed access token of the question given by the 'pk' value from
+        the kwargs, otherwise it raises a Http404 exception.
         """
-        if 'question_id_access' not in self.request.session:
-            raise Http404
-        elif self.request.session['question_id_access'] != self.kwargs['pk']:
+        if not access.has_access(self.request, self.kwargs['pk']):
             raise Http404
 
 
@@ -179,16 +395,25 @@ class ChoiceCreateView(generic.CreateView):
 def vote(request, question_id):
     """
     The function handles the voting process for a specific question by incrementing the vote count for the selected
-    choice and redirecting to the results page.
+    choice and redirecting to the results page. Votes for expired questions are refused. The user is looked up through
+    the user cache, so repeat voters cost no query for it. The vote and the increment are written in one transaction,
+    so a repeated vote of the same user leaves the counter untouched. With the write-behind buffer enabled the vote is
+    only appended to the buffer and written to the database by its next flush.
 
     :param request: The request object represents the HTTP request made by the user. It contains information such as
     the user's browser details, the requested URL, and any data sent with the request
     :param question_id: The question_id parameter is the unique identifier of the question for which the user is voting.
      It is used to retrieve the corresponding Question object from the database
-    :return: an HTTP redirect response to the "polls:results" view with the question_id as an argument.
+    :return: an HTTP redirect response to the "polls:results" view with the question_id as an argument, or 403
+    Forbidden once the question has expired.
     """
-
+    # Expired questions are refused from the expiration date loaded with the question, and without any query while
+    # they are remembered as closed.
+    if voting.is_known_closed(question_id):
+        return HttpResponseForbidden(CLOSED_MESSAGE)
     question = get_object_or_404(Question, pk=question_id)
+    if not voting.check_open(question):
+        return HttpResponseForbidden(CLOSED_MESSAGE)
     try:
         userid = request.POST['userId']
     except AttributeError:
@@ -196,19 +421,84 @@ def vote(request, question_id):
                       {"question": question, "error_message": "You've already voted"}, )
     else:
         if userid:
-            user, _ = User.objects.get_or_create(userid=userid)
             try:
                 selected = question.choice_set.get(pk=request.POST['choice'])
             except (KeyError, Choice.DoesNotExist):
                 return render(request, "polls/detail.html",
                               {"question": question, "error_message": "You didn't select a choice"}, )
-            else:
-                Vote.objects.create(question=question, choice=selected, user=user)
-                selected.votes += 1
-                selected.save()
+            if vote_buffer.enabled():
+                vote_buffer.get_buffer().append(question.id, selected.id, userid)
                 return HttpResponseRedirect(reverse("polls:results", args=(question_id,)))
+            try:
+                voting.cast_vote(question, selected, userid)
+            except IntegrityError:
+                return render(request, "polls/detail.html",
+                              {"question": question, "error_message": "You've already voted"}, )
+            return HttpResponseRedirect(reverse("polls:results", args=(question_id,)))
         else:
             return render(request, "polls/detail.html",
                           {"question": question, "error_message": "Failed to authorize user. Please disable addBlock "
                                                                   "and try again"}, )
 
+
+async def results_stream(request, pk):
+    """
+    The function streams the vote tallies of a published question as server-sent events: the current tallies first,
+    then at most one event per tick in which they changed. The stream is pushed by the in-process broadcaster, so it
+    needs the ASGI entry point (mysite/asgi.py).
+
+    :param request: The request object represents the HTTP request made by the user
+    :param pk: The pk parameter is the unique identifier of the question
+    :return: a StreamingHttpResponse of the text/event-stream type, or 204 No Content (which tells EventSource clients
+    not to reconnect) when served through WSGI, where the stream would hold a worker forever.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    # The lookup runs through the broadcaster, so the request does not hold a database connection while streaming.
+    if not await live.get_broadcaster().is_published(pk):
+        raise Http404("No question found matching the query")
+    response = StreamingHttpResponse(live.stream(pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies from buffering the events.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_POST
+@keys.api_key_or_staff_required
+def bulk_import(request):
+    """
+    The function imports questions with their choices from the request body, NDJSON (application/x-ndjson) or CSV
+    (text/csv), instead of one form submission per question and choice. The body is read line by line and saved in
+    batches, so large imports are not held in memory. Only clients with an API key and staff members may import (see
+    `keys.api_key_or_staff_required`).
+
+    :param request: The request object represents the HTTP request made by the user; the format is taken from its
+    Content-Type or from the `format` query parameter
+    :return: a JsonResponse with the number of created questions and choices and the rejected records, 415
+    Unsupported Media Type for other formats, or 401 Unauthorized for other clients.
+    """
+    format = request.GET.get('format') or bulk.FORMAT_OF_CONTENT_TYPE.get(request.content_type)
+    if format not in bulk.FORMATS:
+        return JsonResponse({'error': f"Send {' or '.join(bulk.CONTENT_TYPES.values())}."}, status=415)
+    return JsonResponse(bulk.import_polls(codecs.iterdecode(request, request.encoding or 'utf-8'), format))
+
+
+@require_GET
+def bulk_export(request):
+    """
+    The function streams the published questions with their choices and vote tallies as NDJSON or CSV. The export is
+    generated batch by batch while it is sent, so memory use stays constant whatever the number of questions and votes.
+
+    :param request: The request object represents the HTTP request made by the user; the `format` query parameter
+    selects 'ndjson' (the default) or 'csv'
+    :return: a StreamingHttpResponse, or 404 for other formats.
+    """
+    format = request.GET.get('format', 'ndjson')
+    if format not in bulk.FORMATS:
+        raise Http404("Unknown export format")
+    # Django buffers synchronous iterators served through ASGI, so the ASGI stream is asynchronous.
+    export = bulk.aexport if isinstance(request, ASGIRequest) else bulk.export
+    response = StreamingHttpResponse(export(published_questions(), format), content_type=bulk.CONTENT_TYPES[format])
+    response['Content-Disposition'] = f'attachment; filename="polls.{format}"'
+    return response
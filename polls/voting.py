@@ -0,0 +1,219 @@
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from . import counters, results_cache, users
+from .models import Choice, User, Vote
+from .validators import validate_userid
+
+ACCEPTED = 'accepted'
+DUPLICATE = 'duplicate'
+INVALID_CHOICE = 'invalid_choice'
+INVALID_USER = 'invalid_user'
+CLOSED = 'closed'
+
+# Seconds a question found closed is remembered, so later votes for it are refused without a query. A closed question
+# is only reopened by moving its expiration date, which this process notices after at most that long (or at once when
+# the change is saved here, see `forget_closed`).
+CLOSED_CACHE_TTL = 300
+CLOSED_CACHE_SIZE = 10000
+
+_closed = {}
+
+
+def is_known_closed(question_id):
+    """
+    The function checks the per-process cache of closed questions.
+
+    :param question_id: The `question_id` parameter is the primary key of the question
+    :return: True if the question was found closed within the last CLOSED_CACHE_TTL seconds.
+    """
+    until = _closed.get(question_id)
+    return until is not None and until > time.monotonic()
+
+
+def check_open(question):
+    """
+    The function checks that a question takes votes, from the expiration date loaded with it, and remembers closed
+    questions in the per-process cache.
+
+    :param question: The `question` parameter is the Question object
+    :return: True if the question is open, False if voting on it has ended.
+    """
+    if not question.is_closed():
+        return True
+    if len(_closed) >= CLOSED_CACHE_SIZE:
+        _closed.clear()
+    _closed[question.pk] = time.monotonic() + CLOSED_CACHE_TTL
+    return False
+
+
+def forget_closed(sender, instance, **kwargs):
+    """
+    The function is the receiver of the post_save signal of Question: an edited question may have been reopened.
+    """
+    _closed.pop(instance.pk, None)
+
+
+def record_vote(question, choice, user):
+    """
+    The function stores a vote of the user and increments the vote counter of the selected choice in one transaction.
+
+    The counter is incremented by the database (``votes = votes + 1``), so concurrent voters never overwrite each
+    other's increments and only the ``votes`` column of the choice row is written. The vote row is inserted first, which
+    keeps the row lock on the choice as short as possible. With `POLLS_VOTE_COUNTER_SHARDS` set, the increment lands on
+    one of the counter shards of the choice instead. The cached results of the question are invalidated on commit.
+
+    :param question: The `question` parameter is the Question object the user is voting on
+    :param choice: The `choice` parameter is the selected Choice object of the question
+    :param user: The `user` parameter is the User object casting the vote
+    :return: the created Vote object. An IntegrityError is raised (and nothing is written) if the user has already voted
+    on the question.
+    """
+    with transaction.atomic():
+        vote = Vote.objects.create(question=question, choice=choice, user=user)
+        counters.increment(choice.pk)
+        results_cache.bump_on_commit([question.pk])
+    return vote
+
+
+def cast_vote(question, choice, userid):
+    """
+    The function records the vote of a voter identified by their user id, looking the user up through the user cache
+    (see `users.get_user`). A user deleted by another process while cached makes the vote fail on its foreign key;
+    the entry is then dropped and the vote recorded again for a new user.
+
+    :param question: The `question` parameter is the Question object the user is voting on
+    :param choice: The `choice` parameter is the selected Choice object of the question
+    :param userid: The `userid` parameter is the user id of the voter
+    :return: the created Vote object. An IntegrityError is raised if the user has already voted on the question.
+    """
+    user, cached = users.get_user(userid)
+    try:
+        return record_vote(question, choice, user)
+    except IntegrityError:
+        # Telling a repeated vote from a stale user costs a query, only on this error path.
+        if not cached or User.objects.filter(pk=user.pk).exists():
+            raise
+    users.cache.forget(userid)
+    return record_vote(question, choice, users.get_user(userid)[0])
+
+
+def _is_valid_userid(userid):
+    try:
+        validate_userid(userid)
+    except (ValidationError, TypeError):
+        return False
+    return True
+
+
+def record_votes(ballots):
+    """
+    The function stores many votes at once with a fixed number of queries: one lookup of the choices with the
+    expiration dates of their questions, one upsert and one lookup of the users, one insert of the votes skipping the
+    duplicates, which returns the rows it stored, and one grouped UPDATE adding those to the counters of their choices
+    (full recounts are left to the reconcile job).
+
+    Votes are deduplicated on the `(question, user)` unique constraint, within the ballots, against the votes already
+    stored and against votes committed concurrently, so replaying the same ballots twice is harmless.
+
+    :param ballots: The `ballots` parameter is an iterable of `(question_id, choice_id, userid, vote_date)` tuples;
+    `vote_date` may be None to use the current time
+    :return: a list with the status of every ballot, in order: ACCEPTED, DUPLICATE, INVALID_CHOICE, INVALID_USER or
+    CLOSED, for votes cast after the expiration date of the question.
+    """
+    ballots = list(ballots)
+    statuses = [None] * len(ballots)
+    # The expiration dates come with the choices, in the same query.
+    choices = {(choice_id, question_id): exp_date for choice_id, question_id, exp_date in
+               Choice.objects.filter(pk__in={ballot[1] for ballot in ballots})
+               .values_list('pk', 'question_id', 'question__exp_date')}
+
+    now = timezone.now()
+    seen = set()
+    candidates = []
+    for index, (question_id, choice_id, userid, vote_date) in enumerate(ballots):
+        if (choice_id, question_id) not in choices:
+            statuses[index] = INVALID_CHOICE
+        elif choices[choice_id, question_id] <= (vote_date or now):
+            statuses[index] = CLOSED
+        elif not _is_valid_userid(userid):
+            statuses[index] = INVALID_USER
+        elif (question_id, userid) in seen:
+            statuses[index] = DUPLICATE
+        else:
+            seen.add((question_id, userid))
+            candidates.append(index)
+    if not candidates:
+        return statuses
+
+    userids = {ballots[index][2] for index in candidates}
+    User.objects.bulk_create([User(userid=userid) for userid in userids], ignore_conflicts=True)
+    users = dict(User.objects.filter(userid__in=userids).values_list('userid', 'pk'))
+
+    votes = {}
+    for index in candidates:
+        question_id, choice_id, userid, vote_date = ballots[index]
+        statuses[index] = ACCEPTED
+        votes[index] = (question_id, choice_id, users[userid], vote_date or now)
+
+    with transaction.atomic():
+        for index in _insert_votes(votes):
+            statuses[index] = DUPLICATE
+            del votes[index]
+        if votes:
+            deltas = {}
+            for vote in votes.values():
+                deltas[vote[1]] = deltas.get(vote[1], 0) + 1
+            counters.add(deltas)
+            results_cache.bump_on_commit({vote[0] for vote in votes.values()})
+    return statuses
+
+
+VOTE_COLUMNS = ('question_id', 'choice_id', 'user_id', 'vote_date')
+
+
+def _insert_votes(votes):
+    """
+    The function inserts the votes as plain rows, without instantiating any model, skipping the votes conflicting with
+    the `Unique user votes required` constraint (committed earlier or concurrently) and reporting the rows it stored,
+    so the counters get exactly the inserted votes. On PostgreSQL the rows are loaded with COPY into a temporary
+    staging table of the connection, then moved by one INSERT ... ON CONFLICT DO NOTHING RETURNING that also empties
+    it; elsewhere they are inserted in multi-row VALUES chunks with the same clause.
+
+    :param votes: The `votes` parameter is a dictionary mapping the ballot indexes to their (question_id, choice_id,
+    user_id, vote_date) rows
+    :return: the set of the indexes of the ballots rejected as duplicates.
+    """
+    if not votes:
+        return set()
+    table = Vote._meta.db_table
+    columns = ', '.join(VOTE_COLUMNS)
+    conflict = 'ON CONFLICT DO NOTHING RETURNING question_id, user_id'
+    inserted = []
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            staging = f'{table}_batch'
+            definitions = ', '.join(f'{column} {Vote._meta.get_field(column).db_type(connection)}'
+                                    for column in VOTE_COLUMNS)
+            cursor.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging} ({definitions}) ON COMMIT DELETE ROWS")
+            # COPY bypasses the execute wrappers, so its errors are translated to the Django exceptions here.
+            with connection.wrap_database_errors, cursor.copy(f"COPY {staging} ({columns}) FROM STDIN") as copy:
+                for vote in votes.values():
+                    copy.write_row(vote)
+            cursor.execute(f"WITH batch AS (DELETE FROM {staging} RETURNING {columns}) "
+                           f"INSERT INTO {table} ({columns}) SELECT {columns} FROM batch {conflict}")
+            inserted = cursor.fetchall()
+        else:
+            rows = list(votes.values())
+            size = connection.ops.bulk_batch_size(VOTE_COLUMNS, rows)
+            for start in range(0, len(rows), size):
+                chunk = rows[start:start + size]
+                values = ', '.join(['(%s, %s, %s, %s)'] * len(chunk))
+                cursor.execute(f"INSERT INTO {table} ({columns}) VALUES {values} {conflict}",
+                               [value for row in chunk for value in row])
+                inserted += cursor.fetchall()
+    inserted = set(inserted)
+    return {index for index, vote in votes.items() if (vote[0], vote[2]) not in inserted}